@@ -1,26 +1,8 @@
-import pandas as pd
 import re
-import logging
-import sys
 import json
 from datetime import datetime
 
-class DuplicateFilter(logging.Filter):
-    def filter(self, record):
-        current_log = record.msg
-        if current_log != getattr(self, "last_log", None):
-            self.last_log = current_log
-            return True
-        return False
-
-logger = logging.getLogger('ASCT-b Tables Log')
-logger.setLevel(logging.WARN)  
-formatter = logging.Formatter('%(levelname)s - %(message)s')
-handler = logging.StreamHandler(sys.stderr)
-handler.setLevel(logging.WARN)  
-handler.setFormatter(formatter) 
-handler.addFilter(DuplicateFilter())             
-logger.addHandler(handler)
+from term_ids import TERM_IDS
 
 def chunks(lst, n):
     """Yield successive n-sized chunks from lst."""
@@ -28,10 +10,17 @@ def chunks(lst, n):
         yield lst[i:i + n]
 
 def parse_asctb(path):
-    """Takes ASCT-b JSON as input;
+    """Takes the path of an ASCT-b JSON file as input;
+    RETURN the results of parse_asctb_data"""
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_asctb_data(json.load(f))
+
+def parse_asctb_data(asct_b_tab):
+    """Takes ASCT-b table rows (the data of the ASCT-b JSON) as input;
     Processes only AS (anatomy) and CT (cell type) columns.
     RETURN pandas dataframe of with columns ['o', 's', 'olabel', 'slabel', user_olabel, user_slabel]
     where each pair of adjacent columns => a subject-object pair for testing"""
+    import pandas as pd
 
     def is_valid_id(log_dict, content, row_number, terms_set):
         if not re.match("(CL|UBERON|PCL)\:[0-9]+", content['id']):
@@ -49,7 +38,6 @@ def parse_asctb(path):
         log_dict["no_parent"].append({"id": cell_type["id"], "label": cell_type["rdfs_label"], "user_label": cell_type["name"], "row_number": row_number})
       return log_dict
 
-    asct_b_tab = json.load(open(path))
     as_invalid_terms = set()
     as_temp_terms = set()
     as_out_ub = set()
@@ -74,10 +62,10 @@ def parse_asctb(path):
         log_dict, terms_set = is_valid_id(log_dict, next, row["rowNumber"], terms_set)
         if check_id(current['id']) and check_id(next['id']):
           d = {}
-          d['s'] = next['id']
+          d['s'] = TERM_IDS.canonical(next['id'])
           d['slabel'] = next['rdfs_label']
           d['user_slabel'] = next['name']
-          d['o'] = current['id']
+          d['o'] = TERM_IDS.canonical(current['id'])
           d['olabel'] = current['rdfs_label']
           d['user_olabel'] = current['name']
           d['row_number'] = row['rowNumber']
@@ -121,10 +109,10 @@ def parse_asctb(path):
         if check_id(current['id']) and check_id(next['id']):
           d = {}
           d['row_number'] = row['rowNumber']
-          d['s'] = next['id']
+          d['s'] = TERM_IDS.canonical(next['id'])
           d['slabel'] = next['rdfs_label']
           d['user_slabel'] = next['name']
-          d['o'] = current['id']
+          d['o'] = TERM_IDS.canonical(current['id'])
           d['olabel'] = current['rdfs_label']
           d['user_olabel'] = current['name']
           dl.append(d)
@@ -173,10 +161,10 @@ def parse_asctb(path):
         if check_id(last_as['id']) and check_id(last_ct['id']):
           d = {}
           d['row_number'] = row['rowNumber']
-          d['s'] = last_ct['id']
+          d['s'] = TERM_IDS.canonical(last_ct['id'])
           d['slabel'] = last_ct['rdfs_label']
           d['user_slabel'] = last_ct['name']
-          d['o'] = last_as['id']
+          d['o'] = TERM_IDS.canonical(last_as['id'])
           d['olabel'] = last_as['rdfs_label']
           d['user_olabel'] = last_as['name']
           dl.append(d)
@@ -277,21 +265,22 @@ def parse_asctb(path):
     new_uberon_terms = pd.DataFrame.from_records(rut).drop_duplicates()
     return out, report_terms, new_terms, new_uberon_terms, log_dict
 
-def transform_to_str(list):
-    terms_pairs = set()
+def transform_to_keys(list):
+    """Pair keys (see term_ids) of (s, o) pairs"""
+    return {TERM_IDS.pair_key(s, o) for s, o in list}
 
-    for s, o in list:
-      terms_pairs.add(f"({s} {o})")
-    return terms_pairs
+def pair_strings(keys):
+    """'(s o)' strings of pair keys, sorted, as the queries take them"""
+    return sorted(f"({s} {o})" for s, o in TERM_IDS.pairs(keys))
 
 def split_terms(list):
     terms_s = []
     terms_o = []
 
-    for pairs in list:
-      s, o = pairs.split(" ")
-      terms_s.append(s[1:])
-      terms_o.append(o[:-1])
+    for key in list:
+      s, o = TERM_IDS.pair(key)
+      terms_s.append(s)
+      terms_o.append(o)
 
     return terms_s, terms_o
 
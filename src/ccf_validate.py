@@ -0,0 +1,198 @@
+"""
+Single entry point of the per-organ pipeline, in place of one process per
+script and stage:
+
+    python ccf_validate.py download [TABLE ...]
+    python ccf_validate.py validate [TABLE ...]
+    python ccf_validate.py report [TABLE ...]
+    python ccf_validate.py graph-page [TABLE ...]
+    python ccf_validate.py dashboard
+    python ccf_validate.py release-notes
+    python ccf_validate.py all [TABLE ...]
+
+Tables default to every table of config_asct.json. Run on their own, the
+stages read their inputs from the files written by the previous ones, as the
+scripts do. all runs every stage in one process: the downloaded tables, the
+validation results (logs, error logs, reports) and the table versions are
+passed in memory from one stage to the next, and one UberonGraph, with its
+query cache, serves every table. Only final artifacts are written; as the
+README is generated from memory, logs_dict.json is not. The dashboard and
+release notes cover every table: they are made from memory only when the
+run does, else from the warehouse (or the report files and
+tables_version.txt), which hold the tables validated earlier the same day.
+
+graph.md links the organ graph images, still drawn by make (ROBOT, og2dot
+and Graphviz). With --old-version, only download and validate apply, as
+for the last official release.
+"""
+import argparse
+import os
+import shutil
+from datetime import date
+
+TABLES_DIR = "../resources/ASCT-b_tables"
+TODAY = date.today().strftime("%Y%m%d")
+STAGES = ["download", "validate", "report", "graph-page", "dashboard", "release-notes"]
+
+
+def table_path(table):
+    return os.path.join(TABLES_DIR, f"{table}.json")
+
+
+def table_names(tables, old_version=False):
+    if tables:
+        return tables
+    from download_resource import get_config
+    version = "old" if old_version else "new"
+    return [element["name"] for element in get_config() if version in element]
+
+
+class Pipeline():
+    """
+    Run the stages for some tables, keeping what a stage hands over to the
+    next one.
+    """
+    def __init__(self, args, complete=True):
+        """
+        complete: whether the run covers every table, so that the dashboard
+        and release notes can be made from what it keeps in memory.
+        """
+        self.args = args
+        self.complete = complete
+        self.tables_data = {}
+        self.tables_version = []
+        self.results = {}
+        self._ug = None
+
+    @property
+    def ug(self):
+        if self._ug is None:
+            from template_runner import load_closure_index, load_ic_table
+            from uberongraph_tools import LatencyLog, QueryCache, UberonGraph
+            self._ug = UberonGraph(closure_index=load_closure_index(self.args.closure_index),
+                                   ic_table=load_ic_table(self.args.ic_table), query_cache=QueryCache(),
+                                   latency_log=LatencyLog(self.args.latency_log) if self.args.latency_log else None)
+        return self._ug
+
+    def runner_args(self, table, log_dict):
+        """
+        Arguments of template_runner.main for a table.
+        """
+        args = self.args
+        return argparse.Namespace(
+            job=table, target_file=table_path(table), output_file=f"../templates/class_template_{table}.csv",
+            old_version=str(args.old_version), rdf_format=args.rdf_format, warehouse=args.warehouse,
+            closure_index=args.closure_index, ic_table=args.ic_table, latency_log=args.latency_log,
+            max_queries=args.max_queries, log_dict=log_dict,
+        )
+
+    def download(self, table):
+        from download_resource import download_table
+        os.makedirs(TABLES_DIR, exist_ok=True)
+        data, table_version, table_date = download_table(table, str(self.args.old_version), table_path(table))
+        self.tables_data[table] = data
+        self.tables_version.extend([table, table_version, table_date])
+
+    def validate(self, table, log_dict=True):
+        """
+        Validate a table and write its outputs, and copy its logs to
+        ../docs/{table}. Return False when it was not validated, being
+        planned to need more than --max-queries queries.
+        """
+        from ccf_tools import parse_asctb, parse_asctb_data
+        from template_runner import main
+        os.makedirs(f"../logs/{table}", exist_ok=True)
+        data = self.tables_data.get(table)
+        parsed = parse_asctb_data(data) if data is not None else parse_asctb(table_path(table))
+        try:
+            self.results[table] = main(self.runner_args(table, log_dict), parsed, self.ug)
+        except SystemExit as e:
+            print(e)
+            return False
+        if not self.args.old_version:
+            shutil.copytree(f"../logs/{table}", f"../docs/{table}", dirs_exist_ok=True)
+        return True
+
+    def report(self, table):
+        from readme_reports_generation import generate_table_pages
+        os.makedirs(f"../docs/{table}", exist_ok=True)
+        results = self.results.get(table)
+        if results is None:
+            generate_table_pages(table, "readme")
+        else:
+            generate_table_pages(table, "readme", data=results["log_dict"], error_log=results["error_log"])
+
+    def graph_page(self, table):
+        from readme_reports_generation import generate_table_pages
+        os.makedirs(f"../docs/{table}", exist_ok=True)
+        generate_table_pages(table, "graph")
+
+    def dashboard(self):
+        from dashboard_generation import generate_dashboard
+        reports = None
+        if self.complete and self.results:
+            import pandas as pd
+            reports = {
+                "terms": pd.concat([results["report_t"] for results in self.results.values()], ignore_index=True),
+                "relationship": pd.concat([results["report_r"] for results in self.results.values()], ignore_index=True),
+            }
+        generate_dashboard(self.args.output or "../docs/dashboard.md", self.args.warehouse, reports)
+
+    def release_notes(self):
+        from release_notes_generation import generate_release_notes, release_versions
+        ug = self._ug
+        if self.complete and self.tables_version:
+            ont_version = release_versions(self.args.warehouse, TODAY, ug)[0]
+            tables_version = self.tables_version
+        else:
+            ont_version, tables_version = release_versions(self.args.warehouse, TODAY, ug)
+        generate_release_notes(ont_version, tables_version, self.args.output or "../NOTES")
+
+
+def run(args):
+    stages = STAGES if args.command == "all" else [args.command]
+    tables = table_names(getattr(args, "tables", None), args.old_version)
+    pipeline = Pipeline(args, complete=set(tables) >= set(table_names(None, args.old_version)))
+
+    if "download" in stages:
+        for table in tables:
+            pipeline.download(table)
+    if "validate" in stages:
+        # Tables over --max-queries get no pages
+        tables = [table for table in tables if pipeline.validate(table, log_dict=args.command != "all")]
+    if args.old_version:
+        return
+    if "report" in stages:
+        for table in tables:
+            pipeline.report(table)
+    if "graph-page" in stages:
+        for table in tables:
+            pipeline.graph_page(table)
+    if "dashboard" in stages:
+        pipeline.dashboard()
+    if "release-notes" in stages:
+        pipeline.release_notes()
+
+
+if __name__ == "__main__":
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--old-version", action="store_true", help="last official release of the tables")
+    common.add_argument("--rdf-format", choices=["xml", "nt", "ttl"], default="xml",
+                        help="format of the annotations and suggestion graphs")
+    common.add_argument("--warehouse", help="validation warehouse file to load the results into and read them from")
+    common.add_argument("--closure-index", help="closure index base directory")
+    common.add_argument("--ic-table", help="IC table base directory")
+    common.add_argument("--latency-log", help="JSON lines file the duration of each query is appended to")
+    common.add_argument("--max-queries", type=int, help="do not validate a table planned to need more queries")
+
+    parser = argparse.ArgumentParser(description="ASCT+B table validation pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command in ["download", "validate", "report", "graph-page", "all"]:
+        subparser = subparsers.add_parser(command, parents=[common])
+        subparser.add_argument("tables", nargs="*", help="tables to process, all tables of config_asct.json by default")
+        subparser.set_defaults(output=None)
+    for command, output in [("dashboard", "../docs/dashboard.md"), ("release-notes", "../NOTES")]:
+        subparser = subparsers.add_parser(command, parents=[common])
+        subparser.add_argument("-o", "--output", default=output, help="output file path")
+
+    run(parser.parse_args())
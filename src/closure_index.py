@@ -0,0 +1,308 @@
+"""
+Local index of the subClassOf, part_of (BFO:0000050), has_part
+(BFO:0000051) and connected_to (RO:0002170) relationships between UBERON, CL
+and PCL terms, so that closure questions are answered without network calls.
+
+For each relation the index keeps two kinds of edges: "entailed" (the
+ubergraph redundant graph, i.e. the transitive closure) and "direct"
+(asserted subClassOf axioms, nonredundant existential edges). Edges are
+stored as sorted ancestor lists in CSR arrays (indptr, indices) saved as
+.npy files, one directory per ontology version, and memory-mapped on load.
+"""
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+
+from sparql_client import UBERGRAPH, shared_client
+from term_ids import OBO, PREFIXES, iris_to_curies
+from term_ids import iri_to_curie as to_curie
+
+RELATIONS = {
+    "subClassOf": "http://www.w3.org/2000/01/rdf-schema#subClassOf",
+    "part_of": f"{OBO}BFO_0000050",
+    "has_part": f"{OBO}BFO_0000051",
+    "connected_to": f"{OBO}RO_0002170",
+}
+KINDS = ["entailed", "direct"]
+# ubergraph graphs each (relation, kind) is read from
+SOURCE_GRAPHS = {
+    ("subClassOf", "entailed"): ["http://reasoner.renci.org/redundant"],
+    ("subClassOf", "direct"): ["http://reasoner.renci.org/ontology"],
+    ("part_of", "entailed"): ["http://reasoner.renci.org/ontology", "http://reasoner.renci.org/redundant"],
+    ("part_of", "direct"): ["http://reasoner.renci.org/nonredundant"],
+    ("has_part", "entailed"): ["http://reasoner.renci.org/ontology", "http://reasoner.renci.org/redundant"],
+    ("has_part", "direct"): ["http://reasoner.renci.org/nonredundant"],
+    ("connected_to", "entailed"): ["http://reasoner.renci.org/ontology", "http://reasoner.renci.org/redundant"],
+    ("connected_to", "direct"): ["http://reasoner.renci.org/nonredundant"],
+}
+PAGE_SIZE = 100000
+
+# Dataset and pattern of the edges of a relation, queried by fetch_pages
+EDGES = """
+  %s
+  {
+    ?subject <%s> ?object .
+    FILTER (isIRI(?object) && ?subject != ?object)
+    FILTER (%s)
+    FILTER (%s)
+  }
+"""
+
+SELECT_VERSION = """
+  PREFIX owl: <http://www.w3.org/2002/07/owl#>
+  SELECT ?subject ?object
+  {
+    VALUES ?subject {
+      <http://purl.obolibrary.org/obo/uberon/uberon-base.owl>
+      <http://purl.obolibrary.org/obo/cl/cl-base.owl>
+      <http://purl.obolibrary.org/obo/pcl/pcl-base.owl>
+    }
+    ?subject owl:versionInfo ?object
+  }
+"""
+
+
+def prefix_filter(variable):
+    return " || ".join(f'STRSTARTS(STR(?{variable}), "{OBO}{prefix}_")' for prefix in PREFIXES)
+
+
+def version_key(versions):
+    """
+    Turn {"UBERON": "2025-01-15", ...} into a directory name.
+    """
+    key = "_".join(f"{ont}-{versions[ont]}" for ont in sorted(versions))
+    return re.sub(r"[^\w.-]", "-", key)
+
+
+def query_versions(endpoint=UBERGRAPH):
+    bindings = shared_client(endpoint).query(SELECT_VERSION)["results"]["bindings"]
+    names = {"uberon-base.owl": "UBERON", "cl-base.owl": "CL", "pcl-base.owl": "PCL"}
+    return {
+        names[b["subject"]["value"].rsplit("/", 1)[-1]]: b["object"]["value"]
+        for b in bindings
+    }
+
+
+def latest_directory(base_dir):
+    """
+    Return the most recently built version directory of base_dir, or None,
+    without querying the current versions.
+    """
+    if not os.path.isdir(base_dir):
+        return None
+    built = [os.path.join(base_dir, name) for name in os.listdir(base_dir)
+             if os.path.isfile(os.path.join(base_dir, name, "versions.json"))]
+    return max(built, key=lambda directory: os.path.getmtime(os.path.join(directory, "versions.json")), default=None)
+
+
+class PagingError(RuntimeError):
+    pass
+
+
+def fetch_pages(pattern, endpoint=UBERGRAPH, page_size=PAGE_SIZE):
+    """
+    Yield the ?subject ?object bindings of a dataset and pattern, one page
+    at a time. Pages are taken in ?subject ?object order, as SPARQL gives
+    no stable order across requests otherwise, and their rows are checked
+    against a COUNT of the pattern: raise PagingError when they differ.
+    Queries go through the shared SPARQL client, so that they are paced,
+    retried and archived like the others; large pages may need a longer
+    CCF_SPARQL_TIMEOUT.
+    """
+    client = shared_client(endpoint)
+    expected = int(client.query(f"SELECT (COUNT(*) AS ?count) {pattern}")["results"]["bindings"][0]["count"]["value"])
+    rows = 0
+    offset = 0
+    while True:
+        query = f"SELECT ?subject ?object {pattern} ORDER BY ?subject ?object LIMIT {page_size} OFFSET {offset}"
+        bindings = client.query(query)["results"]["bindings"]
+        rows += len(bindings)
+        yield from bindings
+        if len(bindings) < page_size:
+            break
+        offset += page_size
+    if rows != expected:
+        raise PagingError(f"{rows} rows fetched from {endpoint}, {expected} expected")
+
+
+def fetch_edges(relation, kind, endpoint=UBERGRAPH, page_size=PAGE_SIZE):
+    """
+    Yield the (subject, object) CURIE pairs of a relation from ubergraph,
+    one page at a time.
+    """
+    graphs = "\n  ".join(f"FROM <{graph}>" for graph in SOURCE_GRAPHS[(relation, kind)])
+    pattern = EDGES % (graphs, RELATIONS[relation], prefix_filter("subject"), prefix_filter("object"))
+    for b in fetch_pages(pattern, endpoint, page_size):
+        yield to_curie(b["subject"]["value"]), to_curie(b["object"]["value"])
+
+
+def read_edges_tsv(path):
+    """
+    Read relation, kind, subject, object rows into {(relation, kind): [(s, o)]}.
+    """
+    import pandas as pd
+    rows = pd.read_csv(path, sep="\t", header=None, names=["relation", "kind", "subject", "object"],
+                       dtype=str, keep_default_na=False)
+    rows["subject"] = iris_to_curies(rows["subject"])
+    rows["object"] = iris_to_curies(rows["object"])
+    edges = {key: [] for key in SOURCE_GRAPHS}
+    for (relation, kind), group in rows.groupby(["relation", "kind"], sort=False):
+        edges[(relation, kind)] = list(zip(group["subject"], group["object"]))
+    return edges
+
+
+def to_csr(pairs, term_ids, n_terms):
+    """
+    Turn (subject, object) pairs into CSR arrays with sorted object ids.
+    """
+    pairs = np.array(
+        sorted({(term_ids[s], term_ids[o]) for s, o in pairs}), dtype=np.int32
+    ).reshape(-1, 2)
+    indptr = np.zeros(n_terms + 1, dtype=np.int64)
+    np.add.at(indptr, pairs[:, 0] + 1, 1)
+    return np.cumsum(indptr), np.ascontiguousarray(pairs[:, 1])
+
+
+def build(edges, directory, versions=None):
+    """
+    Write an index directory from {(relation, kind): iterable of (s, o)}.
+    """
+    edges = {key: list(pairs) for key, pairs in edges.items()}
+    terms = sorted({term for pairs in edges.values() for pair in pairs for term in pair})
+    term_ids = {term: i for i, term in enumerate(terms)}
+
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, "terms.npy"), np.array(terms, dtype=str))
+    for (relation, kind), pairs in edges.items():
+        indptr, indices = to_csr(pairs, term_ids, len(terms))
+        np.save(os.path.join(directory, f"{relation}_{kind}_indptr.npy"), indptr)
+        np.save(os.path.join(directory, f"{relation}_{kind}_indices.npy"), indices)
+    with open(os.path.join(directory, "versions.json"), "w", encoding="utf-8") as f:
+        json.dump(versions or {}, f, indent=2)
+    return directory
+
+
+def build_from_ubergraph(base_dir, endpoint=UBERGRAPH):
+    """
+    Build the index of the current ubergraph ontology versions, unless it
+    already exists. Return its directory.
+    """
+    versions = query_versions(endpoint)
+    directory = os.path.join(base_dir, version_key(versions))
+    if not os.path.isfile(os.path.join(directory, "versions.json")):
+        build({key: fetch_edges(*key, endpoint=endpoint) for key in SOURCE_GRAPHS}, directory, versions)
+    return directory
+
+
+class ClosureIndex():
+    """
+    Memory-mapped closure index of one ontology version.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        terms = np.load(os.path.join(directory, "terms.npy"), mmap_mode="r")
+        self.term_ids = {str(term): i for i, term in enumerate(terms)}
+        self.terms = terms
+        self.csr = {}
+        self.inverse = {}
+        # Indexes built before a relation was added simply lack its arrays
+        for key in SOURCE_GRAPHS:
+            if not os.path.isfile(os.path.join(directory, f"{key[0]}_{key[1]}_indptr.npy")):
+                continue
+            self.csr[key] = (
+                np.load(os.path.join(directory, f"{key[0]}_{key[1]}_indptr.npy"), mmap_mode="r"),
+                np.load(os.path.join(directory, f"{key[0]}_{key[1]}_indices.npy"), mmap_mode="r"),
+            )
+        with open(os.path.join(directory, "versions.json"), "r", encoding="utf-8") as f:
+            self.versions = json.load(f)
+
+    @classmethod
+    def for_current_version(cls, base_dir, endpoint=UBERGRAPH):
+        """
+        Load the index matching the ontology versions in ubergraph, or
+        return None when it was not built.
+        """
+        directory = os.path.join(base_dir, version_key(query_versions(endpoint)))
+        if os.path.isfile(os.path.join(directory, "versions.json")):
+            return cls(directory)
+        return None
+
+    @classmethod
+    def latest(cls, base_dir):
+        """
+        Load the most recently built index, or return None when there is
+        none. Offline, but possibly not of the ontology versions in ubergraph.
+        """
+        directory = latest_directory(base_dir)
+        return cls(directory) if directory else None
+
+    def has(self, relation, kind="entailed"):
+        return (relation, kind) in self.csr
+
+    def _row(self, key, term_id):
+        indptr, indices = self.csr[key]
+        return indices[indptr[term_id]:indptr[term_id + 1]]
+
+    def related(self, subject, obj, relation, kind="entailed"):
+        """
+        True when subject relation obj holds.
+        """
+        s, o = self.term_ids.get(subject), self.term_ids.get(obj)
+        if s is None or o is None:
+            return False
+        row = self._row((relation, kind), s)
+        position = np.searchsorted(row, o)
+        return bool(position < len(row) and row[position] == o)
+
+    def filter_pairs(self, pairs, relation, kind="entailed", inverse=False):
+        """
+        Return the (subject, object) pairs for which the relation holds;
+        with inverse, object relation subject is checked instead.
+        """
+        if inverse:
+            return {(s, o) for s, o in pairs if self.related(o, s, relation, kind)}
+        return {(s, o) for s, o in pairs if self.related(s, o, relation, kind)}
+
+    def ancestors(self, term, relation, kind="entailed"):
+        """
+        Terms the term is related to.
+        """
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return []
+        return [str(self.terms[i]) for i in self._row((relation, kind), term_id)]
+
+    def descendants(self, term, relation, kind="entailed"):
+        """
+        Terms related to the term, from the transposed arrays built on first use.
+        """
+        key = (relation, kind)
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return []
+        if key not in self.inverse:
+            indptr, indices = self.csr[key]
+            subjects = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+            order = np.lexsort((subjects, indices))
+            inverse_indptr = np.zeros(len(indptr), dtype=np.int64)
+            np.add.at(inverse_indptr, np.asarray(indices) + 1, 1)
+            self.inverse[key] = (np.cumsum(inverse_indptr), subjects[order])
+        indptr, indices = self.inverse[key]
+        return [str(self.terms[i]) for i in indices[indptr[term_id]:indptr[term_id + 1]]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output-dir", default="../closure_index",
+                        help="base directory, one sub-directory per ontology version")
+    parser.add_argument("--edges-tsv", help="build from relation, kind, subject, object rows instead of ubergraph")
+    parser.add_argument("--version", default="local", help="version name used with --edges-tsv")
+
+    args = parser.parse_args()
+    if args.edges_tsv:
+        print(build(read_edges_tsv(args.edges_tsv), os.path.join(args.output_dir, args.version), {"edges": args.version}))
+    else:
+        print(build_from_ubergraph(args.output_dir))
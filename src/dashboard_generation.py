@@ -5,62 +5,42 @@ import pandas as pd
 from mdutils.mdutils import MdUtils
 
 from readme_reports_generation import tsv2md
+from report_decoration import add_total_row, colour_counts, colour_percents, page_links
+from warehouse import ValidationWarehouse
 
 
 def clean_up(report):
     return report.drop(columns=["percent_indirect_AS-AS_relationship","percent_indirect_CT-CT_relationship"])
 
 def add_link(report):
-    for row in report.itertuples():
-        row_table = row.Table
-        if row_table != "Total":
-            report.at[row.Index, "Table"] = f"[{row_table}]({row_table}/README.md)"
+    report["Table"] = page_links(report["Table"], "README.md")
 
     return report
 
-def check_number_n_get_color(number):
-    PASS = "<font color='green'>"
-    FAIL = "<font color='red'>"
-    CLOSE_TAG = "</font>"
-    if isinstance(number, int):
-        if number > 0:
-            return f"{FAIL}{number}{CLOSE_TAG}"
-        else:
-            return f"{PASS}{number}{CLOSE_TAG}"
-    elif isinstance(number, float):
-        if number < 50.0:
-            return f"{PASS}{number}{CLOSE_TAG}"
-        else:
-            return f"{FAIL}{number}{CLOSE_TAG}"
-    
-
 def add_color(report, report_type):
     if report_type == "terms":
-        for row in report.itertuples():
-            report.at[row.Index, "AS_invalid_term_percent"] = check_number_n_get_color(row.AS_invalid_term_percent)
-            report.at[row.Index, "CT_invalid_term_percent"] = check_number_n_get_color(row.CT_invalid_term_percent)
-            report.at[row.Index, "invalid_terms_percent"] = check_number_n_get_color(row.invalid_terms_percent)
+        for column in ["AS_invalid_term_percent", "CT_invalid_term_percent", "invalid_terms_percent"]:
+            report[column] = colour_percents(report[column])
     elif report_type == "relations":
-        for row in report.itertuples():
-            report.at[row.Index, "percent_invalid_AS-AS_relationship"] = check_number_n_get_color(row._3)
-            report.at[row.Index, "percent_invalid_CT-CT_relationship"] = check_number_n_get_color(row._5)
-            report.at[row.Index, "percent_invalid_CT-AS_relationship"] = check_number_n_get_color(row._7)
-            report.at[row.Index, "number_of_no_parent_relationships"] = check_number_n_get_color(row.number_of_no_parent_relationships)
-            report.at[row.Index, "unique_no_parent_relationships"] = check_number_n_get_color(int(row.unique_no_parent_relationships))
+        for column in ["percent_invalid_AS-AS_relationship", "percent_invalid_CT-CT_relationship", "percent_invalid_CT-AS_relationship"]:
+            report[column] = colour_percents(report[column])
+        report["number_of_no_parent_relationships"] = colour_counts(report["number_of_no_parent_relationships"])
+        report["unique_no_parent_relationships"] = colour_counts(report["unique_no_parent_relationships"].astype(int))
             
     return report
 
-def get_reports(date):
-    BASE_PATH = "../reports/report_"
+def read_report(report_type, date, warehouse=None, reports=None):
+    if reports is not None:
+        return reports[report_type].copy()
+    if warehouse is not None:
+        return warehouse.report(report_type, date)
+    return pd.read_csv(f"../reports/report_{report_type}_{date}.tsv", sep='\t')
 
-    ter_report = pd.read_csv(f"{BASE_PATH}terms_{date}.tsv", sep='\t')
+def get_reports(date, warehouse=None, reports=None):
+    ter_report = read_report("terms", date, warehouse, reports)
     ter_report.sort_values(by=["Table"], inplace=True)
-    ter_report.loc["Total"] = ter_report.sum()
-    ter_report.loc[ter_report.index[-1], "Table"] = "Total"
-    ter_report.loc[ter_report.index[-1], "AS_invalid_term_percent"] = ""
-    ter_report.loc[ter_report.index[-1], "CT_invalid_term_percent"] = ""
-    ter_report.loc[ter_report.index[-1], "invalid_terms_percent"] = ""
-    ter_report = add_color(ter_report.reset_index(drop=True), "terms")
+    ter_report = add_total_row(ter_report, blank_columns=["AS_invalid_term_percent", "CT_invalid_term_percent", "invalid_terms_percent"])
+    ter_report = add_color(ter_report, "terms")
     ter_report.rename(columns={
         "AS_valid_term_number": "# VALID AS TERMS",
         "AS_temp_term_number": "# AS TEMP TERMS",
@@ -77,14 +57,10 @@ def get_reports(date):
     ter_report = add_link(ter_report)
     ter_report_md = tsv2md(ter_report)
 
-    rel_report = pd.read_csv(f"{BASE_PATH}relationship_{date}.tsv", sep='\t')
+    rel_report = read_report("relationship", date, warehouse, reports)
     rel_report.sort_values(by=["Table"], inplace=True)
-    rel_report.loc["Total"] = rel_report.sum()
-    rel_report.loc[rel_report.index[-1], "Table"] = "Total"
-    rel_report.loc[rel_report.index[-1], "percent_invalid_AS-AS_relationship"] = ""
-    rel_report.loc[rel_report.index[-1], "percent_invalid_CT-CT_relationship"] = ""
-    rel_report.loc[rel_report.index[-1], "percent_invalid_CT-AS_relationship"] = ""
-    rel_report = clean_up(rel_report.reset_index(drop=True))
+    rel_report = add_total_row(rel_report, blank_columns=["percent_invalid_AS-AS_relationship", "percent_invalid_CT-CT_relationship", "percent_invalid_CT-AS_relationship"])
+    rel_report = clean_up(rel_report)
     rel_report = add_color(rel_report, "relations")
     rel_report.rename(columns={
         "number_of_AS-AS_relationships": "# AS-AS RELATIONS",
@@ -101,13 +77,18 @@ def get_reports(date):
     
     return ter_report_md, rel_report_md
 
-def generate_dashboard(output):
+def generate_dashboard(output, warehouse_path=None, reports=None):
+    """
+    reports: {"terms": ..., "relationship": ...} frames of the run, laid out
+    as the report files, used instead of reading them when given
+    """
     DATE_FILE = date.today().strftime("%Y%m%d")
     DATE = date.today().strftime('%Y-%m-%d')
 
     template = MdUtils(file_name=output, title=f'Validation Dashboard ({DATE})')
     
-    terms_report, rel_report = get_reports(DATE_FILE)
+    warehouse = ValidationWarehouse(warehouse_path) if warehouse_path else None
+    terms_report, rel_report = get_reports(DATE_FILE, warehouse, reports)
     
     template.new_header(level=1, title="Terms")
     template.new_paragraph(text="Invalid AS or CT terms include terms not from UBERON or CL ontologies. Also, it includes terms without ID.")
@@ -125,6 +106,7 @@ def generate_dashboard(output):
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("-o", "--output", help="output file path")
+    parser.add_argument("-w", "--warehouse", help="read the reports from this validation warehouse file")
     
     args = parser.parse_args()
-    generate_dashboard(args.output)
\ No newline at end of file
+    generate_dashboard(args.output, args.warehouse)
\ No newline at end of file
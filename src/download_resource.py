@@ -5,8 +5,6 @@ import argparse
 import json
 from ast import literal_eval
 
-import requests
-
 API_URL = "https://apps.humanatlas.io/asctb-api/v2/{sheetId}/{gid}"
 
 
@@ -50,26 +48,41 @@ def get_table_version_n_date(metadata: dict):
     return table_date, table_version
 
 
-def main(params: dict):
+def fetch_table(sheet_id: str, gid: str) -> dict:
     """
-    Search for config, download table and add date and version into
-    tables_version.txt
+    Download a table from the ASCT+B API, with its data and metadata
     """
-    version = get_sheet_gid(params.job, params.old_version)
-
-    data = requests.get(
-        API_URL.format(sheetId=version["sheetId"], gid=version["gid"]),
+    import requests
+    return requests.get(
+        API_URL.format(sheetId=sheet_id, gid=gid),
         timeout=600
     ).json()
 
+
+def download_table(job: str, old_version: str, output_file: str) -> tuple:
+    """
+    Search for config, download table, write its data to output_file and
+    add date and version into tables_version.txt. Return the data, the
+    table version and its date
+    """
+    version = get_sheet_gid(job, old_version)
+
+    data = fetch_table(version["sheetId"], version["gid"])
+
     table_date, table_version = get_table_version_n_date(data["metadata"])
 
     with open("tables_version.txt", "a+", encoding="utf-8") as t:
-        t.write(f"{params.job};{table_version};{table_date}\n")
+        t.write(f"{job};{table_version};{table_date}\n")
 
-    with open(params.output_file, "w", encoding="utf-8") as f:
+    with open(output_file, "w", encoding="utf-8") as f:
         json.dump(data["data"], f, ensure_ascii=False, indent=2)
 
+    return data["data"], table_version, table_date
+
+
+def main(params: dict):
+    download_table(params.job, params.old_version, params.output_file)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
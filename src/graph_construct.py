@@ -1,32 +1,47 @@
 import argparse, json
 
-def merge_json(file, sec, param, value):
-  style_prop = {
-      "basicPropertyValues": [
-        {
-          "pred": f"https://w3id.org/kgviz/{param}",
-          "val": f"{value}"
-        }
-      ]
+def edge_key(edge):
+  return (edge["sub"], edge["pred"], edge["obj"])
+
+def merge_styles(file, styles):
+  """Takes an obographs json and a list of (graph, param, value);
+  Adds the style property to every edge of the json found in each graph.
+  Edges found in several graphs get all their style properties."""
+  edge_styles = {}
+  for sec, param, value in styles:
+    style_prop = {
+      "pred": f"https://w3id.org/kgviz/{param}",
+      "val": f"{value}"
     }
-  if sec["graphs"][0].get("edges"):
-    for f_edge in file["graphs"][0]["edges"]:
-      for s_edge in sec["graphs"][0]["edges"]:
-        if f_edge["sub"] == s_edge["sub"] and f_edge["pred"] == s_edge["pred"] and f_edge["obj"] == s_edge["obj"]:
-          f_edge["meta"] = style_prop
+    for s_edge in sec["graphs"][0].get("edges", []):
+      props = edge_styles.setdefault(edge_key(s_edge), [])
+      if style_prop not in props:
+        props.append(style_prop)
+
+  if edge_styles:
+    for f_edge in file["graphs"][0].get("edges", []):
+      props = edge_styles.get(edge_key(f_edge))
+      if props:
+        f_edge["meta"] = {"basicPropertyValues": list(props)}
 
   return file
 
+def merge_json(file, sec, param, value):
+  return merge_styles(file, [(sec, param, value)])
+
 def main(args):
   f = open(args.input)
   file = json.load(f)
-  f = open(args.sec)
-  sec = json.load(f)
 
-  output = merge_json(file, sec, args.param, args.value)
+  styles = []
+  for sec_path, param, value in [(args.sec, args.param, args.value)] + (args.style or []):
+    f = open(sec_path)
+    styles.append((json.load(f), param, value))
+
+  output = merge_styles(file, styles)
 
   with open(args.output, 'w', encoding='utf-8') as f:
-    json.dump(output, f, ensure_ascii=False, indent=2)  
+    json.dump(output, f, ensure_ascii=False, indent=2)
 
 if __name__ == '__main__':
   parser = argparse.ArgumentParser()
@@ -35,7 +50,9 @@ if __name__ == '__main__':
   parser.add_argument('output', help='output file')
   parser.add_argument('param', help='property name')
   parser.add_argument('value', help='value of the param')
-  
+  parser.add_argument('--style', nargs=3, action='append', metavar=('JSON', 'PARAM', 'VALUE'),
+                      help='another json with edges to style, can be repeated')
+
 
   args = parser.parse_args()
-  main(args)
\ No newline at end of file
+  main(args)
@@ -0,0 +1,257 @@
+"""
+Split a large organ graph (obographs JSON, after graph_construct.py) into
+parts of bounded size, one per top-level anatomical structure, so that
+og2dot.js and dot run in bounded time whatever the table size.
+
+Invalid edges (ccf_part_of, ccf_located_in) and suggestion edges (styled by
+graph_construct.py) are always kept: a part includes the nodes at their
+other end, even when those belong to another part. The graph given to the
+main rendering becomes an overview of the parts.
+"""
+import argparse
+import copy
+import json
+import os
+import re
+from collections import defaultdict
+
+MAX_NODES = 150
+
+CCF = "https://purl.org/ccf/latest/ccf.owl#"
+INVALID_PREDICATES = {f"{CCF}ccf_part_of", f"{CCF}ccf_located_in"}
+# sub pred obj where sub is below obj in the table hierarchy
+UPWARD_PREDICATES = INVALID_PREDICATES | {
+    "is_a",
+    "http://purl.obolibrary.org/obo/BFO_0000050",
+    "http://purl.obolibrary.org/obo/RO_0001025",
+}
+# sub pred obj where sub is above obj
+DOWNWARD_PREDICATES = {"http://purl.obolibrary.org/obo/BFO_0000051"}
+
+MANIFEST = "parts.json"
+
+
+def is_kept(edge):
+    """
+    Invalid and suggestion edges are kept in every part they touch.
+    """
+    return edge["pred"] in INVALID_PREDICATES or bool(edge.get("meta", {}).get("basicPropertyValues"))
+
+
+class GraphPartitioner():
+    """
+    Index the class nodes and the table hierarchy of an obographs graph.
+    """
+    def __init__(self, graph):
+        self.graph = graph
+        self.classes = [node["id"] for node in graph.get("nodes", []) if node.get("type", "CLASS") == "CLASS"]
+        class_ids = set(self.classes)
+        self.labels = {node["id"]: node.get("lbl", node["id"]) for node in graph.get("nodes", [])}
+        self.children = defaultdict(list)
+        self.parents = defaultdict(set)
+        self.kept_neighbours = defaultdict(set)
+
+        for edge in graph.get("edges", []):
+            sub, obj = edge["sub"], edge["obj"]
+            if sub not in class_ids or obj not in class_ids or sub == obj:
+                continue
+            if is_kept(edge):
+                self.kept_neighbours[sub].add(obj)
+                self.kept_neighbours[obj].add(sub)
+            if edge.get("meta", {}).get("basicPropertyValues") and edge["pred"] not in INVALID_PREDICATES:
+                continue
+            if edge["pred"] in UPWARD_PREDICATES:
+                child, parent = sub, obj
+            elif edge["pred"] in DOWNWARD_PREDICATES:
+                child, parent = obj, sub
+            else:
+                continue
+            if parent not in self.parents[child]:
+                self.parents[child].add(parent)
+                self.children[parent].append(child)
+
+    def descendants(self, node):
+        """
+        Return node and everything below it, in breadth-first order.
+        """
+        seen = {node: None}
+        queue = [node]
+        for current in queue:
+            for child in self.children[current]:
+                if child not in seen:
+                    seen[child] = None
+                    queue.append(child)
+        return list(seen)
+
+    def closure(self, nodes):
+        """
+        Add the other end of the kept edges of nodes.
+        """
+        closed = dict.fromkeys(nodes)
+        for node in nodes:
+            closed.update(dict.fromkeys(sorted(self.kept_neighbours[node])))
+        return list(closed)
+
+    def chunks(self, anchor, nodes, max_nodes):
+        """
+        Split nodes, with the other end of their kept edges, into (anchors,
+        nodes) groups of at most max_nodes. A node with more kept edges than
+        fit is repeated in several groups, each with a slice of them.
+        """
+        groups, current = [], {}
+        for node in nodes:
+            closed = [node] + sorted(self.kept_neighbours[node] - {node})
+            if len(closed) > max_nodes:
+                size = max(max_nodes - 1, 1)
+                groups.extend(([anchor], [node] + closed[start:start + size]) for start in range(1, len(closed), size))
+                continue
+            merged = {**current, **dict.fromkeys(closed)}
+            if len(merged) > max_nodes:
+                groups.append(([anchor], list(current)))
+                merged = dict.fromkeys(closed)
+            current = merged
+        if current:
+            groups.append(([anchor], list(current)))
+        return groups
+
+    def groups(self, max_nodes):
+        """
+        Return (anchors, nodes) groups, nodes including the other end of
+        their kept edges: the subtree of a node when it fits in max_nodes,
+        otherwise the groups of its children. A leaf, or a subtree only
+        reachable through a cycle, that does not fit is cut into chunks.
+        Also return the nodes that were split, which make the overview.
+        """
+        roots = [node for node in self.classes if not self.parents[node]]
+        groups, split = [], []
+        covered = set()
+        stack = list(reversed(roots))
+        while stack:
+            node = stack.pop()
+            nodes = self.descendants(node)
+            closed = self.closure(nodes)
+            if len(closed) <= max_nodes:
+                groups.append(([node], closed))
+                covered.update(nodes)
+            elif not self.children[node]:
+                groups.extend(self.chunks(node, nodes, max_nodes))
+                covered.update(nodes)
+            elif node not in split:
+                split.append(node)
+                stack.extend(reversed(self.children[node]))
+        # Nodes only reachable through a cycle
+        for node in self.classes:
+            if node not in covered and node not in split:
+                nodes = self.descendants(node)
+                groups.extend(self.chunks(node, nodes, max_nodes))
+                covered.update(nodes)
+        return groups, split
+
+    def pack(self, groups, max_nodes):
+        """
+        Merge consecutive small groups while they fit in max_nodes.
+        """
+        parts = []
+        for anchors, nodes in groups:
+            if parts:
+                last_anchors, last_nodes = parts[-1]
+                merged = list(dict.fromkeys(last_nodes + nodes))
+                if len(merged) <= max_nodes:
+                    parts[-1] = (list(dict.fromkeys(last_anchors + anchors)), merged)
+                    continue
+            parts.append((anchors, nodes))
+        return parts
+
+    def subgraph(self, nodes):
+        """
+        Return a copy of the graph restricted to nodes (and the non-class
+        nodes), with the edges between them.
+        """
+        node_ids = set(nodes)
+        graph = {key: value for key, value in self.graph.items() if key not in ("nodes", "edges")}
+        graph["nodes"] = [
+            copy.deepcopy(node) for node in self.graph.get("nodes", [])
+            if node["id"] in node_ids or node.get("type", "CLASS") != "CLASS"
+        ]
+        graph["edges"] = [
+            copy.deepcopy(edge) for edge in self.graph.get("edges", [])
+            if edge["sub"] in node_ids and edge["obj"] in node_ids
+        ]
+        return graph
+
+    def title(self, anchors, shown=3):
+        labels = [self.labels.get(anchor, anchor) for anchor in anchors]
+        if len(labels) > shown:
+            return f"{', '.join(labels[:shown])} and {len(labels) - shown} more"
+        return ", ".join(labels)
+
+    def partition(self, max_nodes=MAX_NODES):
+        """
+        Return None when the graph fits in max_nodes. Otherwise return the
+        overview graph and a list of (title, graph) parts.
+        """
+        if len(self.classes) <= max_nodes:
+            return None
+        groups, split = self.groups(max_nodes)
+        parts = [
+            (self.title(anchors), self.subgraph(nodes))
+            for anchors, nodes in self.pack(groups, max_nodes)
+        ]
+        overview_nodes = list(dict.fromkeys(split + [anchors[0] for anchors, _ in groups]))
+        return self.subgraph(overview_nodes[:max_nodes]), parts
+
+
+def remove_stale_parts(parts_dir, name, count):
+    """
+    Remove the files of parts numbered above count from a previous run.
+    """
+    pattern = re.compile(rf"(?:ccf_)?{re.escape(name)}_part(\d+)(?:_graph)?\.\w+$")
+    for file_name in os.listdir(parts_dir):
+        match = pattern.match(file_name)
+        if match and int(match.group(1)) > count:
+            os.remove(os.path.join(parts_dir, file_name))
+
+
+def main(args):
+    with open(args.input, "r", encoding="utf-8") as f:
+        document = json.load(f)
+
+    name = args.name or os.path.basename(args.input).split("_f.json")[0].split(".json")[0]
+    result = GraphPartitioner(document["graphs"][0]).partition(args.max_nodes)
+    parts = []
+    if result is None:
+        overview = document
+    else:
+        overview_graph, parts = result
+        overview = {**document, "graphs": [overview_graph]}
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(overview, f, ensure_ascii=False, indent=2)
+
+    os.makedirs(args.parts_dir, exist_ok=True)
+    remove_stale_parts(args.parts_dir, name, len(parts))
+    manifest = []
+    for number, (title, graph) in enumerate(parts, start=1):
+        part_name = f"{name}_part{number}"
+        with open(os.path.join(args.parts_dir, f"{part_name}.json"), "w", encoding="utf-8") as f:
+            json.dump({**document, "graphs": [graph]}, f, ensure_ascii=False, indent=2)
+        manifest.append({"name": part_name, "title": title, "nodes": len(graph["nodes"])})
+
+    manifest_path = os.path.join(args.parts_dir, MANIFEST)
+    if manifest:
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+    elif os.path.isfile(manifest_path):
+        os.remove(manifest_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", help="obographs json of the organ")
+    parser.add_argument("output", help="json to render as the organ graph (overview when partitioned)")
+    parser.add_argument("-p", "--parts-dir", required=True, help="directory for the parts and parts.json")
+    parser.add_argument("-n", "--name", help="organ name, used to name the parts")
+    parser.add_argument("-m", "--max-nodes", type=int, default=MAX_NODES, help="maximum number of nodes per graph")
+
+    args = parser.parse_args()
+    main(args)
@@ -2,11 +2,24 @@
 Description: This script is used to query the Human Reference Atlas (HRA)
 SPARQL endpoint to get the 3D images of the reference organs.
 """
+import argparse
+import csv
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
-from rdflib.graph import ConjunctiveGraph
-from SPARQLWrapper import JSON, RDFXML, SPARQLWrapper
+from rdflib import Literal, URIRef
+from rdflib.graph import ConjunctiveGraph, Graph
+from rdflib.namespace import FOAF, XSD
+from SPARQLWrapper import JSON, RDFXML
+
+from rdf_tools import STREAM_FORMATS, TripleWriter, convert_rdf
+from sparql_client import HRA, shared_client
 
 REF_ORGAN_BASE_URI = "https://purl.humanatlas.io/ref-organ/"
+IMAGES_OWL = "../owl/hra_uberon_3d_images"
+REF_OBJECTS_CSV = "../reports/hra_uberon_3d_ref_objects.csv"
 GRAPH_NAME_LIST = [
     "brain-female",
     "brain-male",
@@ -81,7 +94,8 @@ class HRAWrapper():
     Class to query the Human Reference Atlas (HRA) SPARQL endpoint.
     """
     def __init__(self):
-        self.sparql = SPARQLWrapper("https://lod.humanatlas.io/sparql")
+        self.endpoint = HRA
+        self.client = shared_client(self.endpoint)
         self.construct_images_uberon = """
             PREFIX owl: <http://www.w3.org/2002/07/owl#>
             PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
@@ -134,15 +148,53 @@ class HRAWrapper():
             }}
         """
 
+        self.select_images_by_graph = """
+            PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+            PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+            PREFIX ccf: <http://purl.org/ccf/>
+            PREFIX anatomical_entity: <http://purl.obolibrary.org/obo/UBERON_0001062>
+
+            SELECT DISTINCT ?g ?representation_of ?glb_file
+            WHERE {{
+                VALUES ?g {{
+                    {graph_names}
+                }}
+                GRAPH ?g {{
+                    ?uberon rdfs:subClassOf* anatomical_entity: .
+                    ?x rdf:type ccf:SpatialEntity .
+                    ?x rdf:type ?uberon .
+                    ?x ccf:representation_of ?uberon .
+                    ?x ccf:has_object_reference [
+                        ccf:file_url ?url
+                    ] .
+                    BIND(?uberon as ?representation_of) .
+                    BIND(?url as ?glb_file) .
+                }}
+            }}
+        """
+        self.select_graph_version = """
+            PREFIX owl: <http://www.w3.org/2002/07/owl#>
+            PREFIX schema: <http://schema.org/>
+
+            SELECT ?g (MAX(STR(?v)) as ?version)
+            WHERE {{
+                VALUES ?g {{
+                    {graph_names}
+                }}
+                GRAPH ?g {{
+                    ?s owl:versionIRI|owl:versionInfo|schema:version ?v .
+                }}
+            }}
+            GROUP BY ?g
+        """
+
     def query_hra(self, query, format_result):
         """
         Query the HRA SPARQL endpoint and return the results.
+        The client uses a new connection per query so it can be called
+        from several worker threads.
         """
-        self.sparql.setQuery(query)
-        self.sparql.setReturnFormat(format=format_result)
-        result = self.sparql.query().convert()
-
-        return result
+        return self.client.query(query, format_result)
 
     def extract_result(self, results):
         """
@@ -156,30 +208,224 @@ class HRAWrapper():
             results_simplified.append(r)
         return results_simplified
 
-
-if __name__ == '__main__':
-    hra = HRAWrapper()
-    images_link = ConjunctiveGraph()
-    images_link_table = []
-    for graph_name in GRAPH_NAME_LIST:
-        graph_iri = f"<{REF_ORGAN_BASE_URI}{graph_name}>"
-
-        images_link += hra.query_hra(
-            hra.construct_images_uberon.format(graph_name=graph_iri),
+    def get_graph_images(self, graph_name):
+        """
+        Run the CONSTRUCT and SELECT queries for one reference organ graph.
+        Return the images graph and the table rows.
+        """
+        graph_iri = graph_to_iri(graph_name)
+        images = self.query_hra(
+            self.construct_images_uberon.format(graph_name=graph_iri),
             RDFXML
         )
-        ilt = hra.extract_result(
-                hra.query_hra(
-                    hra.reference_organ_spatial_entity.format(
-                        graph_name=graph_iri
-                    ),
-                    JSON
-                )["results"]["bindings"]
+        rows = self.extract_result(
+            self.query_hra(
+                self.reference_organ_spatial_entity.format(
+                    graph_name=graph_iri
+                ),
+                JSON
+            )["results"]["bindings"]
+        )
+        return images, rows
+
+    def get_graphs_images(self, graph_names):
+        """
+        Query many reference organ graphs in one request using VALUES ?g.
+        Return a dict graph name -> (images graph, table rows).
+        """
+        bindings = self.query_hra(
+            self.select_images_by_graph.format(
+                graph_names="\n".join(map(graph_to_iri, graph_names))
+            ),
+            JSON
+        )["results"]["bindings"]
+
+        results = {name: (Graph(), []) for name in graph_names}
+        for row in self.extract_result(bindings):
+            images, rows = results[row.pop("g")[len(REF_ORGAN_BASE_URI):]]
+            images.add((
+                URIRef(row["representation_of"]),
+                FOAF.depiction,
+                Literal(row["glb_file"], datatype=XSD.anyURI)
+            ))
+            rows.append(row)
+        return results
+
+    def get_graph_versions(self, graph_names):
+        """
+        Return a dict graph name -> version for the graphs with version
+        metadata.
+        """
+        bindings = self.query_hra(
+            self.select_graph_version.format(
+                graph_names="\n".join(map(graph_to_iri, graph_names))
+            ),
+            JSON
+        )["results"]["bindings"]
+
+        return {
+            row["g"][len(REF_ORGAN_BASE_URI):]: row["version"]
+            for row in self.extract_result(bindings)
+        }
+
+
+def graph_to_iri(graph_name):
+    """
+    Return the reference organ graph IRI for a graph name.
+    """
+    return f"<{REF_ORGAN_BASE_URI}{graph_name}>"
+
+
+def read_cache(cache_dir, graph_name, version):
+    """
+    Return the cached images graph and rows for a graph if the cached
+    version matches, otherwise None.
+    """
+    path = os.path.join(cache_dir, f"{graph_name}.json")
+    if version is None or not os.path.isfile(path):
+        return None
+
+    with open(path, "r", encoding="utf-8") as f:
+        cached = json.load(f)
+    if cached["version"] != version:
+        return None
+
+    images = Graph().parse(data=cached["triples"], format="nt")
+    return images, cached["rows"]
+
+
+def write_cache(cache_dir, graph_name, version, images, rows):
+    """
+    Store the images graph and rows of a graph for its version.
+    """
+    if version is None:
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(
+        os.path.join(cache_dir, f"{graph_name}.json"), "w", encoding="utf-8"
+    ) as f:
+        json.dump({
+            "version": version,
+            "triples": images.serialize(format="nt"),
+            "rows": rows
+        }, f, ensure_ascii=False)
+
+
+def harvest(hra, graph_names, workers=1, batch_size=0, cache_dir=None):
+    """
+    Yield (graph name, images graph, rows) for each reference organ graph
+    as soon as its result is available, cached graphs first and then the
+    queried ones in the order of graph_names.
+    Graphs are queried by a pool of workers, one graph or, when batch_size
+    is set, batch_size graphs per request. With a cache directory, graphs
+    whose version did not change since the last run are not queried.
+    """
+    versions = {}
+    to_query = []
+    if cache_dir:
+        versions = hra.get_graph_versions(graph_names)
+    for graph_name in graph_names:
+        cached = None
+        if cache_dir:
+            cached = read_cache(cache_dir, graph_name, versions.get(graph_name))
+        if cached is None:
+            to_query.append(graph_name)
+        else:
+            yield (graph_name, *cached)
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        if batch_size:
+            batches = [
+                to_query[i:i + batch_size]
+                for i in range(0, len(to_query), batch_size)
+            ]
+            results = (
+                (graph_name, batch_results[graph_name])
+                for batch_results in executor.map(
+                    hra.get_graphs_images, batches
+                )
+                for graph_name in batch_results
+            )
+        else:
+            results = zip(
+                to_query, executor.map(hra.get_graph_images, to_query)
             )
-        if ilt:
-            images_link_table.extend(ilt)
 
-    images_link.serialize("../owl/hra_uberon_3d_images.owl", format="xml")
-    pd.DataFrame.from_records(images_link_table)\
-        .sort_values(by="representation_of")\
-        .to_csv("../reports/hra_uberon_3d_ref_objects.csv", index=False)
+        for graph_name, (images, rows) in results:
+            if cache_dir:
+                write_cache(
+                    cache_dir, graph_name, versions.get(graph_name),
+                    images, rows
+                )
+            yield graph_name, images, rows
+
+
+def stream_images(hra, graph_names, rdf_format, rdfxml=False, **kwargs):
+    """
+    Write the images triples as each graph result arrives, and the 3D
+    reference objects table, without duplicates and sorted by
+    representation_of, once all results are in: it has one small row per
+    object. The triples file is converted to RDF/XML in a final pass only
+    if rdfxml is set.
+    """
+    rows = set()
+    triples_path = f"{IMAGES_OWL}.{rdf_format}"
+    with TripleWriter(triples_path, rdf_format) as triples:
+        for _, images, graph_rows in harvest(hra, graph_names, **kwargs):
+            triples.add_graph(images)
+            rows.update((row["representation_of"], row["glb_file"]) for row in graph_rows)
+
+    with open(REF_OBJECTS_CSV, "w", encoding="utf-8", newline="") as f:
+        table = csv.writer(f)
+        table.writerow(["representation_of", "glb_file"])
+        table.writerows(sorted(rows))
+
+    if rdfxml:
+        convert_rdf(triples_path, rdf_format, f"{IMAGES_OWL}.owl")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-w", "--workers", type=int, default=1,
+        help="number of concurrent requests"
+    )
+    parser.add_argument(
+        "-b", "--batch-size", type=int, default=0,
+        help="number of graphs per request, 0 to query graphs one by one"
+    )
+    parser.add_argument(
+        "-c", "--cache-dir",
+        help="directory to cache results per graph version"
+    )
+    parser.add_argument(
+        "-s", "--stream", choices=STREAM_FORMATS,
+        help="write triples in this format as results arrive"
+    )
+    parser.add_argument(
+        "--rdfxml", action="store_true",
+        help="with --stream, also write the RDF/XML file in a final pass"
+    )
+    args = parser.parse_args()
+
+    hra = HRAWrapper()
+    options = {
+        "workers": args.workers,
+        "batch_size": args.batch_size,
+        "cache_dir": args.cache_dir
+    }
+    if args.stream:
+        stream_images(hra, GRAPH_NAME_LIST, args.stream, args.rdfxml, **options)
+    else:
+        images_link = ConjunctiveGraph()
+        images_link_table = []
+        for _, images, ilt in harvest(hra, GRAPH_NAME_LIST, **options):
+            images_link += images
+            if ilt:
+                images_link_table.extend(ilt)
+
+        images_link.serialize(f"{IMAGES_OWL}.owl", format="xml")
+        pd.DataFrame.from_records(images_link_table)\
+            .sort_values(by="representation_of")\
+            .to_csv(REF_OBJECTS_CSV, index=False)
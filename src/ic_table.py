@@ -0,0 +1,123 @@
+"""
+Normalized information content (IC) of UBERON, CL and PCL terms, stored per
+ontology version as a memory-mapped NumPy array with a CURIE to index map,
+so that the IC of thousands of terms is looked up at once without a
+remote call.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+from closure_index import (PAGE_SIZE, UBERGRAPH, fetch_pages, latest_directory, prefix_filter, query_versions,
+                           version_key)
+from term_ids import iri_to_curie as to_curie
+from term_ids import iris_to_curies
+
+# Dataset and pattern of the IC values, queried by fetch_pages
+IC = """
+  FROM <http://reasoner.renci.org/ontology>
+  {
+    ?subject <http://reasoner.renci.org/vocab/normalizedInformationContent> ?object .
+    FILTER (%s)
+  }
+"""
+
+
+def fetch_ic(endpoint=UBERGRAPH, page_size=PAGE_SIZE):
+    """
+    Yield (CURIE, normalized IC) from ubergraph, one page at a time.
+    """
+    for b in fetch_pages(IC % prefix_filter("subject"), endpoint, page_size):
+        yield to_curie(b["subject"]["value"]), float(b["object"]["value"])
+
+
+def read_ic_tsv(path):
+    """
+    Read term, IC rows from a local dump.
+    """
+    import pandas as pd
+    rows = pd.read_csv(path, sep="\t", header=None, names=["term", "ic"], dtype={"term": str, "ic": float},
+                       keep_default_na=False)
+    yield from zip(iris_to_curies(rows["term"]), rows["ic"].astype(float))
+
+
+def build(rows, directory, versions=None):
+    """
+    Write terms.npy and ic.npy from (CURIE, IC) rows.
+    """
+    values = dict(rows)
+    terms = sorted(values)
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, "terms.npy"), np.array(terms, dtype=str))
+    np.save(os.path.join(directory, "ic.npy"), np.array([values[term] for term in terms], dtype=np.float64))
+    with open(os.path.join(directory, "versions.json"), "w", encoding="utf-8") as f:
+        json.dump(versions or {}, f, indent=2)
+    return directory
+
+
+def build_from_ubergraph(base_dir, endpoint=UBERGRAPH):
+    """
+    Build the table of the current ubergraph ontology versions, unless it
+    already exists. Return its directory.
+    """
+    versions = query_versions(endpoint)
+    directory = os.path.join(base_dir, version_key(versions))
+    if not os.path.isfile(os.path.join(directory, "versions.json")):
+        build(fetch_ic(endpoint), directory, versions)
+    return directory
+
+
+class ICTable():
+    """
+    Memory-mapped IC table of one ontology version.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.terms = np.load(os.path.join(directory, "terms.npy"), mmap_mode="r")
+        self.ic = np.load(os.path.join(directory, "ic.npy"), mmap_mode="r")
+        self.term_ids = {str(term): i for i, term in enumerate(self.terms)}
+
+    @classmethod
+    def for_current_version(cls, base_dir, endpoint=UBERGRAPH):
+        """
+        Load the table matching the ontology versions in ubergraph, or
+        return None when it was not built.
+        """
+        directory = os.path.join(base_dir, version_key(query_versions(endpoint)))
+        if os.path.isfile(os.path.join(directory, "versions.json")):
+            return cls(directory)
+        return None
+
+    @classmethod
+    def latest(cls, base_dir):
+        """
+        Load the most recently built table, or return None when there is
+        none. Offline, but possibly not of the ontology versions in ubergraph.
+        """
+        directory = latest_directory(base_dir)
+        return cls(directory) if directory else None
+
+    def lookup(self, terms):
+        """
+        Return the IC of each term as a float array, NaN for unknown terms.
+        """
+        ids = np.fromiter((self.term_ids.get(term, -1) for term in terms), dtype=np.int64)
+        values = np.full(len(ids), np.nan)
+        known = ids >= 0
+        values[known] = self.ic[ids[known]]
+        return values
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output-dir", default="../ic_table",
+                        help="base directory, one sub-directory per ontology version")
+    parser.add_argument("--ic-tsv", help="build from term, IC rows instead of ubergraph")
+    parser.add_argument("--version", default="local", help="version name used with --ic-tsv")
+
+    args = parser.parse_args()
+    if args.ic_tsv:
+        print(build(read_ic_tsv(args.ic_tsv), os.path.join(args.output_dir, args.version), {"ic": args.version}))
+    else:
+        print(build_from_ubergraph(args.output_dir))
@@ -0,0 +1,85 @@
+"""
+Import-time benchmark of the pipeline modules, to keep script startup fast.
+
+Each module is imported in a fresh interpreter, several times, and its best
+import time reported. Modules listed in LIGHT_MODULES must not load any of
+HEAVY_DEPENDENCIES on import, nor take more than --max-ms: they import
+those only in the code paths that need them. Exits with an error when a
+light module breaks either rule.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+HEAVY_DEPENDENCIES = ["pandas", "numpy", "rdflib", "SPARQLWrapper", "requests", "tabulate"]
+
+LIGHT_MODULES = [
+    "ccf_tools",
+    "term_ids",
+    "sparql_client",
+    "sparql_archive",
+    "uberongraph_tools",
+    "validation_verdicts",
+    "query_planner",
+    "warehouse",
+    "download_resource",
+    "readme_reports_generation",
+    "release_notes_generation",
+    "graph_construct",
+    "graph_partition",
+    "render_graphs",
+]
+# Modules whose code paths all need the heavy dependencies, reported only
+HEAVY_MODULES = [
+    "template_runner",
+    "template_generation_tools",
+    "hra_wrapper",
+    "dashboard_generation",
+    "closure_index",
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(module, repeat=3):
+    """
+    Best import time in milliseconds of module over repeat fresh
+    interpreters, and the heavy dependencies it loaded.
+    """
+    best, loaded = None, []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_DEPENDENCIES)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        best = result["seconds"] if best is None else min(best, result["seconds"])
+        loaded = result["loaded"]
+    return round(best * 1000, 1), loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("modules", nargs="*", help="modules to measure, all listed ones by default")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per module")
+    parser.add_argument("--max-ms", type=float, default=100, help="import time allowed to a light module")
+
+    args = parser.parse_args()
+    failures = []
+    for module in args.modules or LIGHT_MODULES + HEAVY_MODULES:
+        milliseconds, loaded = measure(module, args.repeat)
+        light = module in LIGHT_MODULES
+        print(f"{module:<28} {milliseconds:>8} ms  {'light' if light else 'heavy'}  {', '.join(loaded)}")
+        if light and loaded:
+            failures.append(f"{module} loads {', '.join(loaded)} on import")
+        if light and milliseconds > args.max_ms:
+            failures.append(f"{module} takes {milliseconds} ms to import")
+    if failures:
+        sys.exit("\n".join(failures))
@@ -0,0 +1,124 @@
+"""
+Load test of the validation against the local SPARQL stand-in of
+sparql_stub_server.py: for each table size, validate that many concurrent
+copies of a synthetic table at each concurrency level, and report
+throughput, query latency and errors.
+
+The SPARQL client settings of the environment apply (CCF_SPARQL_RATE,
+CCF_SPARQL_RETRIES, CCF_SPARQL_HEDGE_AFTER, ... see sparql_client.py), so
+that pacing, retry and hedging changes can be compared; --latency,
+--error-rate and --capacity shape the stand-in.
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ccf_tools import parse_asctb_data
+from sparql_client import SparqlClient
+from sparql_stub_server import Fixture, start_server
+from template_runner import validate_table
+from uberongraph_tools import UberonGraph
+
+COLUMNS = ["rows", "concurrency", "seconds", "tables_per_second", "queries", "queries_per_second",
+           "p50", "p95", "p99", "failed_tables", "server_errors", "server_rejected"]
+
+
+class LatencyRecorder():
+    """
+    Keep the stage and duration of each query, in place of a LatencyLog.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = []
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.records.append((stage, seconds))
+
+
+def validate(table_data, job, client, recorder, graphs):
+    ccf_tools_df, report_t, _, _, log_dict = parse_asctb_data(table_data)
+    ug = UberonGraph(client=client, latency_log=recorder)
+    validate_table(ccf_tools_df, report_t, log_dict, job, ug, graphs)
+
+
+def run(table_data, concurrency, endpoint, server=None, graphs=False):
+    """
+    Validate concurrency copies of the table at once and return the
+    measures of the run.
+    """
+    client = SparqlClient.from_env(endpoint)
+    recorder = LatencyRecorder()
+    before = dict(server.stats) if server else {}
+    failed = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(validate, table_data, f"load_{i}", client, recorder, graphs)
+                   for i in range(concurrency)]
+        for future in futures:
+            if future.exception() is not None:
+                failed += 1
+    seconds = time.perf_counter() - start
+
+    latencies = np.array([s for _, s in recorder.records]) if recorder.records else np.zeros(1)
+    measures = {
+        "rows": len(table_data),
+        "concurrency": concurrency,
+        "seconds": round(seconds, 2),
+        "tables_per_second": round((concurrency - failed) / seconds, 3),
+        "queries": len(recorder.records),
+        "queries_per_second": round(len(recorder.records) / seconds, 1),
+        "p50": round(float(np.percentile(latencies, 50)), 4),
+        "p95": round(float(np.percentile(latencies, 95)), 4),
+        "p99": round(float(np.percentile(latencies, 99)), 4),
+        "failed_tables": failed,
+    }
+    if server:
+        measures["server_errors"] = server.stats["errors"] - before["errors"]
+        measures["server_rejected"] = server.stats["rejected"] - before["rejected"]
+    return measures
+
+
+def print_measures(measures):
+    print("\t".join(str(measures.get(column, "")) for column in COLUMNS))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[25, 100, 400], help="table sizes")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8], help="tables validated at once")
+    parser.add_argument("--graphs", action="store_true", help="also build the annotation and suggestion graphs")
+    parser.add_argument("--endpoint", help="SPARQL endpoint of a running stand-in, started here by default")
+    parser.add_argument("--as-terms", type=int, default=200, help="anatomical structures of the fixture")
+    parser.add_argument("--ct-terms", type=int, default=100, help="cell types of the fixture")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every query by the stand-in")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of queries failed by the stand-in")
+    parser.add_argument("--capacity", type=int, default=0, help="queries the stand-in runs at once (0: no limit)")
+    parser.add_argument("--json", help="also write the measures to this JSON file")
+
+    args = parser.parse_args()
+    fixture = Fixture(args.as_terms, args.ct_terms)
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        server = start_server(fixture, latency=args.latency, error_rate=args.error_rate, capacity=args.capacity)
+        endpoint = f"http://localhost:{server.server_port}/sparql"
+
+    results = []
+    print("\t".join(COLUMNS))
+    for rows in args.rows:
+        table_data = fixture.table(rows)
+        for concurrency in args.concurrency:
+            measures = run(table_data, concurrency, endpoint, server, args.graphs)
+            results.append(measures)
+            print_measures(measures)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if server:
+        server.shutdown()
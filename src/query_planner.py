@@ -0,0 +1,247 @@
+"""
+Dry run of the validation: parse tables and predict, without querying
+ubergraph, how many SPARQL queries template_runner.py would send per stage
+and how long they would take.
+
+Query counts follow the chunk sizes of uberongraph_tools. Relationship
+checks are counted as if every pair reached every check, so counts are an
+upper bound; checks answered by the closure index and IC lookups answered by
+the IC table count no query, and so do the queries that the query cache or
+the pair verdicts of an UberonGraph already answer (see cached_queries).
+Durations use the mean latency of each stage in
+the latency log written by template_runner.py --latency-log.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+from collections import defaultdict
+
+from ccf_tools import chunks, pair_strings, parse_asctb
+from term_ids import TERM_IDS
+from uberongraph_tools import (ANNOTATION_CHUNK, CONSTRUCT_CHUNK, CT_SUBCLASS_CHUNK, PAIR_CHUNK,
+                               TERM_CHUNK)
+
+LATENCY_LOG = "../reports/query_latency.jsonl"
+# Seconds per query when the latency log has no record of a stage
+DEFAULT_LATENCY = {"select": 1.0, "suggestion": 5.0, "annotation": 5.0}
+
+# Relationship checks of generate_class_graph_template, in order:
+# (stage, pairs checked: "pairs" for AS-AS and CT-CT, "ct_as", or the
+# pairs found valid by a previous check, closure index relation and kind)
+RELATION_CHECKS = [
+    ("select_subclass", "pairs", ("subClassOf", "entailed")),
+    ("select_subclass", "ct_as", ("subClassOf", "entailed")),
+    ("select_subclass_ontology", "pairs", ("subClassOf", "direct")),
+    ("select_po", "pairs", ("part_of", "entailed")),
+    ("select_po", "ct_as", ("part_of", "entailed")),
+    ("select_po_nonredundant", "pairs", ("part_of", "direct")),
+    ("select_overlaps", "pairs", None),
+    ("select_overlaps", "ct_as", None),
+    ("select_overlaps_nonredundant", "pairs", None),
+    ("select_located_in", "ct_as", None),
+    ("select_ct", "pairs", ("connected_to", "entailed")),
+    ("select_ct", "ct_as", ("connected_to", "entailed")),
+    ("select_continuous_with", "pairs", None),
+    ("select_connects", "pairs", None),
+    ("select_surrounds", "pairs", None),
+    ("select_develops_from", "pairs", None),
+    ("select_has_part", "ct_as", ("has_part", "entailed")),
+    ("select_has_part", "pairs", ("has_part", "entailed")),
+    ("select_subclass_po", "ct_as", None),
+]
+
+
+def n_chunks(n, size):
+    """
+    Number of queries sent for n items: one query when they fit in a chunk,
+    even when there are none, as the validation does.
+    """
+    return math.ceil(n / size) if n > size else 1
+
+
+def table_sets(ccf_tools_df):
+    """
+    Distinct terms and pairs of a parsed table, by kind.
+    """
+    counts = defaultdict(set)
+    for s, o in zip(ccf_tools_df["s"], ccf_tools_df["o"]):
+        counts["terms"].update((s, o))
+        if ("CL" in s or "PCL" in s) and "UBERON" in o:
+            counts["ct_as"].add((s, o))
+            counts["all_ct"].add(s)
+            counts["all_as"].add(o)
+        elif "UBERON" in s and "UBERON" in o:
+            counts["as_as"].add((s, o))
+            counts["all_as"].update((s, o))
+        elif ("CL" in s or "PCL" in s) and ("CL" in o or "PCL" in o):
+            counts["ct_ct"].add((s, o))
+            counts["all_ct"].update((s, o))
+    return counts
+
+
+def table_counts(ccf_tools_df):
+    """
+    Number of distinct terms and pairs of a parsed table, by kind.
+    """
+    return {kind: len(values) for kind, values in table_sets(ccf_tools_df).items()}
+
+
+def uncached(queries, query_cache):
+    return sum(query not in query_cache for query in queries) if query_cache is not None else len(queries)
+
+
+def cached_queries(sets, ug):
+    """
+    Return {stage: number of queries} that the query cache and the pair
+    verdict cache of ug answer for a table with the given sets (see
+    table_sets). Terms are chunked as the validation does, so their queries
+    are looked up as is; pairs with a verdict are left out before chunking.
+    """
+    cached = defaultdict(int)
+    terms = sorted(sets.get("terms", ()))
+    term_chunks = [" ".join(chunk) for chunk in chunks(terms, TERM_CHUNK)] or [""]
+    for stage in ["select_class", "select_label", "select_image"]:
+        query = getattr(ug, stage)
+        cached[stage] += len(term_chunks) - uncached([query % chunk for chunk in term_chunks], ug.query_cache)
+
+    if ug.query_cache is None and ug.verdict_cache is None:
+        return dict(cached)
+    keys = {
+        "pairs": {TERM_IDS.pair_key(s, o) for s, o in sets.get("as_as", set()) | sets.get("ct_ct", set())},
+        "ct_as": {TERM_IDS.pair_key(s, o) for s, o in sets.get("ct_as", ())},
+    }
+    for stage, checked, relation in RELATION_CHECKS:
+        if ug.closure_index is not None and relation is not None and ug.closure_index.has(*relation):
+            continue
+        query = getattr(ug, stage)
+        to_check = keys[checked]
+        if ug.verdict_cache is not None:
+            to_check = ug.verdict_cache.unknown(query, to_check)
+        pair_chunks = [" ".join(chunk) for chunk in chunks(pair_strings(to_check), PAIR_CHUNK)]
+        cached[stage] += n_chunks(len(keys[checked]), PAIR_CHUNK) - uncached([query % chunk for chunk in pair_chunks],
+                                                                            ug.query_cache)
+    return dict(cached)
+
+
+def plan(counts, closure_index=None, ic_table=None, cached=None):
+    """
+    Return {stage: number of queries} for a table with the given counts,
+    less the cached queries by stage (see cached_queries).
+    """
+    terms = counts.get("terms", 0)
+    pairs = counts.get("as_as", 0) + counts.get("ct_ct", 0)
+    ct_as = counts.get("ct_as", 0)
+    queries = defaultdict(int)
+
+    queries["select_class"] += n_chunks(terms, TERM_CHUNK)
+    queries["select_label"] += n_chunks(terms, TERM_CHUNK)
+    queries["select_image"] += n_chunks(terms, TERM_CHUNK)
+
+    for stage, checked, relation in RELATION_CHECKS:
+        if closure_index is not None and relation is not None and closure_index.has(*relation):
+            continue
+        queries[stage] += n_chunks(pairs if checked == "pairs" else ct_as, PAIR_CHUNK)
+
+    if closure_index is None:
+        all_as, all_ct = counts.get("all_as", 0), counts.get("all_ct", 0)
+        as_subjects, ct_subjects = counts.get("as_as", 0), counts.get("ct_ct", 0)
+        queries["suggestion"] += n_chunks(all_as, CONSTRUCT_CHUNK) * (
+            3 * n_chunks(as_subjects, CONSTRUCT_CHUNK) + n_chunks(ct_as, CONSTRUCT_CHUNK)
+        )
+        queries["suggestion"] += n_chunks(ct_subjects, CT_SUBCLASS_CHUNK) * n_chunks(all_ct, TERM_CHUNK)
+
+    if ic_table is None:
+        queries["select_normalized_ic"] += math.ceil(terms / TERM_CHUNK)
+    queries["annotation"] += n_chunks(terms, ANNOTATION_CHUNK)
+    for stage, count in (cached or {}).items():
+        queries[stage] = max(queries[stage] - count, 0)
+    return dict(queries)
+
+
+def read_latencies(path=LATENCY_LOG):
+    """
+    Mean seconds per query of each stage in a latency log.
+    """
+    totals = defaultdict(lambda: [0.0, 0])
+    if path and os.path.isfile(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                totals[record["stage"]][0] += record["seconds"]
+                totals[record["stage"]][1] += 1
+    return {stage: total / count for stage, (total, count) in totals.items()}
+
+
+def latency(stage, latencies):
+    if stage in latencies:
+        return latencies[stage]
+    kind = "select" if stage.startswith("select") else stage
+    selects = [seconds for name, seconds in latencies.items() if name.startswith("select")]
+    if kind == "select" and selects:
+        return sum(selects) / len(selects)
+    return DEFAULT_LATENCY[kind]
+
+
+def estimate(queries, latencies):
+    """
+    Estimated seconds of the queries, sent one after the other.
+    """
+    return sum(count * latency(stage, latencies) for stage, count in queries.items())
+
+
+def plan_table(path, closure_index=None, ic_table=None, latencies=None):
+    ccf_tools_df = parse_asctb(path)[0]
+    counts = table_counts(ccf_tools_df)
+    queries = plan(counts, closure_index, ic_table)
+    return {
+        "table": os.path.splitext(os.path.basename(path))[0],
+        "counts": counts,
+        "queries": queries,
+        "total_queries": sum(queries.values()),
+        "estimated_seconds": round(estimate(queries, latencies or {}), 1),
+    }
+
+
+def print_plan(table_plan):
+    counts = table_plan["counts"]
+    print(f"{table_plan['table']}: {counts.get('terms', 0)} terms, {counts.get('as_as', 0)} AS-AS, "
+          f"{counts.get('ct_ct', 0)} CT-CT, {counts.get('ct_as', 0)} CT-AS pairs")
+    for stage, count in sorted(table_plan["queries"].items(), key=lambda item: -item[1]):
+        if count:
+            print(f"  {stage:<30} {count:>6}")
+    print(f"  {'total':<30} {table_plan['total_queries']:>6}  ~{table_plan['estimated_seconds']}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("tables", nargs="+", help="ASCT+B JSON files")
+    parser.add_argument("--closure-index", help="closure index base directory")
+    parser.add_argument("--ic-table", help="IC table base directory")
+    parser.add_argument("--latency-log", default=LATENCY_LOG, help="latency log of previous runs")
+    parser.add_argument("--max-queries", type=int, help="exit with an error when a table needs more queries")
+    parser.add_argument("--json", action="store_true", help="print the plans as JSON")
+
+    args = parser.parse_args()
+    # No ubergraph query for the current versions: the latest local builds
+    from closure_index import ClosureIndex
+    from ic_table import ICTable
+    closure_index = ClosureIndex.latest(args.closure_index) if args.closure_index else None
+    ic_table = ICTable.latest(args.ic_table) if args.ic_table else None
+    print(f"Closure index: {closure_index.directory if closure_index else None}, "
+          f"IC table: {ic_table.directory if ic_table else None}", file=sys.stderr)
+    latencies = read_latencies(args.latency_log)
+
+    plans = [plan_table(path, closure_index, ic_table, latencies) for path in args.tables]
+    if args.json:
+        print(json.dumps(plans, indent=2))
+    else:
+        for table_plan in plans:
+            print_plan(table_plan)
+        print(f"All tables: {sum(p['total_queries'] for p in plans)} queries, "
+              f"~{round(sum(p['estimated_seconds'] for p in plans), 1)}s")
+
+    oversized = [p["table"] for p in plans if args.max_queries and p["total_queries"] > args.max_queries]
+    if oversized:
+        sys.exit(f"Over {args.max_queries} queries: {', '.join(oversized)}")
@@ -0,0 +1,148 @@
+"""
+Helpers to write RDF triples to file as they are produced, without
+keeping them in an rdflib graph.
+"""
+import re
+
+from rdflib import BNode, Literal
+from rdflib.graph import Graph
+
+STREAM_FORMATS = ["nt", "ttl"]
+RDF_EXTENSIONS = {"xml": "owl", "nt": "nt", "ttl": "ttl"}
+# Characters not allowed as such in an N-Triples IRIREF
+IRI_ESCAPES = re.compile(r'[\x00-\x20<>"{}|^`\\]')
+
+
+def escape_literal(value):
+    """
+    Escape a lexical form for N-Triples.
+    """
+    return value.replace("\\", "\\\\")\
+        .replace('"', '\\"')\
+        .replace("\n", "\\n")\
+        .replace("\r", "\\r")
+
+
+def escape_iri(value):
+    """
+    Escape an IRI for N-Triples, writing the characters it does not allow
+    as \\u escapes.
+    """
+    return IRI_ESCAPES.sub(lambda match: f"\\u{ord(match.group()):04X}", value)
+
+
+def nt_term(term):
+    """
+    Return the N-Triples representation of an rdflib term.
+    """
+    if isinstance(term, Literal):
+        lexical = f'"{escape_literal(str(term))}"'
+        if term.language:
+            return f"{lexical}@{term.language}"
+        if term.datatype:
+            return f"{lexical}^^<{escape_iri(term.datatype)}>"
+        return lexical
+    if isinstance(term, BNode):
+        return f"_:{term}"
+    return f"<{escape_iri(term)}>"
+
+
+def nt_line(triple):
+    """
+    Return a triple as one N-Triples line.
+    """
+    return " ".join(map(nt_term, triple)) + " .\n"
+
+
+class TripleWriter():
+    """
+    Write triples to an N-Triples or Turtle file as they are added,
+    skipping triples already written in the same batch. N-Triples lines are
+    also valid Turtle, so both formats are written the same way.
+
+    Only the lines of the current batch are kept, so that memory does not
+    grow with the file: a batch is one add_graph call, e.g. one query
+    result, whose triples are already in memory. A triple repeated across
+    batches is written again, which is harmless, as RDF parsers merge it.
+    """
+    def __init__(self, path, rdf_format="nt"):
+        if rdf_format not in STREAM_FORMATS:
+            raise ValueError(f"Unsupported streaming format '{rdf_format}'")
+        self.path = path
+        self.rdf_format = rdf_format
+        self.seen = set()
+        self.file = open(path, "w", encoding="utf-8")
+
+    def add(self, triple):
+        """
+        Write a triple unless it was already written in this batch.
+        """
+        line = nt_line(triple)
+        if line not in self.seen:
+            self.seen.add(line)
+            self.file.write(line)
+
+    def add_graph(self, triples):
+        """
+        Write all triples of a graph or any iterable of triples, as a new
+        batch.
+        """
+        self.seen.clear()
+        for triple in triples:
+            self.add(triple)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert_rdf(path, rdf_format, output, output_format="xml"):
+    """
+    Read a streamed RDF file and write it in another format in one pass.
+    """
+    Graph().parse(path, format=rdf_format).serialize(
+        output, format=output_format
+    )
+
+
+class TripleSet():
+    """
+    Accumulate the triples of several query results in a plain set,
+    instead of adding them one by one to a ConjunctiveGraph store.
+    """
+    def __init__(self, triples=()):
+        self.triples = set(triples)
+
+    def __iadd__(self, triples):
+        self.triples.update(triples)
+        return self
+
+    def __iter__(self):
+        return iter(self.triples)
+
+    def __len__(self):
+        return len(self.triples)
+
+    def to_graph(self):
+        """
+        Return the triples as an rdflib graph, added in one batch.
+        """
+        graph = Graph()
+        graph.addN((s, p, o, graph) for s, p, o in self.triples)
+        return graph
+
+    def serialize(self, destination, format="xml"):
+        """
+        Write the triples to destination. Streaming formats are written
+        line by line, other formats go through an rdflib graph.
+        """
+        if format in STREAM_FORMATS:
+            with TripleWriter(destination, format) as writer:
+                writer.add_graph(self.triples)
+        else:
+            self.to_graph().serialize(destination, format=format)
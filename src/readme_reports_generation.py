@@ -1,11 +1,11 @@
-import argparse, json
+import argparse, io, json, os, re, shutil
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import cached_property
 from mdutils.fileutils.fileutils import MarkDownFile
 from mdutils.mdutils import MdUtils
-from tabulate import tabulate
-import pandas as pd
 
-from download_resource import get_sheet_gid
+from download_resource import get_config, get_sheet_gid
 
 def generate_template_readme(file_name, table):
   date = datetime.today().strftime('%Y-%m-%d')
@@ -133,15 +133,27 @@ def generate_template_readme(file_name, table):
   template.new_table_of_contents(table_title="Table of contents", depth=2)
   return template, markers_dict
 
-def get_row_link(table, row):
-  table_config = get_sheet_gid(table, "False")
+class ReportContext():
+  """Holds what the reports of one table share: the table name and its
+  sheet URL, built from config_asct.json only once"""
+  def __init__(self, table, table_config=None):
+    self.table = table
+    self.table_config = table_config
 
-  URL = f'https://docs.google.com/spreadsheets/d/{table_config["sheetId"]}/edit#gid={table_config["gid"]}&range={row}:{row}'
+  @cached_property
+  def sheet_url(self):
+    table_config = self.table_config or get_sheet_gid(self.table, "False")
+    return f'https://docs.google.com/spreadsheets/d/{table_config["sheetId"]}/edit#gid={table_config["gid"]}&range='
 
-  return URL
+  def row_link(self, row):
+    return f'{self.sheet_url}{row}:{row}'
+
+  def rows_link(self, rows: list):
+    return ", ".join(f'_[{row}]({self.row_link(row)})_' for row in rows)
 
 def compact_issues(items: list, element: str):
     compacted_items = {}
+    seen_rows = {}
     
     for item in items:
         key = item[element]
@@ -150,23 +162,21 @@ def compact_issues(items: list, element: str):
             compacted_items[key] = item.copy()
             compacted_items[key]["rows"] = [item["row_number"]]
             compacted_items[key].pop("row_number")
-        else:
-            if item["row_number"] not in compacted_items[key]["rows"]:
-                compacted_items[key]["rows"].append(item["row_number"])
+            seen_rows[key] = {item["row_number"]}
+        elif item["row_number"] not in seen_rows[key]:
+            seen_rows[key].add(item["row_number"])
+            compacted_items[key]["rows"].append(item["row_number"])
     
     return list(compacted_items.values())
 
-def list_rows_link(table: str, rows: list):
-    return (", ").join(list(map(lambda x: f'_[{x}]({get_row_link(table, x)})_', rows)))
-
-def generate_invalid_terms_report(log_dict, table):
+def generate_invalid_terms_report(log_dict, context: ReportContext):
     terms_report = {
-        "no_found_id": "",
-        "typos": "",
-        "diff_label": "",
-        "blank": "",
-        "external": "",
-        "no_parent": ""
+        "no_found_id": [],
+        "typos": [],
+        "diff_label": [],
+        "blank": [],
+        "external": [],
+        "no_parent": []
     }
     
     blank = []
@@ -177,8 +187,8 @@ def generate_invalid_terms_report(log_dict, table):
         if issue_list:
             compacted_issues = compact_issues(issue_list, "id" if report_key == "typos" or report_key == "external" else "user_label")
             for issue in compacted_issues:
-                rows = list_rows_link(table, issue["rows"])
-                terms_report[report_key] += message_template.format(
+                rows = context.rows_link(issue["rows"])
+                terms_report[report_key].append(message_template.format(
                     issue_id=issue.get("id", "") if report_key != "diff_label" else add_base_iri(issue["id"]),
                     user_label=issue.get("user_label", ""),
                     asct_label=issue.get("asct_label", ""),
@@ -186,9 +196,9 @@ def generate_invalid_terms_report(log_dict, table):
                     rows_count=len(issue["rows"]),
                     rows_s_or_p="rows" if len(issue["rows"]) > 1 else "row",
                     rows=rows
-                )
+                ))
         else:
-            terms_report[report_key] = "- No issues found.\n\n"
+            terms_report[report_key] = ["- No issues found.\n\n"]
     
     for issue in log_dict["no_valid_id"]:
         if issue["id"] == "":
@@ -216,12 +226,12 @@ def generate_invalid_terms_report(log_dict, table):
                         "1. The term _{user_label}_ without ontology ID has no parent that is from the CL ontology in the following {rows_count} {rows_s_or_p} {rows}.\n\n")
     
     for issue in log_dict["no_found_id"]:
-        terms_report["no_found_id"] += f'1. {issue["id"]}\n\n'
+        terms_report["no_found_id"].append(f'1. {issue["id"]}\n\n')
         
     if not log_dict["no_found_id"]:
-      terms_report["no_found_id"] = "- No issues found.\n\n"
+      terms_report["no_found_id"] = ["- No issues found.\n\n"]
 
-    return terms_report
+    return {key: "".join(fragments) for key, fragments in terms_report.items()}
 
 
 def add_base_iri(content):
@@ -230,38 +240,37 @@ def add_base_iri(content):
 
   return f'[{content}]({content_uri})'
 
-def generate_readme(file, data, table):
-  readme, markers_dict = generate_template_readme(file, table)
-  
-  terms_report = generate_invalid_terms_report(data, table)
-
-  rel_report = generate_relationship_md(table)
-
-  readme.file_data_text = readme.place_text_using_marker(text=terms_report["no_found_id"], marker=markers_dict["nfound"])
-
-  readme.file_data_text = readme.place_text_using_marker(text=terms_report["typos"], marker=markers_dict["typos"])
-
-  readme.file_data_text = readme.place_text_using_marker(text=terms_report["diff_label"], marker=markers_dict["diff_label"])
-
-  readme.file_data_text = readme.place_text_using_marker(text=terms_report["blank"], marker=markers_dict["blank"])
-  
-  readme.file_data_text = readme.place_text_using_marker(text=terms_report["no_parent"], marker=markers_dict["no_parent"])
+MARKER_PATTERN = re.compile(r"(##--\[[^\]]*\]--##)")
 
-  readme.file_data_text = readme.place_text_using_marker(text=terms_report["external"], marker=markers_dict["external"])
+def place_texts_using_markers(text, marker_texts):
+  """Replaces every marker of marker_texts in text in a single pass"""
+  fragments = MARKER_PATTERN.split(text)
+  return "".join(marker_texts.get(fragment, fragment) for fragment in fragments)
 
-  readme.file_data_text = readme.place_text_using_marker(text=rel_report["as-as"], marker=markers_dict["as-as_report"])
-
-  readme.file_data_text = readme.place_text_using_marker(text=rel_report["ct-ct"], marker=markers_dict["ct-ct_report"])
+def generate_readme(file, data, table, table_config=None, error_log=None):
+  readme, markers_dict = generate_template_readme(file, table)
   
-  readme.file_data_text = readme.place_text_using_marker(text=rel_report["ct-as"], marker=markers_dict["ct-as_report"])
-
-  readme.file_data_text = readme.place_text_using_marker(text=readme.new_inline_link(f'new_cl_terms_{args.table}.tsv', text="Report", bold_italics_code='b'), marker=markers_dict["new_cl"])
-
-  readme.file_data_text = readme.place_text_using_marker(text=readme.new_inline_link(f'new_uberon_terms_{args.table}.tsv', text="Report", bold_italics_code='b'), marker=markers_dict["new_uberon"])
-
-  readme.file_data_text = readme.place_text_using_marker(text=readme.new_inline_link(f'class_{args.table}_indirect_log.tsv', text="Report", bold_italics_code='b'), marker=markers_dict["indirect"])
-
-  readme.file_data_text = readme.place_text_using_marker(text=readme.new_inline_link(f'{args.table}_AS_has_part_CT_log.tsv', text="Report", bold_italics_code='b'), marker=markers_dict["has_part"])
+  context = ReportContext(table, table_config)
+
+  terms_report = generate_invalid_terms_report(data, context)
+
+  rel_report = generate_relationship_md(context, error_log)
+
+  readme.file_data_text = place_texts_using_markers(readme.file_data_text, {
+    markers_dict["nfound"]: terms_report["no_found_id"],
+    markers_dict["typos"]: terms_report["typos"],
+    markers_dict["diff_label"]: terms_report["diff_label"],
+    markers_dict["blank"]: terms_report["blank"],
+    markers_dict["no_parent"]: terms_report["no_parent"],
+    markers_dict["external"]: terms_report["external"],
+    markers_dict["as-as_report"]: rel_report["as-as"],
+    markers_dict["ct-ct_report"]: rel_report["ct-ct"],
+    markers_dict["ct-as_report"]: rel_report["ct-as"],
+    markers_dict["new_cl"]: readme.new_inline_link(f'new_cl_terms_{table}.tsv', text="Report", bold_italics_code='b'),
+    markers_dict["new_uberon"]: readme.new_inline_link(f'new_uberon_terms_{table}.tsv', text="Report", bold_italics_code='b'),
+    markers_dict["indirect"]: readme.new_inline_link(f'class_{table}_indirect_log.tsv', text="Report", bold_italics_code='b'),
+    markers_dict["has_part"]: readme.new_inline_link(f'{table}_AS_has_part_CT_log.tsv', text="Report", bold_italics_code='b'),
+  })
   
   readme.create_md_file()
 
@@ -288,6 +297,17 @@ def generate_graph_template(file, table):
 
   template.new_paragraph(template.new_inline_image (text=f"{table} ASCT+B table in graph", path=f"assets/ccf_{table}_graph.png"))
 
+  parts_manifest = os.path.join(os.path.dirname(file), "assets", "parts", "parts.json")
+  if os.path.isfile(parts_manifest):
+    with open(parts_manifest, "r", encoding="utf-8") as f:
+      parts = json.load(f)
+    template.new_header(level=2, title="Graph parts")
+    template.new_paragraph(text="This graph is too large to be drawn at once, so the image above only shows how its top-level anatomical structures are related. The graph is split into the parts below, one per top-level anatomical structure. Every red and light green edge is kept in each part it touches, with the term at its other end.")
+    template.new_list([
+      f'{part["title"]}: ' + template.new_inline_link(f'assets/parts/ccf_{part["name"]}_graph.png', text="PNG") + ", " + template.new_inline_link(f'assets/parts/ccf_{part["name"]}_graph.pdf', text="PDF")
+      for part in parts
+    ])
+
   return template
 
 def generate_graph_page(file, table):
@@ -295,14 +315,11 @@ def generate_graph_page(file, table):
 
   graph_page.create_md_file()
 
-def add_row_n_term_link(report, table):
-  for row in report.itertuples():
-    row_n = row.row_number
-    term_s = row.s
-    term_o = row.o
-    report.at[row.Index, "row_number"] = f'[{row_n}]({get_row_link(table, row_n)})'
-    report.at[row.Index, "s"] = add_base_iri(term_s)
-    report.at[row.Index, "o"] = add_base_iri(term_o)
+def add_row_n_term_link(report, context: ReportContext):
+  from report_decoration import iri_links, row_links
+  report["row_number"] = row_links(report["row_number"], context.sheet_url)
+  report["s"] = iri_links(report["s"])
+  report["o"] = iri_links(report["o"])
 
   return report
 
@@ -315,15 +332,29 @@ def split_report(report):
   return report_as, report_ct, report_ct_as
 
 def tsv2md(report):
+  from tabulate import tabulate
   return tabulate(report, headers=report.columns, tablefmt="github")
 
 
-def generate_relationship_md(table):
+def read_error_log(path, error_log=None):
+  """The error log of class_{table}_log.tsv; error_log, when given, goes
+  through the same TSV round-trip in memory, for the same index, dtypes and
+  missing values as the file"""
+  import pandas as pd
+  if error_log is None:
+    return pd.read_csv(path, sep='\t')
+  return pd.read_csv(io.StringIO(error_log.to_csv(sep='\t', index=False)), sep='\t')
+
+
+def generate_relationship_md(context: ReportContext, error_log=None):
+  """Relationship reports of the invalid pairs, from the error log of the
+  validation when given, else from its class_{table}_log.tsv file"""
+  table = context.table
   reports = {"as-as": "", "ct-ct": "", "ct-as": ""}
   BASE_PATH = f"../docs/{table}/"
   try:
-    report = pd.read_csv(f"{BASE_PATH}class_{table}_log.tsv", sep='\t')
-    report_as, report_ct, report_ct_as = split_report(add_row_n_term_link(report, table))
+    report = read_error_log(f"{BASE_PATH}class_{table}_log.tsv", error_log)
+    report_as, report_ct, report_ct_as = split_report(add_row_n_term_link(report, context))
   except:
     report_as = report_ct = report_ct_as = []
   
@@ -346,16 +377,48 @@ def generate_relationship_md(table):
   return reports
 
 
+def generate_table_pages(table, mode, table_config=None, data=None, error_log=None):
+  """Generates the README.md (from data and error_log, the log_dict and
+  error_log of the validation, when given, else from
+  ../logs/{table}/logs_dict.json; copied to ../docs/{table}) and/or the
+  graph.md of one table"""
+  if mode in ("readme", "all"):
+    readme = f"../logs/{table}/README.md"
+    if data is None:
+      with open(f"../logs/{table}/logs_dict.json", "r", encoding="utf-8") as f:
+        data = json.load(f)
+    generate_readme(readme, data, table, table_config, error_log)
+    shutil.copyfile(readme, f"../docs/{table}/README.md")
+  if mode in ("graph", "all"):
+    generate_graph_page(f"../docs/{table}/graph.md", table)
+  return table
+
+def generate_tables_pages(tables, mode, jobs=None):
+  """Generates the pages of several tables from one process, with a pool of
+  workers sharing the imports and the config read once here"""
+  configs = {element["name"]: element.get("new", {}) for element in get_config()}
+  with ProcessPoolExecutor(max_workers=jobs) as executor:
+    futures = [executor.submit(generate_table_pages, table, mode, configs.get(table)) for table in tables]
+    for future in futures:
+      print(f"{future.result()} {mode} done")
+
 
 if __name__ == '__main__':
   parser = argparse.ArgumentParser()
   parser.add_argument("-t", "--table", help="table to generate readme")
   parser.add_argument("-o", "--output", help="output file path")
-  parser.add_argument("-m", "--mode", help="readme or graph")
+  parser.add_argument("-m", "--mode", help="readme or graph, or all with --tables")
   parser.add_argument("-d", "--data", help="log in json")
+  parser.add_argument("--tables", nargs="+", help="generate the pages of these tables in ../logs and ../docs; "
+                      "with --mode all, every table of config_asct.json by default")
+  parser.add_argument("-j", "--jobs", type=int, help="number of workers with --tables")
 
   args = parser.parse_args()
-  if args.mode == "readme":
+  if args.mode == "all" and not args.tables:
+    args.tables = [element["name"] for element in get_config() if "new" in element]
+  if args.tables:
+    generate_tables_pages(args.tables, args.mode, args.jobs)
+  elif args.mode == "readme":
     log = json.load(open(args.data))
     args.data = log
     generate_readme(args.output, args.data, args.table)
@@ -1,31 +1,71 @@
+import argparse
+from datetime import date
+
 from mdutils.mdutils import MdUtils
-from uberongraph_tools import UberonGraph
+from warehouse import ValidationWarehouse
 #from download_resource import JOB_SHEET_GID_MAPPING
 
-ug = UberonGraph()
 
-ont_version = ug.add_prefix_ont(ug.query_uberon([], ug.select_ontology_version))
+def read_tables_version(path='tables_version.txt'):
+  tables_version = []
+  with open(path, 'r', encoding='utf-8') as t:
+    content_list = [line.rstrip('\n') for line in t]
+    for table in content_list:
+      tables_version.extend(table.split(";"))
+  return tables_version
+
+
+def query_versions(warehouse_path, run_date):
+  """
+  Return the ontology and table versions recorded for a run as flat lists.
+  """
+  warehouse = ValidationWarehouse(warehouse_path)
+  ont_version = [value for row in warehouse.ontology_versions(run_date) for value in row]
+  tables_version = [value or "" for row in warehouse.table_versions(run_date) for value in row]
+  warehouse.close()
+  return ont_version, tables_version
+
+
+def release_versions(warehouse_path=None, run_date=None, ug=None):
+  """
+  Return the ontology and table versions of a run from the warehouse, else
+  from ubergraph (with ug when given) and tables_version.txt.
+  """
+  ont_version, tables_version = query_versions(warehouse_path, run_date) if warehouse_path else ([], [])
+  if not ont_version:
+    if ug is None:
+      from uberongraph_tools import UberonGraph
+      ug = UberonGraph()
+    ont_version = ug.add_prefix_ont(ug.query_uberon([], ug.select_ontology_version))
+  if not tables_version:
+    tables_version = read_tables_version()
+  return ont_version, tables_version
+
+
+def generate_release_notes(ont_version, tables_version, output='../NOTES'):
+  mdFile = MdUtils(file_name=output, title='Release Notes')
+
+  mdFile.new_header(3, "Ontology release", add_table_of_contents='n')
 
-tables_version = []
-with open('tables_version.txt', 'r', encoding='utf-8') as t:
-  content_list = [line.rstrip('\n') for line in t]
-  for table in content_list:
-    tables_version.extend(table.split(";"))
+  ontology_data = ["Ontology", "Version"]
+  ontology_data.extend(ont_version)
 
-mdFile = MdUtils(file_name='../NOTES', title='Release Notes')
+  mdFile.new_table(columns=2, rows=len(ont_version)//2+1, text=ontology_data, text_align='center')
 
-mdFile.new_header(3, "Ontology release", add_table_of_contents='n')
+  mdFile.new_header(3, "ASCT+b Tables", add_table_of_contents='n')
 
-ontology_data = ["Ontology", "Version"]
-ontology_data.extend(ont_version)
+  asct_data = ["Organ", "Version", "Date"]
+  asct_data.extend(tables_version)
 
-mdFile.new_table(columns=2, rows=4, text=ontology_data, text_align='center')
+  mdFile.new_table(columns=3, rows=len(tables_version)//3+1, text=asct_data)
 
-mdFile.new_header(3, "ASCT+b Tables", add_table_of_contents='n')
+  mdFile.create_md_file()
 
-asct_data = ["Organ", "Version", "Date"]
-asct_data.extend(tables_version)
 
-mdFile.new_table(columns=3, rows=len(content_list)+1, text=asct_data)
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument("-w", "--warehouse", help="read the versions from this validation warehouse file")
+  parser.add_argument("-d", "--date", default=date.today().strftime("%Y%m%d"), help="run date as YYYYMMDD")
 
-mdFile.create_md_file()
\ No newline at end of file
+  args = parser.parse_args()
+  generate_release_notes(*release_versions(args.warehouse, args.date))
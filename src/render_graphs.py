@@ -0,0 +1,83 @@
+"""
+Render og2dot.js graphs with Graphviz. Every format is written by a single
+dot run, so the layout is computed once per graph. Graphs whose content
+did not change since their last rendering are skipped.
+"""
+import argparse
+import hashlib
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+FORMATS = ["png", "pdf", "svg"]
+GRAPH_ATTRIBUTES = ["-Grankdir=LR"]
+
+
+def content_hash(dot_file, formats):
+    """
+    Hash the dot file with the options it is rendered with.
+    """
+    digest = hashlib.sha256()
+    with open(dot_file, "rb") as f:
+        digest.update(f.read())
+    digest.update(" ".join(GRAPH_ATTRIBUTES + formats).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def render(dot_file, output_prefix, formats=FORMATS, force=False):
+    """
+    Write output_prefix.{format} for every format from one dot run, unless
+    the graph is unchanged since output_prefix.sha256 was written.
+    Return True when the graph was rendered.
+    """
+    stamp = f"{output_prefix}.sha256"
+    graph_hash = content_hash(dot_file, formats)
+    outputs = [f"{output_prefix}.{fmt}" for fmt in formats]
+
+    if not force and os.path.isfile(stamp) and all(map(os.path.isfile, outputs)):
+        with open(stamp, "r", encoding="utf-8") as f:
+            if f.read().strip() == graph_hash:
+                return False
+
+    command = ["dot", dot_file, *GRAPH_ATTRIBUTES]
+    for fmt, output in zip(formats, outputs):
+        command.extend([f"-T{fmt}", "-o", output])
+    subprocess.run(command, check=True)
+
+    with open(stamp, "w", encoding="utf-8") as f:
+        f.write(graph_hash)
+    return True
+
+
+def output_prefix(dot_file, output_dir):
+    """
+    Kidney.dot is rendered to {output_dir}/ccf_Kidney_graph.{format}.
+    """
+    name = os.path.splitext(os.path.basename(dot_file))[0]
+    return os.path.join(output_dir, f"ccf_{name}_graph")
+
+
+def render_all(dot_files, output_dir, formats=FORMATS, jobs=None, force=False):
+    """
+    Render several graphs with a pool of worker processes.
+    """
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            dot_file: executor.submit(render, dot_file, output_prefix(dot_file, output_dir), formats, force)
+            for dot_file in dot_files
+        }
+        for dot_file, future in futures.items():
+            print(f"{dot_file}: {'rendered' if future.result() else 'unchanged, skipped'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dot_files", nargs="+", help="dot files, named after their organ")
+    parser.add_argument("-o", "--output-dir", default="../graphs", help="output directory")
+    parser.add_argument("-f", "--formats", nargs="+", default=FORMATS, help="output formats")
+    parser.add_argument("-j", "--jobs", type=int, help="number of worker processes")
+    parser.add_argument("--force", action="store_true", help="render unchanged graphs too")
+
+    args = parser.parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+    render_all(args.dot_files, args.output_dir, args.formats, args.jobs, args.force)
@@ -0,0 +1,73 @@
+"""
+Turn report columns into Markdown: IRI links, sheet row links, pass/fail
+colours and "Total" rows. Each function works on a whole column at once.
+"""
+import numpy as np
+import pandas as pd
+
+BASE_IRI = "http://purl.obolibrary.org/obo/"
+PASS = "<font color='green'>"
+FAIL = "<font color='red'>"
+CLOSE_TAG = "</font>"
+
+
+def iri_links(terms: pd.Series) -> pd.Series:
+    """
+    Link each CURIE to its OBO PURL.
+    """
+    terms = terms.astype(str)
+    return "[" + terms + "](" + BASE_IRI + terms.str.replace(":", "_", regex=False) + ")"
+
+
+def row_links(rows: pd.Series, sheet_url: str) -> pd.Series:
+    """
+    Link each row number to its row in the ASCT+B sheet.
+    """
+    rows = rows.astype(str)
+    return "[" + rows + "](" + sheet_url + rows + ":" + rows + ")"
+
+
+def page_links(names: pd.Series, page: str, skip: str = "Total") -> pd.Series:
+    """
+    Link each name to its page, e.g. Kidney/README.md, except the skip value.
+    """
+    names = names.astype(str)
+    return names.where(names == skip, "[" + names + "](" + names + "/" + page + ")")
+
+
+def colour(values: pd.Series, failed) -> pd.Series:
+    """
+    Wrap each number in a red font tag where failed is True and in a green
+    one otherwise. Non-numeric cells become empty.
+    """
+    numbers = pd.to_numeric(values, errors="coerce")
+    text = values.astype(str)
+    coloured = np.where(failed(numbers), FAIL + text + CLOSE_TAG, PASS + text + CLOSE_TAG)
+    return pd.Series(np.where(numbers.isna(), "", coloured), index=values.index, dtype=object)
+
+
+def colour_counts(values: pd.Series) -> pd.Series:
+    """
+    Counts pass when they are zero.
+    """
+    return colour(values, lambda numbers: numbers > 0)
+
+
+def colour_percents(values: pd.Series) -> pd.Series:
+    """
+    Percentages pass when they are below 50%.
+    """
+    return colour(values, lambda numbers: numbers >= 50.0)
+
+
+def add_total_row(report: pd.DataFrame, label_column: str = "Table", blank_columns: list = ()) -> pd.DataFrame:
+    """
+    Append a "Total" row with the sum of every column, except the label
+    column and the blank columns, and renumber the rows.
+    """
+    total = report.drop(columns=[label_column, *blank_columns]).sum()
+    total[label_column] = "Total"
+    for column in blank_columns:
+        total[column] = ""
+    total_row = pd.DataFrame([total], columns=report.columns)
+    return pd.concat([report, total_row.astype(report.dtypes.drop(list(blank_columns)).to_dict())], ignore_index=True)
@@ -0,0 +1,172 @@
+"""
+Record and replay of SPARQL traffic, to re-run a validation offline against
+the exact answers of an earlier run, for benchmarking and regression checks.
+
+In record mode, every query answered by an endpoint is stored with its
+answer in an SQLite archive, keyed by endpoint, return format and query
+text with whitespace collapsed. Answers are zlib-compressed: JSON results as
+JSON, RDF/XML results (rdflib graphs) as N-Triples. In replay mode, queries
+are answered from the archive without any network access, optionally after
+sleeping for the recorded latency (or a fixed one) to simulate the endpoint.
+A query missing from the archive raises ArchiveMissError.
+
+Queries built from sets of terms take them in sorted order, so that a run
+sends the same query text as the run it replays.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from sparql_client import JSON, RDFXML
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    return_format TEXT NOT NULL,
+    query TEXT NOT NULL,
+    response BLOB NOT NULL,
+    seconds REAL NOT NULL,
+    recorded REAL NOT NULL
+)
+"""
+
+
+class ArchiveMissError(KeyError):
+    pass
+
+
+def normalize_query(query):
+    return " ".join(query.split())
+
+
+def archive_key(endpoint, query, return_format):
+    text = "\n".join([endpoint, return_format, normalize_query(query)])
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def encode_response(results, return_format):
+    if return_format == RDFXML:
+        data = results.serialize(format="nt")
+    else:
+        data = json.dumps(results, separators=(",", ":"))
+    return zlib.compress(data.encode("utf-8"), 9)
+
+
+def decode_response(blob, return_format):
+    data = zlib.decompress(blob).decode("utf-8")
+    if return_format == RDFXML:
+        from rdflib import Graph
+        graph = Graph()
+        graph.parse(data=data, format="nt")
+        return graph
+    return json.loads(data)
+
+
+class SparqlArchive():
+    """
+    SQLite archive of SPARQL answers, shared by the threads of a process.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # Parallel make runs may record to the same archive
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, endpoint, query, return_format=JSON):
+        """
+        Return the recorded answer and its latency in seconds.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response, seconds FROM responses WHERE key = ?",
+                (archive_key(endpoint, query, return_format),)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                raise ArchiveMissError(f"Query to {endpoint} not in {self.path}: {normalize_query(query)[:200]}")
+            self.hits += 1
+        return decode_response(row[0], return_format), row[1]
+
+    def put(self, endpoint, query, return_format, results, seconds):
+        blob = encode_response(results, return_format)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (archive_key(endpoint, query, return_format), endpoint, return_format,
+                 normalize_query(query), blob, seconds, time.time())
+            )
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT endpoint, return_format, COUNT(*), SUM(LENGTH(response)), SUM(seconds) "
+                "FROM responses GROUP BY endpoint, return_format ORDER BY endpoint, return_format"
+            ).fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class ArchiveMode():
+    """
+    How a SparqlClient uses an archive: mode is "record" or "replay";
+    latency is the seconds to wait before a replayed answer, or "recorded"
+    to wait as long as the endpoint did.
+    """
+    def __init__(self, archive, mode, latency=None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown archive mode: {mode}")
+        self.archive = archive
+        self.mode = mode
+        self.latency = latency
+
+    @property
+    def replay(self):
+        return self.mode == "replay"
+
+    def answer(self, endpoint, query, return_format):
+        results, seconds = self.archive.get(endpoint, query, return_format)
+        delay = seconds if self.latency == "recorded" else float(self.latency or 0)
+        if delay > 0:
+            time.sleep(delay)
+        return results
+
+    def record(self, endpoint, query, return_format, results, seconds):
+        self.archive.put(endpoint, query, return_format, results, seconds)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Archive mode configured by CCF_SPARQL_ARCHIVE (archive file, no
+        archive when unset), CCF_SPARQL_ARCHIVE_MODE (record or replay) and
+        CCF_SPARQL_REPLAY_LATENCY (seconds, or "recorded").
+        """
+        path = os.environ.get("CCF_SPARQL_ARCHIVE")
+        if not path:
+            return None
+        return cls(SparqlArchive(path), os.environ.get("CCF_SPARQL_ARCHIVE_MODE") or "replay",
+                   os.environ.get("CCF_SPARQL_REPLAY_LATENCY") or None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a SPARQL archive")
+    parser.add_argument("archive", help="archive file")
+
+    args = parser.parse_args()
+    archive = SparqlArchive(args.archive)
+    for endpoint, return_format, count, size, seconds in archive.stats():
+        print(f"{endpoint} {return_format}: {count} queries, {size / 1024:.0f} KiB, {seconds:.1f}s recorded")
+    archive.close()
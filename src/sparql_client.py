@@ -0,0 +1,305 @@
+"""
+SPARQL client shared by the ubergraph and HRA queries, so that an organ run
+survives a slow or failing request and parallel runs do not overload the
+endpoint:
+
+- a token bucket paces the queries, shared by the threads of a process and,
+  through a state file, by the processes of a parallel make run
+- timeouts, connection errors, 429 and 5xx responses are retried with
+  exponential backoff and full jitter
+- a query still running after hedge_after seconds is sent a second time,
+  and the first answer wins
+- after failure_threshold consecutive failed queries the circuit opens:
+  queries fail at once until reset_timeout has passed, then one query
+  probes the endpoint
+- with an archive (see sparql_archive), answers are recorded, or replayed
+  without querying the endpoint
+
+Settings come from the environment (see from_env), so that the Makefile
+configures every script the same way.
+"""
+import fcntl
+import http.client
+import json
+import os
+import queue
+import random
+import socket
+import threading
+import time
+import urllib.error
+
+# Return formats, as named by SPARQLWrapper, which is only imported to query
+JSON = "json"
+RDFXML = "rdf+xml"
+
+# Endpoints, replaced by CCF_UBERGRAPH_ENDPOINT and CCF_HRA_ENDPOINT, e.g.
+# with those of sparql_stub_server.py
+UBERGRAPH = os.environ.get("CCF_UBERGRAPH_ENDPOINT") or "https://ubergraph.apps.renci.org/sparql"
+HRA = os.environ.get("CCF_HRA_ENDPOINT") or "https://lod.humanatlas.io/sparql"
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+def is_retryable(error):
+    """
+    Timeouts, connection errors, 429 and 5xx responses are worth retrying;
+    malformed queries and other client errors are not.
+    """
+    from SPARQLWrapper.SPARQLExceptions import EndPointInternalError
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (
+        EndPointInternalError,
+        urllib.error.URLError,
+        socket.timeout,
+        TimeoutError,
+        ConnectionError,
+        http.client.HTTPException,
+    ))
+
+
+def retry_after(error):
+    """
+    Seconds asked by a Retry-After header, or None.
+    """
+    headers = getattr(error, "headers", None)
+    value = headers.get("Retry-After") if headers else None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket():
+    """
+    Allow rate queries per second on average, with bursts of up to burst
+    queries. With state_file, the bucket is kept in that file under an
+    exclusive lock and shared by every process using it.
+    """
+    def __init__(self, rate, burst=None, state_file=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.state_file = state_file
+        self.lock = threading.Lock()
+        self.tokens = self.burst
+        self.updated = time.time()
+
+    def _take(self, tokens, updated):
+        """
+        Refill, then take one token if there is one. Return the new state
+        and the seconds to wait before trying again.
+        """
+        now = time.time()
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            return tokens - 1, now, 0.0
+        return tokens, now, (1 - tokens) / self.rate
+
+    def _take_shared(self):
+        with open(self.state_file, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read())
+                    tokens, updated = state["tokens"], state["updated"]
+                except (ValueError, KeyError):
+                    tokens, updated = self.burst, time.time()
+                tokens, updated, delay = self._take(tokens, updated)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({"tokens": tokens, "updated": updated}))
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return delay
+
+    def acquire(self):
+        """
+        Block until a query may be sent.
+        """
+        while True:
+            with self.lock:
+                if self.state_file:
+                    delay = self._take_shared()
+                else:
+                    self.tokens, self.updated, delay = self._take(self.tokens, self.updated)
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+
+class CircuitBreaker():
+    """
+    Open after failure_threshold consecutive failures; let one probe through
+    once reset_timeout has passed, and close again when it succeeds.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def before_query(self):
+        with self.lock:
+            if self.opened is None:
+                return
+            if time.monotonic() - self.opened < self.reset_timeout or self.probing:
+                raise CircuitOpenError(
+                    f"SPARQL endpoint failed {self.failures} times in a row, not querying it for {self.reset_timeout}s"
+                )
+            self.probing = True
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened = None
+            self.probing = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.failures >= self.failure_threshold:
+                self.opened = time.monotonic()
+
+
+class SparqlClient():
+    """
+    Send queries to one endpoint. Thread-safe: every attempt uses its own
+    SPARQLWrapper.
+    """
+    def __init__(self, endpoint, rate_limiter=None, breaker=None, retries=4, backoff=1.0,
+                 max_backoff=30.0, hedge_after=None, timeout=600, archive=None):
+        self.endpoint = endpoint
+        self.rate_limiter = rate_limiter
+        self.breaker = breaker or CircuitBreaker()
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        self.archive = archive
+
+    @classmethod
+    def from_env(cls, endpoint):
+        """
+        Client configured by CCF_SPARQL_RATE (queries per second, no limit
+        when unset), CCF_SPARQL_BURST, CCF_SPARQL_RATE_FILE (bucket shared
+        between processes), CCF_SPARQL_RETRIES, CCF_SPARQL_TIMEOUT,
+        CCF_SPARQL_HEDGE_AFTER (seconds, no hedging when unset),
+        CCF_SPARQL_BREAKER_FAILURES, CCF_SPARQL_BREAKER_RESET and the
+        archive settings of ArchiveMode.from_env.
+        """
+        from sparql_archive import ArchiveMode
+        env = os.environ
+        rate = float(env.get("CCF_SPARQL_RATE") or 0)
+        rate_limiter = None
+        if rate > 0:
+            rate_limiter = TokenBucket(rate, float(env.get("CCF_SPARQL_BURST") or 0) or None,
+                                       env.get("CCF_SPARQL_RATE_FILE") or None)
+        return cls(
+            endpoint,
+            rate_limiter=rate_limiter,
+            breaker=CircuitBreaker(int(env.get("CCF_SPARQL_BREAKER_FAILURES") or 5),
+                                   float(env.get("CCF_SPARQL_BREAKER_RESET") or 60)),
+            retries=int(env.get("CCF_SPARQL_RETRIES") or 4),
+            hedge_after=float(env.get("CCF_SPARQL_HEDGE_AFTER") or 0) or None,
+            timeout=float(env.get("CCF_SPARQL_TIMEOUT") or 600),
+            archive=ArchiveMode.from_env(),
+        )
+
+    def attempt(self, query, return_format):
+        """
+        Send the query once and return its converted results.
+        """
+        from SPARQLWrapper import SPARQLWrapper
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        sparql = SPARQLWrapper(self.endpoint)
+        sparql.setTimeout(self.timeout)
+        sparql.setQuery(query)
+        sparql.setReturnFormat(return_format)
+        return sparql.query().convert()
+
+    def hedged_attempt(self, query, return_format):
+        """
+        Send the query, and once more if it did not answer within
+        hedge_after seconds. Return the first successful answer. Attempts
+        run on daemon threads, so that a losing attempt still waiting for
+        its answer does not hold up the exit of the interpreter.
+        """
+        answers = queue.Queue()
+
+        def send():
+            try:
+                answers.put((self.attempt(query, return_format), None))
+            except Exception as e:
+                answers.put((None, e))
+
+        threading.Thread(target=send, name="sparql-hedge", daemon=True).start()
+        sent, received, error = 1, 0, None
+        while received < sent:
+            try:
+                result, error = answers.get(timeout=self.hedge_after if sent == 1 else None)
+            except queue.Empty:
+                threading.Thread(target=send, name="sparql-hedge", daemon=True).start()
+                sent += 1
+                continue
+            received += 1
+            if error is None:
+                return result
+        raise error
+
+    def query(self, query, return_format=JSON):
+        """
+        Send a query, retrying the failures worth retrying, or answer it
+        from the archive in replay mode.
+        """
+        if self.archive is not None and self.archive.replay:
+            return self.archive.answer(self.endpoint, query, return_format)
+        # One query counts as one success or failure for the breaker,
+        # whatever the attempts it took
+        self.breaker.before_query()
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                if self.hedge_after:
+                    result = self.hedged_attempt(query, return_format)
+                else:
+                    result = self.attempt(query, return_format)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The endpoint answered, the query is at fault
+                    self.breaker.success()
+                    raise
+                if attempt == self.retries:
+                    self.breaker.failure()
+                    raise
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                time.sleep(max(delay, retry_after(e) or 0))
+                continue
+            self.breaker.success()
+            if self.archive is not None:
+                self.archive.record(self.endpoint, query, return_format, result, time.perf_counter() - start)
+            return result
+
+
+clients = {}
+clients_lock = threading.Lock()
+
+
+def shared_client(endpoint):
+    """
+    One client per endpoint and process, configured from the environment,
+    so that every UberonGraph or HRAWrapper shares its rate limiter and
+    circuit breaker.
+    """
+    with clients_lock:
+        if endpoint not in clients:
+            clients[endpoint] = SparqlClient.from_env(endpoint)
+        return clients[endpoint]
@@ -0,0 +1,284 @@
+"""
+Local stand-in for the ubergraph and HRA SPARQL endpoints, to test and
+load-test the pipeline without querying the shared public endpoints.
+
+The server answers with rdflib from a synthetic UBERON/CL/PCL fixture laid
+out as ubergraph lays out the ontologies:
+
+- http://reasoner.renci.org/ontology: classes, asserted subClassOf axioms,
+  labels, normalized information content and ontology versions
+- http://reasoner.renci.org/redundant: entailed subClassOf, part_of,
+  overlaps and has_part relations
+- http://reasoner.renci.org/nonredundant: direct subClassOf and part_of
+  relations
+- a reference organ graph with spatial entities, for the HRA queries
+
+Point the scripts at it with CCF_UBERGRAPH_ENDPOINT and CCF_HRA_ENDPOINT
+(see sparql_client.py), e.g. http://localhost:8890/sparql. --latency,
+--error-rate and --capacity make it slow, flaky or overloaded.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import rdflib.plugins.sparql
+from rdflib import Dataset, Literal, Namespace, URIRef
+from rdflib.namespace import OWL, RDF, RDFS, XSD
+from rdflib.plugins.sparql import prepareQuery
+
+# FROM clauses name the fixture graphs, never graphs to download
+rdflib.plugins.sparql.SPARQL_LOAD_GRAPHS = False
+
+OBO = Namespace("http://purl.obolibrary.org/obo/")
+CCF = Namespace("http://purl.org/ccf/")
+ONTOLOGY = URIRef("http://reasoner.renci.org/ontology")
+REDUNDANT = URIRef("http://reasoner.renci.org/redundant")
+NONREDUNDANT = URIRef("http://reasoner.renci.org/nonredundant")
+REF_ORGAN = URIRef("https://purl.humanatlas.io/ref-organ/fixture")
+NORMALIZED_IC = URIRef("http://reasoner.renci.org/vocab/normalizedInformationContent")
+PART_OF = OBO.BFO_0000050
+HAS_PART = OBO.BFO_0000051
+OVERLAPS = OBO.RO_0002131
+ANATOMICAL_ENTITY = OBO.UBERON_0001062
+FIRST_ID = 9000000
+# rdflib fails on empty VALUES blocks, which match nothing
+EMPTY_VALUES = re.compile(r"VALUES\s+(\?\w+|\([^)]*\))\s*\{\s*\}")
+
+
+class Fixture():
+    """
+    Synthetic ontology of n_as anatomical structures and n_ct cell types
+    (the last fifth of them PCL terms). Term i has term (i - 1) // 4 as
+    superclass; anatomical structure i is part of structure (i - 1) // 2;
+    cell type j is part of structure (7 * j) % n_as.
+    """
+    def __init__(self, n_as=200, n_ct=100):
+        self.as_terms = [f"UBERON:{FIRST_ID + i}" for i in range(n_as)]
+        self.ct_terms = [f"{'PCL' if j >= n_ct * 4 // 5 else 'CL'}:{FIRST_ID + j}" for j in range(n_ct)]
+        self.isa = {}
+        self.part_of = {}
+        for terms in (self.as_terms, self.ct_terms):
+            for i, term in enumerate(terms[1:], 1):
+                self.isa[term] = terms[(i - 1) // 4]
+        for i, term in enumerate(self.as_terms[1:], 1):
+            self.part_of[term] = self.as_terms[(i - 1) // 2]
+        for j, term in enumerate(self.ct_terms):
+            self.part_of[term] = self.as_terms[(7 * j) % n_as]
+        self._ancestors = {}
+        self._part_of = {}
+
+    def label(self, term):
+        kind = "structure" if term.startswith("UBERON") else "cell"
+        return f"{kind} {term.split(':')[1]}"
+
+    def ancestors(self, term):
+        """Superclasses of term, itself included."""
+        if term not in self._ancestors:
+            parent = self.isa.get(term)
+            self._ancestors[term] = {term} | (self.ancestors(parent) if parent else set())
+        return self._ancestors[term]
+
+    def entailed_part_of(self, term):
+        """Structures term is part of, through its superclasses and theirs."""
+        if term not in self._part_of:
+            wholes = set()
+            for ancestor in self.ancestors(term):
+                whole = self.part_of.get(ancestor)
+                if whole:
+                    wholes |= self.ancestors(whole) | self.entailed_part_of(whole)
+            self._part_of[term] = wholes
+        return self._part_of[term]
+
+    def depth(self, term):
+        return len(self.ancestors(term))
+
+    def dataset(self):
+        ds = Dataset(default_union=True)
+        ontology, redundant, nonredundant = ds.graph(ONTOLOGY), ds.graph(REDUNDANT), ds.graph(NONREDUNDANT)
+        iri = lambda term: OBO[term.replace(":", "_")]
+        max_depth = max(self.depth(term) for term in self.as_terms + self.ct_terms)
+
+        ontology.add((RDFS.label, RDF.type, OWL.AnnotationProperty))
+        for name in ("uberon", "cl", "pcl"):
+            ontology.add((OBO[f"{name}/{name}-base.owl"], OWL.versionInfo, Literal("fixture")))
+        ontology.add((ANATOMICAL_ENTITY, RDF.type, OWL.Class))
+        ontology.add((iri(self.as_terms[0]), RDFS.subClassOf, ANATOMICAL_ENTITY))
+
+        for term in self.as_terms + self.ct_terms:
+            subject = iri(term)
+            ontology.add((subject, RDF.type, OWL.Class))
+            ontology.add((subject, RDFS.label, Literal(self.label(term))))
+            ontology.add((subject, NORMALIZED_IC, Literal(100.0 * self.depth(term) / max_depth, datatype=XSD.double)))
+            if term in self.isa:
+                ontology.add((subject, RDFS.subClassOf, iri(self.isa[term])))
+                nonredundant.add((subject, RDFS.subClassOf, iri(self.isa[term])))
+            if term in self.part_of:
+                nonredundant.add((subject, PART_OF, iri(self.part_of[term])))
+            for ancestor in self.ancestors(term):
+                redundant.add((subject, RDFS.subClassOf, iri(ancestor)))
+            for whole in self.entailed_part_of(term):
+                redundant.add((subject, PART_OF, iri(whole)))
+                redundant.add((subject, OVERLAPS, iri(whole)))
+                redundant.add((iri(whole), HAS_PART, subject))
+
+        ref_organ = ds.graph(REF_ORGAN)
+        ref_organ.add((REF_ORGAN, OWL.versionInfo, Literal("fixture")))
+        for i, term in enumerate(self.as_terms[:10]):
+            entity, reference = URIRef(f"{REF_ORGAN}#entity{i}"), URIRef(f"{REF_ORGAN}#reference{i}")
+            ref_organ.add((iri(term), RDFS.subClassOf, ANATOMICAL_ENTITY))
+            ref_organ.add((entity, RDF.type, CCF.SpatialEntity))
+            ref_organ.add((entity, RDF.type, iri(term)))
+            ref_organ.add((entity, CCF.representation_of, iri(term)))
+            ref_organ.add((entity, CCF.has_object_reference, reference))
+            ref_organ.add((reference, CCF.file_url, Literal(f"https://example.org/fixture/{i}.glb")))
+        return ds
+
+    def table(self, rows, invalid=0.1, seed=0):
+        """
+        ASCT+B table data of rows rows: a chain of structures, each part of
+        the previous one, then a cell type part of the last structure and its
+        superclass. A fraction invalid of the rows have their last structure
+        replaced by a random one.
+        """
+        rng = random.Random(seed)
+        data = []
+        for row_number in range(1, rows + 1):
+            cell = rng.choice(self.ct_terms[1:])
+            chain = [self.part_of[cell]]
+            while chain[-1] in self.part_of and len(chain) < 4:
+                chain.append(self.part_of[chain[-1]])
+            chain.reverse()
+            if rng.random() < invalid:
+                chain[-1] = rng.choice(self.as_terms)
+            cells = [self.isa[cell], cell]
+            data.append({
+                "rowNumber": row_number,
+                "anatomical_structures": [self.column(term) for term in chain],
+                "cell_types": [self.column(term) for term in cells],
+                "references": [],
+            })
+        return data
+
+    def column(self, term):
+        return {"id": term, "rdfs_label": self.label(term), "name": self.label(term)}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, dataset, latency=0.0, error_rate=0.0, capacity=0):
+        super().__init__(address, StubHandler)
+        self.dataset = dataset
+        self.latency = latency
+        self.error_rate = error_rate
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        # The rdflib SPARQL parser is not thread-safe; evaluation is
+        self.parse_lock = threading.Lock()
+        self.in_flight = 0
+        self.stats = {"queries": 0, "errors": 0, "rejected": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, body=b"", content_type="text/plain"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_query(self):
+        params = parse_qs(urlparse(self.path).query)
+        if self.command == "POST":
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+            if self.headers.get("Content-Type", "").startswith("application/sparql-query"):
+                return body
+            params.update(parse_qs(body))
+        return (params.get("query") or [None])[0]
+
+    def answer(self):
+        server = self.server
+        query = self.read_query()
+        if not query:
+            self.send(400, b"No query")
+            return
+        with server.lock:
+            rejected = server.capacity and server.in_flight >= server.capacity
+            if not rejected:
+                server.in_flight += 1
+        if rejected:
+            server.count("rejected")
+            self.send(503, b"Over capacity")
+            return
+        try:
+            server.count("queries")
+            if server.latency:
+                time.sleep(server.latency)
+            if random.random() < server.error_rate:
+                server.count("errors")
+                self.send(500, b"Injected error")
+                return
+            try:
+                with server.parse_lock:
+                    prepared = prepareQuery(EMPTY_VALUES.sub("FILTER(false)", query))
+                result = server.dataset.query(prepared)
+            except Exception as e:
+                self.send(400, f"{type(e).__name__}: {e}".encode("utf-8"))
+                return
+            if result.type == "CONSTRUCT" or result.type == "DESCRIBE":
+                self.send(200, result.graph.serialize(format="xml", encoding="utf-8"), "application/rdf+xml")
+            else:
+                self.send(200, result.serialize(format="json"), "application/sparql-results+json")
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    do_GET = answer
+    do_POST = answer
+
+
+def start_server(fixture, host="localhost", port=0, latency=0.0, error_rate=0.0, capacity=0):
+    """
+    Serve the fixture from a background thread and return the server; its
+    endpoint is f"http://{host}:{server.server_port}/sparql".
+    """
+    server = StubServer((host, port), fixture.dataset(), latency, error_rate, capacity)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8890)
+    parser.add_argument("--as-terms", type=int, default=200, help="anatomical structures of the fixture")
+    parser.add_argument("--ct-terms", type=int, default=100, help="cell types of the fixture")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every query")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of queries answered with a 500")
+    parser.add_argument("--capacity", type=int, default=0, help="queries run at once, more get a 503 (0: no limit)")
+    parser.add_argument("--table", help="also write a table of TABLE_ROWS rows of the fixture to this ASCT+B JSON file")
+    parser.add_argument("--table-rows", type=int, default=100)
+
+    args = parser.parse_args()
+    fixture = Fixture(args.as_terms, args.ct_terms)
+    if args.table:
+        with open(args.table, "w", encoding="utf-8") as f:
+            json.dump(fixture.table(args.table_rows), f, indent=2)
+    server = StubServer((args.host, args.port), fixture.dataset(), args.latency, args.error_rate, args.capacity)
+    print(f"SPARQL stand-in on http://{args.host}:{server.server_port}/sparql, Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
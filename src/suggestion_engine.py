@@ -0,0 +1,201 @@
+"""
+Suggestions for the invalid relationships of a table, from a bounded
+breadth-first search over the direct edges of the closure index.
+
+For an invalid (s, o) the search walks up from s along direct subClassOf,
+part_of and connected_to edges, composing the relation of each path
+(s subClassOf x part_of y gives s part_of y). The terms of the table it
+reaches are ranked: first those leading to o, then by path length, then by
+information content, most specific first. Only the top-k edges of each
+pair are written to the suggestion graph.
+"""
+import argparse
+import math
+import os
+import tempfile
+from collections import defaultdict
+
+from rdflib import BNode, URIRef
+from rdflib.namespace import OWL, RDF, RDFS
+
+from rdf_tools import TripleSet
+from term_ids import curie_to_iri
+
+MAX_DEPTH = 4
+MAX_VISITED = 500
+TOP_K = 3
+
+PROPERTIES = {
+    "part_of": URIRef("http://purl.obolibrary.org/obo/BFO_0000050"),
+    "connected_to": URIRef("http://purl.obolibrary.org/obo/RO_0002170"),
+}
+# Relation of a path followed by one more direct edge
+COMPOSE = {
+    ("subClassOf", "subClassOf"): "subClassOf",
+    ("subClassOf", "part_of"): "part_of",
+    ("subClassOf", "connected_to"): "connected_to",
+    ("part_of", "subClassOf"): "part_of",
+    ("part_of", "part_of"): "part_of",
+    ("connected_to", "subClassOf"): "connected_to",
+}
+# Relations suggested for each kind of pair
+AS_AS_RELATIONS = ("subClassOf", "part_of", "connected_to")
+CT_AS_RELATIONS = ("part_of",)
+CT_CT_RELATIONS = ("subClassOf",)
+
+
+class SuggestionEngine():
+    """
+    Search the direct edges of a ClosureIndex. ic is called with a list of
+    CURIEs and returns their normalized IC, NaN when unknown.
+    """
+    def __init__(self, index, ic, max_depth=MAX_DEPTH, max_visited=MAX_VISITED, top_k=TOP_K):
+        self.index = index
+        self.ic = ic
+        self.max_depth = max_depth
+        self.max_visited = max_visited
+        self.top_k = top_k
+        self.reached = {}
+
+    def reach(self, subject, relations):
+        """
+        Return {(term, relation): path length} for the terms reachable from
+        subject through paths whose relation is one of relations, or
+        subClassOf on the way to one of them.
+        """
+        key = (subject, relations)
+        if key in self.reached:
+            return self.reached[key]
+        # subClassOf paths are kept as intermediate states even when not
+        # suggested (s subClassOf x part_of y gives s part_of y); a path
+        # never becomes subClassOf again once it is something else, so the
+        # other steps leading outside relations are pruned
+        steps = [
+            (path, edge, result) for (path, edge), result in COMPOSE.items()
+            if (result == "subClassOf" or result in relations) and self.index.has(edge, "direct")
+        ]
+        start = (subject, "subClassOf")
+        distances = {start: 0}
+        frontier = [start]
+        for depth in range(1, self.max_depth + 1):
+            next_frontier = []
+            for term, path in frontier:
+                for step_path, edge, result in steps:
+                    if step_path != path:
+                        continue
+                    for parent in self.index.ancestors(term, edge, "direct"):
+                        state = (parent, result)
+                        if state not in distances:
+                            distances[state] = depth
+                            next_frontier.append(state)
+                if len(distances) >= self.max_visited:
+                    break
+            frontier = next_frontier
+            if not frontier or len(distances) >= self.max_visited:
+                break
+        del distances[start]
+        self.reached[key] = distances
+        return distances
+
+    def leads_to(self, term, obj):
+        return term == obj or self.index.related(term, obj, "subClassOf") or self.index.related(term, obj, "part_of")
+
+    def suggest(self, pairs, candidates, relations):
+        """
+        Return {(s, o): [(relation, term), ...]}, the top-k terms of
+        candidates reachable from s, for each pair.
+        """
+        candidates = set(candidates)
+        found = {}
+        for s, o in pairs:
+            found[(s, o)] = [
+                (term, relation, length)
+                for (term, relation), length in self.reach(s, relations).items()
+                if relation in relations and term in candidates and term != s
+            ]
+        terms = sorted({term for hits in found.values() for term, _, _ in hits})
+        ic = dict(zip(terms, self.ic(terms))) if terms else {}
+
+        suggestions = {}
+        for (s, o), hits in found.items():
+            ranked = sorted(hits, key=lambda hit: (
+                not self.leads_to(hit[0], o),
+                hit[2],
+                -(0.0 if math.isnan(ic[hit[0]]) else ic[hit[0]]),
+                hit[0],
+            ))
+            suggestions[(s, o)] = [(relation, term) for term, relation, _ in ranked[:self.top_k]]
+        return suggestions
+
+
+def relation_triples(subject, relation, obj):
+    """
+    Triples of subject subClassOf obj, or of subject subClassOf (relation
+    some obj), as returned by the CONSTRUCT queries they replace.
+    """
+    s, o = URIRef(curie_to_iri(subject)), URIRef(curie_to_iri(obj))
+    triples = [(s, RDF.type, OWL.Class)]
+    if relation == "subClassOf":
+        triples.append((s, RDFS.subClassOf, o))
+    else:
+        restriction = BNode()
+        triples.extend([
+            (s, RDFS.subClassOf, restriction),
+            (restriction, RDF.type, OWL.Restriction),
+            (restriction, OWL.onProperty, PROPERTIES[relation]),
+            (restriction, OWL.someValuesFrom, o),
+        ])
+    return triples
+
+
+def suggestion_graph(engine, as_pairs, ct_as_pairs, ct_pairs, all_as, all_ct):
+    """
+    Return the suggestion graph of the invalid AS-AS, CT-AS and CT-CT pairs.
+    """
+    edges = defaultdict(set)
+    for pairs, candidates, relations in [
+        (as_pairs, all_as, AS_AS_RELATIONS),
+        (ct_as_pairs, all_as, CT_AS_RELATIONS),
+        (ct_pairs, all_ct, CT_CT_RELATIONS),
+    ]:
+        for (s, _), suggestions in engine.suggest(pairs, candidates, relations).items():
+            edges[s].update(suggestions)
+
+    sec_graph = TripleSet()
+    for s in sorted(edges):
+        for relation, term in sorted(edges[s]):
+            sec_graph += relation_triples(s, relation, term)
+    return sec_graph
+
+
+def check():
+    """
+    Suggest on a small index: CL:2 subClassOf CL:1 part_of UBERON:2,
+    UBERON:2 part_of UBERON:1. The CT-AS pair of CL:2 must get part_of
+    UBERON:2 through its superclass, and the AS-AS pair of UBERON:2 part_of
+    UBERON:1.
+    """
+    from closure_index import ClosureIndex, build
+    edges = {
+        ("subClassOf", "direct"): [("CL:0000002", "CL:0000001")],
+        ("part_of", "direct"): [("CL:0000001", "UBERON:0000002"), ("UBERON:0000002", "UBERON:0000001")],
+        ("subClassOf", "entailed"): [("CL:0000002", "CL:0000001")],
+        ("part_of", "entailed"): [("CL:0000001", "UBERON:0000002"), ("CL:0000002", "UBERON:0000002"),
+                                  ("UBERON:0000002", "UBERON:0000001")],
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        engine = SuggestionEngine(ClosureIndex(build(edges, os.path.join(directory, "index"))),
+                                  lambda terms: [float("nan")] * len(terms))
+        all_as = ["UBERON:0000001", "UBERON:0000002"]
+        ct_as = engine.suggest([("CL:0000002", "UBERON:0000009")], all_as, CT_AS_RELATIONS)
+        as_as = engine.suggest([("UBERON:0000002", "UBERON:0000009")], all_as, AS_AS_RELATIONS)
+    assert ("part_of", "UBERON:0000002") in ct_as[("CL:0000002", "UBERON:0000009")], ct_as
+    assert ("subClassOf", "UBERON:0000002") not in ct_as[("CL:0000002", "UBERON:0000009")], ct_as
+    assert as_as[("UBERON:0000002", "UBERON:0000009")] == [("part_of", "UBERON:0000001")], as_as
+    print("Suggestions OK")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the suggestion search on a small closure index")
+    parser.parse_args()
+    check()
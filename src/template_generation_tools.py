@@ -1,20 +1,39 @@
 import logging
 
+import numpy as np
 import pandas as pd
-from rdflib.graph import ConjunctiveGraph
 
-from ccf_tools import add_rows, chunks, split_terms, transform_to_str
-from uberongraph_tools import UberonGraph
+from ccf_tools import add_rows, chunks, split_terms, transform_to_keys
+from rdf_tools import TripleSet
+from suggestion_engine import SuggestionEngine, suggestion_graph
+from term_ids import TERM_IDS
+from uberongraph_tools import TERM_CHUNK, UberonGraph
+from validation_verdicts import ValidationVerdicts
 
 # logger = logging.getLogger('ASCT-b Tables Log')
 
 #    olabel            slabel               o               s
 # 0  kidney      right kidney  UBERON:0002113  UBERON:0004539
 
-def generate_class_graph_template(ccf_tools_df :pd.DataFrame, log_dict: dict):
+def verify(ug: UberonGraph, verdicts: ValidationVerdicts, relation, terms_pairs, query):
+  """Checks the pair keys terms_pairs with ug.verify_relationship and records
+  the verdicts"""
+  valid, non_valid = ug.verify_relationship(terms_pairs, query)
+  verdicts.record(relation, terms_pairs, valid)
+  return valid, non_valid
+
+def pair_rows(ccf_tools_df, keys):
+  """Rows of ccf_tools_df whose (s, o) pair key (see term_ids) is in keys"""
+  keys = np.fromiter(keys, dtype=np.int64)
+  return ccf_tools_df[np.isin(TERM_IDS.pair_keys(ccf_tools_df['s'], ccf_tools_df['o']), keys)]
+
+def generate_class_graph_template(ccf_tools_df :pd.DataFrame, log_dict: dict, ug: UberonGraph = None, graphs=True):
   """Takes a ccf tools dataframe as input;
   Validates relationships against OBO;
-  Adds relationships to template, tagged with OBO status"""
+  Adds relationships to template, tagged with OBO status.
+  ug can be an UberonGraph with a closure index.
+  Also returns the ValidationVerdicts of the relationships.
+  Without graphs, the annotation and suggestion graphs are left empty"""
   error_log = pd.DataFrame(columns=ccf_tools_df.columns)
   valid_error_log = pd.DataFrame(columns=ccf_tools_df.columns)
   strict_log = pd.DataFrame(columns=ccf_tools_df.columns)
@@ -67,14 +86,15 @@ def generate_class_graph_template(ccf_tools_df :pd.DataFrame, log_dict: dict):
   seed_sub = {'ID': 'ID', 'in_subset': 'AI in_subset', 'present_in_taxon': 'AI present_in_taxon'}
   seed_no_valid = {'ID': 'ID', 'ccf_part_of': 'SC ccf_part_of some %', 'ccf_located_in': 'SC ccf_located_in some %'}
   image_report = []
-  ug = UberonGraph()
+  ug = ug or UberonGraph()
   records = [seed]
   records_ub_sub = [seed_sub]
   records_cl_sub = [seed_sub]
   no_valid_records = [seed_no_valid]
+  verdicts = ValidationVerdicts()
   if ccf_tools_df.empty:
-    return (pd.DataFrame.from_records(records), pd.DataFrame.from_records(no_valid_records), error_log, ConjunctiveGraph(), valid_error_log, report_relationship, strict_log, 
-            has_part_log, pd.DataFrame.from_records(records_ub_sub), pd.DataFrame.from_records(records_cl_sub), pd.DataFrame(columns=['term', 'image_url']), ConjunctiveGraph(), log_dict)
+    return (pd.DataFrame.from_records(records), pd.DataFrame.from_records(no_valid_records), error_log, TripleSet(), valid_error_log, report_relationship, strict_log, 
+            has_part_log, pd.DataFrame.from_records(records_ub_sub), pd.DataFrame.from_records(records_cl_sub), pd.DataFrame(columns=['term', 'image_url']), TripleSet(), log_dict, verdicts)
 
   terms = set()
   all_as = set()
@@ -97,13 +117,14 @@ def generate_class_graph_template(ccf_tools_df :pd.DataFrame, log_dict: dict):
     terms.add(r['o'])
 
   # ENTITY CHECK
-  if len(terms) > 90:
-    for chunk in chunks(list(terms), 90):
+  if len(terms) > TERM_CHUNK:
+    for chunk in chunks(sorted(terms), TERM_CHUNK):
       no_valid_class = ug.query_uberon(" ".join(chunk), ug.select_class)
   else:
-    no_valid_class = ug.query_uberon(" ".join(terms), ug.select_class)
+    no_valid_class = ug.query_uberon(" ".join(sorted(terms)), ug.select_class)
 
   del_index = []
+  verdicts.unknown_terms.update(no_valid_class)
   for t in no_valid_class:
     log_dict["no_found_id"].append({"id": t})
     #logger.warning(f"Unrecognised UBERON/CL/PCL entity '{t}'")
@@ -129,17 +150,17 @@ def generate_class_graph_template(ccf_tools_df :pd.DataFrame, log_dict: dict):
       records_cl_sub.append({'ID': r['o'], 'present_in_taxon': 'NCBITaxon:9606', 'in_subset': 'human_reference_atlas'})
 
     if ('CL' in r['s'] or 'PCL' in r['s']) and 'UBERON' in r['o']:
-      terms_ct_as.add(f"({r['s']} {r['o']})")
+      terms_ct_as.add(TERM_IDS.pair_key(r['s'], r['o']))
       all_ct.add(r['s'])
       all_as.add(r['o'])
     elif 'UBERON' in r['s'] and 'UBERON' in r['o']:
-      relation_as.add(f"({r['s']} {r['o']})")
-      terms_pairs.add(f"({r['s']} {r['o']})")
+      relation_as.add(TERM_IDS.pair_key(r['s'], r['o']))
+      terms_pairs.add(TERM_IDS.pair_key(r['s'], r['o']))
       all_as.add(r['s'])
       all_as.add(r['o'])
     elif ('CL' in r['s'] or 'PCL' in r['s']) and ('CL' in r['o'] or 'PCL' in r['o']):
-      relation_ct.add(f"({r['s']} {r['o']})")
-      terms_pairs.add(f"({r['s']} {r['o']})")
+      relation_ct.add(TERM_IDS.pair_key(r['s'], r['o']))
+      terms_pairs.add(TERM_IDS.pair_key(r['s'], r['o']))
       all_ct.add(r['s'])
       all_ct.add(r['o'])
 
@@ -151,13 +172,13 @@ def generate_class_graph_template(ccf_tools_df :pd.DataFrame, log_dict: dict):
   # LABEL CHECK AND GET IMAGES ATTACHED TO EACH TERM
   terms_labels = set()
   terms_images = set()
-  if len(terms) > 90:
-    for chunk in chunks(list(terms), 90):
+  if len(terms) > TERM_CHUNK:
+    for chunk in chunks(sorted(terms), TERM_CHUNK):
       terms_labels = terms_labels.union(ug.query_uberon(" ".join(chunk), ug.select_label))
       terms_images = terms_images.union(ug.query_uberon(" ".join(chunk), ug.select_image))
   else:
-    terms_labels = ug.query_uberon(" ".join(list(terms)), ug.select_label)
-    terms_images = ug.query_uberon(" ".join(list(terms)), ug.select_image)
+    terms_labels = ug.query_uberon(" ".join(sorted(terms)), ug.select_label)
+    terms_images = ug.query_uberon(" ".join(sorted(terms)), ug.select_image)
 
   for term, label in terms_labels:
     rows = ccf_tools_df[(ccf_tools_df['s'] == term) | (ccf_tools_df['o'] == term)]
@@ -185,17 +206,15 @@ def generate_class_graph_template(ccf_tools_df :pd.DataFrame, log_dict: dict):
     image_report.append({'term': '', 'image_url': ''})
       
   # SUBCLASS CHECK
-  valid_subclass, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_subclass)
-  valid_ct_as_subclass, terms_ct_as = ug.verify_relationship(terms_ct_as, ug.select_subclass)
+  valid_subclass, terms_pairs = verify(ug, verdicts, 'isa', terms_pairs, ug.select_subclass)
+  valid_ct_as_subclass, terms_ct_as = verify(ug, verdicts, 'isa', terms_ct_as, ug.select_subclass)
   
   records, valid_as, valid_ct = add_rows(records, valid_as, valid_ct, valid_subclass.union(valid_ct_as_subclass), 'isa')
 
   # INDIRECT SUBCLASS CHECK
-  valid_subclass_onto, _ = ug.verify_relationship(transform_to_str(valid_subclass), ug.select_subclass_ontology)
-
-  terms_s, terms_o = split_terms(transform_to_str(valid_subclass - valid_subclass_onto))
+  valid_subclass_onto, _ = ug.verify_relationship(transform_to_keys(valid_subclass), ug.select_subclass_ontology)
 
-  rows_nvso = ccf_tools_df[ccf_tools_df[["s","o"]].apply(tuple, 1).isin(zip(terms_s, terms_o))]
+  rows_nvso = pair_rows(ccf_tools_df, transform_to_keys(valid_subclass - valid_subclass_onto))
 
   # ADD RESULTS TO INDIRECT LOG
   valid_error_log = pd.concat([valid_error_log, rows_nvso])
@@ -207,19 +226,17 @@ def generate_class_graph_template(ccf_tools_df :pd.DataFrame, log_dict: dict):
       indirect_ct.add((r['s'], r['o']))
 
   # PART OF CHECK
-  valid_po, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_po)
-  valid_ct_as_po, terms_ct_as = ug.verify_relationship(terms_ct_as, ug.select_po)
+  valid_po, terms_pairs = verify(ug, verdicts, 'part_of', terms_pairs, ug.select_po)
+  valid_ct_as_po, terms_ct_as = verify(ug, verdicts, 'part_of', terms_ct_as, ug.select_po)
 
   records, valid_as, valid_ct = add_rows(records, valid_as, valid_ct, valid_po.union(valid_ct_as_po), 'part_of')
 
   # INDIRECT PART OF CHECK
-  terms_valid_po = transform_to_str(valid_po)
+  terms_valid_po = transform_to_keys(valid_po)
 
   valid_po_nr, _ = ug.verify_relationship(terms_valid_po, ug.select_po_nonredundant)
   
-  terms_s, terms_o = split_terms(transform_to_str(valid_po - valid_po_nr))
-
-  rows_nvponr = ccf_tools_df[ccf_tools_df[["s","o"]].apply(tuple, 1).isin(zip(terms_s, terms_o))]
+  rows_nvponr = pair_rows(ccf_tools_df, transform_to_keys(valid_po - valid_po_nr))
 
   # ADD RESULTS TO INDIRECT LOG
   valid_error_log = pd.concat([valid_error_log, rows_nvponr])
@@ -231,17 +248,15 @@ def generate_class_graph_template(ccf_tools_df :pd.DataFrame, log_dict: dict):
       indirect_ct.add((r['s'], r['o']))
 
   # OVERLAPS CHECK
-  valid_overlaps, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_overlaps)
-  valid_ct_as_overlaps, terms_ct_as = ug.verify_relationship(terms_ct_as, ug.select_overlaps)
+  valid_overlaps, terms_pairs = verify(ug, verdicts, 'overlaps', terms_pairs, ug.select_overlaps)
+  valid_ct_as_overlaps, terms_ct_as = verify(ug, verdicts, 'overlaps', terms_ct_as, ug.select_overlaps)
 
   records, valid_as, valid_ct = add_rows(records, valid_as, valid_ct, valid_overlaps.union(valid_ct_as_overlaps), 'overlaps')
   
   # INDIRECT OVERLAPS CHECK
-  valid_o_nr, _ = ug.verify_relationship(transform_to_str(valid_overlaps), ug.select_overlaps_nonredundant)
-
-  terms_s, terms_o = split_terms(transform_to_str(valid_overlaps - valid_o_nr))
+  valid_o_nr, _ = ug.verify_relationship(transform_to_keys(valid_overlaps), ug.select_overlaps_nonredundant)
 
-  rows_nvonr = ccf_tools_df[ccf_tools_df[["s","o"]].apply(tuple, 1).isin(zip(terms_s, terms_o))]
+  rows_nvonr = pair_rows(ccf_tools_df, transform_to_keys(valid_overlaps - valid_o_nr))
 
   # ADD RESULTS TO INDIRECT LOG
   valid_error_log = pd.concat([valid_error_log, rows_nvonr])
@@ -253,74 +268,80 @@ def generate_class_graph_template(ccf_tools_df :pd.DataFrame, log_dict: dict):
       indirect_ct.add((r['s'], r['o']))
 
   # LOCATED IN CHECK
-  valid_ct_as_locatedin, terms_ct_as = ug.verify_relationship(terms_ct_as, ug.select_located_in)
+  valid_ct_as_locatedin, terms_ct_as = verify(ug, verdicts, 'located_in', terms_ct_as, ug.select_located_in)
   records, valid_as, valid_ct = add_rows(records, valid_as, valid_ct, valid_ct_as_locatedin, 'located_in')
 
-  terms_ct_as = terms_ct_as - transform_to_str(valid_ct_as_locatedin)
+  terms_ct_as = terms_ct_as - transform_to_keys(valid_ct_as_locatedin)
 
   # CONNECTED TO CHECK
-  valid_conn_to, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_ct)
-  valid_ct_as_conn_to, terms_ct_as = ug.verify_relationship(terms_ct_as, ug.select_ct)
+  valid_conn_to, terms_pairs = verify(ug, verdicts, 'connected_to', terms_pairs, ug.select_ct)
+  valid_ct_as_conn_to, terms_ct_as = verify(ug, verdicts, 'connected_to', terms_ct_as, ug.select_ct)
 
   records, valid_as, valid_ct = add_rows(records, valid_as, valid_ct, valid_conn_to.union(valid_ct_as_conn_to), 'connected_to')
 
   # CONTINUOUS WITH CHECK
-  valid_cont_with, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_continuous_with)
+  valid_cont_with, terms_pairs = verify(ug, verdicts, 'continuous_with', terms_pairs, ug.select_continuous_with)
 
   records, valid_as, valid_ct = add_rows(records, valid_as, valid_ct, valid_cont_with, 'continuous_with')
   
   # CONNECTS CHECK
-  valid_connects, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_connects)
+  valid_connects, terms_pairs = verify(ug, verdicts, 'connects', terms_pairs, ug.select_connects)
 
   records, valid_as, valid_ct = add_rows(records, valid_as, valid_ct, valid_connects, 'connects')
   
   # SURROUNDS CHECK
-  valid_surrounds, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_surrounds)
+  valid_surrounds, terms_pairs = verify(ug, verdicts, 'surrounds', terms_pairs, ug.select_surrounds)
 
   records, valid_as, valid_ct = add_rows(records, valid_as, valid_ct, valid_surrounds, 'surrounds')
 
   # STRICT CT-AS REPORT
-  terms_s, terms_o = split_terms(terms_ct_as)
-  
-  no_valid_ct_as = ccf_tools_df[ccf_tools_df[["s","o"]].apply(tuple, 1).isin(zip(terms_s, terms_o))]
+  no_valid_ct_as = pair_rows(ccf_tools_df, terms_ct_as)
 
   strict_log = pd.concat([strict_log,no_valid_ct_as])
 
   # DEVELOPS FROM CHECK
-  valid_dev_from, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_develops_from)
+  valid_dev_from, terms_pairs = verify(ug, verdicts, 'develops_from', terms_pairs, ug.select_develops_from)
   records, valid_as, valid_ct = add_rows(records, valid_as, valid_ct, valid_dev_from, 'develops_from')
 
   # AS-CT HAS PART
-  valid_has_part, terms_ct_as = ug.verify_relationship(terms_ct_as, ug.select_has_part)
+  valid_has_part, terms_ct_as = verify(ug, verdicts, 'has_part', terms_ct_as, ug.select_has_part)
   records, valid_as, valid_ct = add_rows(records, valid_as, valid_ct, valid_has_part, 'has_part', True)
   
   # AS-AS HAS PART
-  valid_as_as_has_part, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_has_part)
+  valid_as_as_has_part, terms_pairs = verify(ug, verdicts, 'has_part', terms_pairs, ug.select_has_part)
   records, valid_as, valid_ct = add_rows(records, valid_as, valid_ct, valid_as_as_has_part, 'has_part')
 
   # CT-AS SUBCLASS PART OF
-  valid_subclass_ct_as_po, terms_ct_as = ug.verify_relationship(terms_ct_as, ug.select_subclass_po)
+  valid_subclass_ct_as_po, terms_ct_as = verify(ug, verdicts, 'subclass_part_of', terms_ct_as, ug.select_subclass_po)
   records, valid_as, valid_ct = add_rows(records, valid_as, valid_ct, valid_subclass_ct_as_po, 'has_part', True)
 
-  terms_s, terms_o = split_terms(transform_to_str(valid_has_part.union(valid_subclass_ct_as_po).union(valid_as_as_has_part)))
-
-  has_part_report = ccf_tools_df[ccf_tools_df[["s","o"]].apply(tuple, 1).isin(zip(terms_s, terms_o))]
+  has_part_report = pair_rows(ccf_tools_df, transform_to_keys(valid_has_part.union(valid_subclass_ct_as_po).union(valid_as_as_has_part)))
 
   has_part_log = pd.concat([has_part_log,has_part_report])
 
-  terms_ct, terms_as = split_terms(terms_ct_as - transform_to_str(valid_has_part.union(valid_subclass_ct_as_po)))
+  invalid_ct_as_keys = terms_ct_as - transform_to_keys(valid_has_part.union(valid_subclass_ct_as_po))
+  terms_ct, terms_as = split_terms(invalid_ct_as_keys)
 
-  terms_s, terms_o = split_terms(terms_pairs - transform_to_str(valid_dev_from))
+  invalid_keys = terms_pairs - transform_to_keys(valid_dev_from)
+  terms_s, terms_o = split_terms(invalid_keys)
 
   terms_as_d = set(t for t in terms_s if "UBERON" in t)
   terms_ct_d = set(t for t in terms_s if "CL" in t)
 
-  sec_graph = ug.get_suggestion_graph(all_as, terms_as_d, all_ct, terms_ct, terms_ct_d)
-
-  terms_set = zip(terms_ct + terms_s, terms_as + terms_o)
+  if not graphs:
+    sec_graph = TripleSet()
+  elif ug.closure_index is not None:
+    invalid_pairs = list(zip(terms_s, terms_o))
+    sec_graph = suggestion_graph(SuggestionEngine(ug.closure_index, ug.normalized_ic),
+                                 [(s, o) for s, o in invalid_pairs if "UBERON" in s],
+                                 list(zip(terms_ct, terms_as)),
+                                 [(s, o) for s, o in invalid_pairs if "CL" in s],
+                                 all_as, all_ct)
+  else:
+    sec_graph = ug.get_suggestion_graph(all_as, terms_as_d, all_ct, terms_ct, terms_ct_d)
 
   # NOT VALID LOG
-  no_valid_relation = ccf_tools_df[ccf_tools_df[["s","o"]].apply(tuple, 1).isin(terms_set)]
+  no_valid_relation = pair_rows(ccf_tools_df, invalid_ct_as_keys | invalid_keys)
 
   for _, r in no_valid_relation.iterrows():
     if 'UBERON' in r['s'] and 'UBERON' in r['o']:
@@ -345,17 +366,13 @@ def generate_class_graph_template(ccf_tools_df :pd.DataFrame, log_dict: dict):
   error_log = pd.concat([error_log,no_valid_relation])
 
   # ADD DELTA IC TO NOT VALIDATED REPORT
-  error_log["deltaIC"] = None
-  all_terms = set(error_log["s"]).union(set(error_log["o"]))
+  all_terms = pd.unique(pd.concat([error_log["s"], error_log["o"]]))
+  norm_ic = pd.Series(ug.normalized_ic(all_terms), index=all_terms, dtype=float)
+  subj_ic = error_log["s"].map(norm_ic).to_numpy(dtype=float)
+  obj_ic = error_log["o"].map(norm_ic).to_numpy(dtype=float)
+  # Only when the subject is more general than the object, None otherwise
+  error_log["deltaIC"] = pd.Series(np.abs(subj_ic - obj_ic)).astype(object).where(subj_ic < obj_ic, None).to_numpy()
 
-  norm_ic_list = ug.query_uberon(" ".join(all_terms), ug.select_normalized_ic)
-  
-  for _, r in error_log.iterrows():
-    subj_ic = norm_ic_term(norm_ic_list, r["s"])
-    obj_ic = norm_ic_term(norm_ic_list, r["o"])
-    if subj_ic < obj_ic:
-      r["deltaIC"] = abs(subj_ic - obj_ic)
-    
 
   # RELATIONSHIP REPORT
   nb_relation_as = len(relation_as)
@@ -390,16 +407,11 @@ def generate_class_graph_template(ccf_tools_df :pd.DataFrame, log_dict: dict):
   }
 
   # ANNOTATION 
-  annotations = ug.get_annotations(terms)
+  annotations = ug.get_annotations(terms) if graphs else TripleSet()
   
 
   return (pd.DataFrame.from_records(records), pd.DataFrame.from_records(no_valid_records), error_log.sort_values('deltaIC', ascending=False), annotations, valid_error_log.sort_values('s'), report_relationship, strict_log.sort_values('s'), 
-          has_part_report.sort_values('s'), pd.DataFrame.from_records(records_ub_sub).drop_duplicates(), pd.DataFrame.from_records(records_cl_sub).drop_duplicates(), pd.DataFrame.from_records(image_report).sort_values('term'), sec_graph, log_dict)
-
-def norm_ic_term(normalized_ic_list, term):
-  for t, ic in normalized_ic_list:
-    if t == term:
-      return float(ic)
+          has_part_report.sort_values('s'), pd.DataFrame.from_records(records_ub_sub).drop_duplicates(), pd.DataFrame.from_records(records_cl_sub).drop_duplicates(), pd.DataFrame.from_records(image_report).sort_values('term'), sec_graph, log_dict, verdicts)
 
 def generate_ind_graph_template(ccf_tools_df :pd.DataFrame):
     seed = {'ID': 'ID', 'LABEL': 'A rdfs:label', 'TYPE': 'TYPE',
@@ -414,32 +426,38 @@ def generate_ind_graph_template(ccf_tools_df :pd.DataFrame):
         records.append(rec)
     return pd.DataFrame.from_records(records)
 
-def generate_vasculature_template(ccf_tools_df):
+def generate_vasculature_template(ccf_tools_df, ug: UberonGraph = None, verdicts: ValidationVerdicts = None):
+  """AS-AS pairs that are neither isa, part_of, overlaps nor connected_to
+  become connected_to axioms. The verdicts of generate_class_graph_template
+  are reused when given, ug is only queried for pairs they do not cover"""
   seed = {'SUBJECT': 'ID', 'OBJECT': "SC 'connected_to' some %", 'in_subset': 'AI in_subset'} 
   records = [seed]
-  ug = UberonGraph()
+  verdicts = verdicts or ValidationVerdicts()
 
   as_as = ccf_tools_df[ccf_tools_df['s'].str.startswith('UBERON') & ccf_tools_df['o'].str.startswith('UBERON')]
-  terms_pairs = set(f"({r['s']} {r['o']})" for _, r in as_as.iterrows())
+  pairs = list(dict.fromkeys(zip(as_as['s'], as_as['o'])))
 
-  _, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_subclass)
-  
-  _, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_po)
+  invalid_pairs, unchecked = verdicts.invalid_pairs(pairs, ['isa', 'part_of', 'overlaps', 'connected_to'])
 
-  _, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_overlaps)
+  if unchecked:
+    ug = ug or UberonGraph()
+    terms_pairs = transform_to_keys(unchecked)
+
+    _, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_subclass)
+    
+    _, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_po)
 
-  _, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_ct)
+    _, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_overlaps)
 
-  terms_as_sub, terms_as_obj = split_terms(terms_pairs)
+    _, terms_pairs = ug.verify_relationship(terms_pairs, ug.select_ct)
 
-  for i, sub in enumerate(terms_as_sub):
+    invalid_pairs.extend(zip(*split_terms(terms_pairs)))
+
+  for sub, obj in invalid_pairs:
     rec = dict()
     rec['SUBJECT'] = sub
-    rec['OBJECT'] = terms_as_obj[i]
+    rec['OBJECT'] = obj
     rec['in_subset'] = 'human_reference_atlas'
     records.append(rec)
     
   return pd.DataFrame.from_records(records).sort_values(by=['SUBJECT'])
-
-
-
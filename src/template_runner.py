@@ -1,81 +1,175 @@
 import argparse
 import json
 import os
+import sys
 from datetime import date
 
 import pandas as pd
 
 from ccf_tools import parse_asctb
+from closure_index import ClosureIndex
+from ic_table import ICTable
+from query_planner import cached_queries, plan, table_sets
+from rdf_tools import RDF_EXTENSIONS
 from template_generation_tools import (generate_class_graph_template,
                                        generate_vasculature_template)
-
-print(os.getcwd())
-parser = argparse.ArgumentParser()
-parser.add_argument('--test', help='Run in test mode.',
-                    action="store_true")  # Not doing anything with this yet.
-parser.add_argument("job", help="job name")
-parser.add_argument("target_file", help='input file path')
-parser.add_argument("output_file", help='output file path')
-parser.add_argument("old_version", help="is old version")
+from uberongraph_tools import LatencyLog, UberonGraph
+from warehouse import ValidationWarehouse, read_table_version
 
 TODAY = date.today().strftime("%Y%m%d")
-args = parser.parse_args()
 
-ccf_tools_df, report_t, new_terms_report, new_uberon_terms, log_dict = parse_asctb(args.target_file)
+# Names of the values returned by generate_class_graph_template
+CLASS_RESULTS = ["class_template", "no_valid_template", "error_log", "annotations", "indirect_error_log",
+                 "report_r", "strict_log", "has_part_log", "ub_subs_t", "cl_subs_t", "image_report",
+                 "sec_graph", "log_dict", "verdicts"]
 
-class_template, no_valid_template, error_log, annotations, indirect_error_log, report_r, strict_log, has_part_log, ub_subs_t, cl_subs_t, image_report, sec_graph, log_dict = generate_class_graph_template(ccf_tools_df, log_dict)
 
-class_template.to_csv(args.output_file, sep=',', index=False)
+def load_closure_index(base_dir):
+  closure_index = None
+  if base_dir:
+    closure_index = ClosureIndex.for_current_version(base_dir)
+    print(f"Closure index: {closure_index.directory}" if closure_index else "No closure index for the current ontology versions, using SPARQL")
+  return closure_index
 
-annotations.serialize(f'../owl/{args.job}_annotations.owl', format='xml')
 
-if args.job == 'Blood_vasculature':
-  vasculature_template = generate_vasculature_template(ccf_tools_df)
-  vasculature_template.to_csv(f'../templates/vasculature_class.tsv', sep='\t', index=False)
+def load_ic_table(base_dir):
+  ic_table = None
+  if base_dir:
+    ic_table = ICTable.for_current_version(base_dir)
+    print(f"IC table: {ic_table.directory}" if ic_table else "No IC table for the current ontology versions, using SPARQL")
+  return ic_table
 
-if not eval(args.old_version):
-  report_t['Table'] = args.job
-  report_t = pd.DataFrame.from_dict(report_t)
-  report_t_path = f"../reports/report_terms_{TODAY}.tsv"
 
-  new_terms_report.to_csv(f'../logs/{args.job}/new_cl_terms_{args.job}.tsv', sep='\t', index=False)
+def validate_table(ccf_tools_df, report_t, log_dict, job, ug, graphs=True):
+  """Validates a parsed table (the results of parse_asctb) and returns the
+  results of generate_class_graph_template by name, with the terms report
+  and the relationship report as data frames tagged with the table name"""
+  results = dict(zip(CLASS_RESULTS, generate_class_graph_template(ccf_tools_df, log_dict, ug, graphs)))
+  results["report_t"] = pd.DataFrame.from_dict({**report_t, 'Table': job})
+  results["report_r"] = pd.DataFrame.from_dict({**results["report_r"], 'Table': job})
+  return results
 
-  new_uberon_terms.to_csv(f'../logs/{args.job}/new_uberon_terms_{args.job}.tsv', sep='\t', index=False)
 
-  report_r['Table'] = args.job
-  report_r = pd.DataFrame.from_dict(report_r)
-  report_r_path = f"../reports/report_relationship_{TODAY}.tsv"
+def write_logs(job, results, new_terms_report, new_uberon_terms, log_dict=True):
+  """Writes the logs of a table to ../logs/{job}; logs_dict.json only with
+  log_dict, as it is only read back to generate the README"""
+  new_terms_report.to_csv(f'../logs/{job}/new_cl_terms_{job}.tsv', sep='\t', index=False)
 
-  no_valid_template.to_csv(f'../templates/{args.job}_no-valid.csv', sep=',', index=False)
+  new_uberon_terms.to_csv(f'../logs/{job}/new_uberon_terms_{job}.tsv', sep='\t', index=False)
 
-  error_log.to_csv(f'../logs/{args.job}/class_{args.job}_log.tsv', sep='\t', index=False)
+  results["error_log"].to_csv(f'../logs/{job}/class_{job}_log.tsv', sep='\t', index=False)
 
-  sec_graph.serialize(f'../owl/{args.job}_sec.owl', format='xml')
+  results["indirect_error_log"].to_csv(f'../logs/{job}/class_{job}_indirect_log.tsv', sep='\t', index=False)
 
-  indirect_error_log.to_csv(f'../logs/{args.job}/class_{args.job}_indirect_log.tsv', sep='\t', index=False)
+  results["strict_log"].to_csv(f'../logs/{job}/{job}_AS_CT_strict_log.tsv', sep='\t', index=False)
 
-  strict_log.to_csv(f'../logs/{args.job}/{args.job}_AS_CT_strict_log.tsv', sep='\t', index=False)
+  results["has_part_log"].to_csv(f'../logs/{job}/{job}_AS_has_part_CT_log.tsv', sep='\t', index=False)
 
-  has_part_log.to_csv(f'../logs/{args.job}/{args.job}_AS_has_part_CT_log.tsv', sep='\t', index=False)
+  results["image_report"].to_csv(f'../logs/{job}/report_images_{job}.tsv', sep='\t', index=False)
 
-  ub_subs_t.to_csv(f'../templates/temp_ub_{args.job}_ASCTB_subset.csv', sep=',', index=False)
+  if log_dict:
+    with open(f'../logs/{job}/logs_dict.json', 'w', encoding='utf-8') as f:
+      json.dump(results["log_dict"], f, ensure_ascii=False, indent=2)
 
-  cl_subs_t.to_csv(f'../templates/temp_cl_{args.job}_ASCTB_subset.csv', sep=',', index=False)
 
-  image_report.to_csv(f'../logs/{args.job}/report_images_{args.job}.tsv', sep='\t', index=False)
+def write_outputs(args, results, new_terms_report, new_uberon_terms):
+  rdf_ext = RDF_EXTENSIONS[args.rdf_format]
+  report_t_path = f"../reports/report_terms_{TODAY}.tsv"
+  report_r_path = f"../reports/report_relationship_{TODAY}.tsv"
+
+  write_logs(args.job, results, new_terms_report, new_uberon_terms, args.log_dict)
 
-  with open(f'../logs/{args.job}/logs_dict.json', 'w', encoding='utf-8') as f:
-    json.dump(log_dict, f, ensure_ascii=False, indent=2)
+  results["no_valid_template"].to_csv(f'../templates/{args.job}_no-valid.csv', sep=',', index=False)
+
+  results["sec_graph"].serialize(f'../owl/{args.job}_sec.{rdf_ext}', format=args.rdf_format)
+
+  results["ub_subs_t"].to_csv(f'../templates/temp_ub_{args.job}_ASCTB_subset.csv', sep=',', index=False)
+
+  results["cl_subs_t"].to_csv(f'../templates/temp_cl_{args.job}_ASCTB_subset.csv', sep=',', index=False)
 
   if os.path.isfile(report_t_path):
-    report_t.to_csv(report_t_path, sep='\t', index=False, mode='a', header=False)
+    results["report_t"].to_csv(report_t_path, sep='\t', index=False, mode='a', header=False)
   else:
-    report_t.to_csv(report_t_path, sep='\t', index=False)
+    results["report_t"].to_csv(report_t_path, sep='\t', index=False)
 
   if os.path.isfile(report_r_path):
-    report_r.to_csv(report_r_path, sep='\t', index=False, mode='a', header=False)
+    results["report_r"].to_csv(report_r_path, sep='\t', index=False, mode='a', header=False)
   else:
-    report_r.to_csv(report_r_path, sep='\t', index=False)
-      
-
-
+    results["report_r"].to_csv(report_r_path, sep='\t', index=False)
+
+
+def load_warehouse(args, results, ug):
+  warehouse = ValidationWarehouse(args.warehouse)
+  table_version, table_date = read_table_version(args.job)
+  ont_version = ug.add_prefix_ont(ug.query_uberon([], ug.select_ontology_version))
+  warehouse.record_run(TODAY, args.job, table_version, table_date, dict(zip(ont_version[::2], ont_version[1::2])))
+  warehouse.load_metrics(TODAY, "terms", results["report_t"])
+  warehouse.load_metrics(TODAY, "relationship", results["report_r"])
+  warehouse.load_issues(TODAY, args.job, "invalid", results["error_log"])
+  warehouse.load_issues(TODAY, args.job, "indirect", results["indirect_error_log"])
+  warehouse.load_issues(TODAY, args.job, "strict_ct_as", results["strict_log"])
+  warehouse.load_issues(TODAY, args.job, "has_part", results["has_part_log"])
+  warehouse.load_log_dict(TODAY, args.job, results["log_dict"])
+  warehouse.close()
+
+
+def main(args, parsed=None, ug=None):
+  """Validates args.target_file and writes its outputs. parsed, the results
+  of parse_asctb when the table is already in memory, and ug, an UberonGraph
+  shared between tables, are used when given. Returns the results of
+  validate_table"""
+  print(os.getcwd())
+  rdf_ext = RDF_EXTENSIONS[args.rdf_format]
+
+  ccf_tools_df, report_t, new_terms_report, new_uberon_terms, log_dict = parsed or parse_asctb(args.target_file)
+
+  if ug is None:
+    ug = UberonGraph(closure_index=load_closure_index(args.closure_index), ic_table=load_ic_table(args.ic_table),
+                     latency_log=LatencyLog(args.latency_log) if args.latency_log else None)
+
+  if args.max_queries:
+    sets = table_sets(ccf_tools_df)
+    counts = {kind: len(values) for kind, values in sets.items()}
+    total = sum(plan(counts, ug.closure_index, ug.ic_table, cached_queries(sets, ug)).values())
+    if total > args.max_queries:
+      sys.exit(f"{args.job}: up to {total} queries planned, over --max-queries {args.max_queries}")
+
+  results = validate_table(ccf_tools_df, report_t, log_dict, args.job, ug)
+
+  results["class_template"].to_csv(args.output_file, sep=',', index=False)
+
+  results["annotations"].serialize(f'../owl/{args.job}_annotations.{rdf_ext}', format=args.rdf_format)
+
+  if args.job == 'Blood_vasculature':
+    vasculature_template = generate_vasculature_template(ccf_tools_df, ug, results["verdicts"])
+    vasculature_template.to_csv(f'../templates/vasculature_class.tsv', sep='\t', index=False)
+
+  if not eval(args.old_version):
+    write_outputs(args, results, new_terms_report, new_uberon_terms)
+
+    if args.warehouse:
+      load_warehouse(args, results, ug)
+
+  return results
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--test', help='Run in test mode.',
+                      action="store_true")  # Not doing anything with this yet.
+  parser.add_argument('--rdf-format', choices=RDF_EXTENSIONS, default='xml',
+                      help='format of the annotations and suggestion graphs')
+  parser.add_argument('--warehouse', help='validation warehouse file to load the results into')
+  parser.add_argument('--closure-index', help='closure index base directory, used when built for the current ontology versions')
+  parser.add_argument('--ic-table', help='IC table base directory, used when built for the current ontology versions')
+  parser.add_argument('--latency-log', help='JSON lines file the duration of each query is appended to')
+  parser.add_argument('--max-queries', type=int, help='do not validate a table planned to need more queries (see query_planner.py)')
+  parser.add_argument('--no-log-dict', dest='log_dict', action='store_false',
+                      help='do not write logs_dict.json, only read back to generate the README')
+  parser.add_argument("job", help="job name")
+  parser.add_argument("target_file", help='input file path')
+  parser.add_argument("output_file", help='output file path')
+  parser.add_argument("old_version", help="is old version")
+
+  args = parser.parse_args()
+  main(args)
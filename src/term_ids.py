@@ -0,0 +1,136 @@
+"""
+Process-wide interning of UBERON, CL and PCL terms. Every CURIE of a table
+pair gets a compact int32 ID and one canonical string, so that the pair sets
+and verdicts of a validation hold int64 pair keys instead of strings, and
+frames are matched against them with NumPy. Also converts between IRIs and
+CURIEs, one term at a time or a whole column at once.
+"""
+import re
+import threading
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+OBO = "http://purl.obolibrary.org/obo/"
+PREFIXES = ["UBERON", "CL", "PCL"]
+
+IRI_PATTERN = re.compile(rf"^{re.escape(OBO)}({'|'.join(PREFIXES)})_")
+CURIE_PATTERN = re.compile(rf"^({'|'.join(PREFIXES)}):")
+# Only well-formed CURIEs are interned by canonical, not labels or values
+TERM_PATTERN = re.compile(rf"^({'|'.join(PREFIXES)}):\d{{7}}$")
+MAX_ID = 2 ** 31 - 1
+
+
+class TermIds():
+    """
+    Bidirectional map between CURIEs and int32 IDs, growing as terms are
+    seen and shared by the threads of a process. IDs are only given to the
+    terms of table pairs and to well-formed CURIEs, so the map is bounded by
+    the terms of the tables and ontologies, not by the values converted.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._ids = {}
+        self._terms = []
+
+    def __len__(self):
+        return len(self._terms)
+
+    def id(self, term):
+        """
+        Return the ID of a CURIE, adding it when it is new.
+        """
+        term_id = self._ids.get(term)
+        if term_id is None:
+            with self.lock:
+                term_id = self._ids.get(term)
+                if term_id is None:
+                    if len(self._terms) > MAX_ID:
+                        raise OverflowError("No int32 term ID left")
+                    term_id = len(self._terms)
+                    # Listed before it is published, for term() of other threads
+                    self._terms.append(term)
+                    self._ids[term] = term_id
+        return term_id
+
+    def ids(self, terms):
+        """
+        Return the IDs of several CURIEs as an int32 array.
+        """
+        import numpy as np
+        return np.fromiter((self.id(term) for term in terms), dtype=np.int32)
+
+    def term(self, term_id):
+        return self._terms[term_id]
+
+    def terms(self, ids):
+        """
+        Return the CURIEs of several IDs as a list.
+        """
+        return [self._terms[term_id] for term_id in ids]
+
+    def canonical(self, term):
+        """
+        Return the one shared string of a UBERON, CL or PCL CURIE, or term
+        itself when it is something else.
+        """
+        if not isinstance(term, str) or not TERM_PATTERN.match(term):
+            return term
+        return self._terms[self.id(term)]
+
+    def pair_key(self, subject, obj):
+        """
+        Pack a (subject, object) pair into one int64.
+        """
+        return (self.id(subject) << 32) | self.id(obj)
+
+    def pair_keys(self, subjects, objects):
+        """
+        Pack several pairs, e.g. the s and o columns of a frame, into an
+        int64 array.
+        """
+        import numpy as np
+        return (self.ids(subjects).astype(np.int64) << 32) | self.ids(objects).astype(np.int64)
+
+    def pair(self, key):
+        """
+        Unpack a pair key into (subject, object) CURIEs.
+        """
+        key = int(key)
+        return self._terms[key >> 32], self._terms[key & 0xFFFFFFFF]
+
+    def pairs(self, keys):
+        return [self.pair(key) for key in keys]
+
+
+TERM_IDS = TermIds()
+
+
+@lru_cache(maxsize=65536)
+def iri_to_curie(iri):
+    """
+    http://purl.obolibrary.org/obo/UBERON_0002113 -> UBERON:0002113, as the
+    canonical string. IRIs outside UBERON, CL and PCL are returned unchanged.
+    """
+    curie = IRI_PATTERN.sub(r"\1:", iri, count=1)
+    return TERM_IDS.canonical(curie) if curie != iri else iri
+
+
+def curie_to_iri(curie):
+    return CURIE_PATTERN.sub(rf"{OBO}\1_", curie, count=1)
+
+
+def iris_to_curies(values: "pd.Series") -> "pd.Series":
+    """
+    Convert a column of IRIs to CURIEs.
+    """
+    return values.astype(str).str.replace(IRI_PATTERN, r"\1:", regex=True)
+
+
+def curies_to_iris(values: "pd.Series") -> "pd.Series":
+    """
+    Convert a column of CURIEs to IRIs.
+    """
+    return values.astype(str).str.replace(CURIE_PATTERN, rf"{OBO}\1_", regex=True)
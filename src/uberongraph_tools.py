@@ -1,10 +1,85 @@
-from SPARQLWrapper import SPARQLWrapper, JSON, RDFXML
-from rdflib.graph import ConjunctiveGraph
-from ccf_tools import chunks, transform_to_str
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from ccf_tools import chunks, pair_strings, split_terms, transform_to_keys
+from sparql_client import JSON, RDFXML, UBERGRAPH, shared_client
+from term_ids import iri_to_curie
+
+# Number of terms or pairs per query
+PAIR_CHUNK = 90
+TERM_CHUNK = 90
+CONSTRUCT_CHUNK = 30
+CT_SUBCLASS_CHUNK = 20
+ANNOTATION_CHUNK = 30
+
+
+class LatencyLog():
+    """
+    Append the duration of each query sent to ubergraph, by stage (the name
+    of the query, suggestion or annotation), to a JSON lines file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        line = json.dumps({"time": round(time.time(), 3), "stage": stage, "seconds": round(seconds, 4)})
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class QueryCache():
+    """
+    Least recently used cache of SELECT query results, shared between the
+    UberonGraph instances of several threads.
+    """
+    def __init__(self, max_size=20000):
+        self.max_size = max_size
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query):
+        with self.lock:
+            results = self.results.get(query)
+            if results is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.results.move_to_end(query)
+            return set(results)
+
+    def put(self, query, results):
+        with self.lock:
+            self.results[query] = frozenset(results)
+            self.results.move_to_end(query)
+            while len(self.results) > self.max_size:
+                self.results.popitem(last=False)
+
+    def __len__(self):
+        return len(self.results)
+
+    def __contains__(self, query):
+        """
+        Whether the results of a query are cached, without counting a hit
+        or a miss.
+        """
+        with self.lock:
+            return query in self.results
+
 
 class UberonGraph():
-    def __init__(self):
-        self.sparql = SPARQLWrapper('https://ubergraph.apps.renci.org/sparql')
+    def __init__(self, closure_index=None, ic_table=None, query_cache=None, verdict_cache=None, latency_log=None, client=None):
+        self.client = client or shared_client(UBERGRAPH)
+        self.closure_index = closure_index
+        self.ic_table = ic_table
+        self.query_cache = query_cache
+        self.verdict_cache = verdict_cache
+        self.latency_log = latency_log
         self.select_po = """
           PREFIX part_of: <http://purl.obolibrary.org/obo/BFO_0000050> 
           PREFIX UBERON: <http://purl.obolibrary.org/obo/UBERON_>
@@ -296,6 +371,27 @@ class UberonGraph():
           }
         """
 
+        # Queries answered by the closure index, when there is one:
+        # (relation, kind, whether the pair is checked as object relation subject)
+        self.closure_queries = {
+          self.select_subclass: ("subClassOf", "entailed", False),
+          self.select_subclass_ontology: ("subClassOf", "direct", False),
+          self.select_po: ("part_of", "entailed", False),
+          self.select_po_nonredundant: ("part_of", "direct", False),
+          self.select_has_part: ("has_part", "entailed", True),
+          self.select_ct: ("connected_to", "entailed", False),
+        }
+        # Stage names of the SELECT queries, for the latency log
+        self.query_names = {value: name for name, value in vars(self).items() if name.startswith("select_")}
+
+    def execute(self, stage, query, return_format=JSON):
+        """Sends a query, recording its latency when there is a latency log"""
+        start = time.perf_counter()
+        results = self.client.query(query, return_format)
+        if self.latency_log is not None:
+          self.latency_log.record(stage, time.perf_counter() - start)
+        return results
+
     def ask_uberon(self, r, q, urls=True):
         """"""
         start = ''
@@ -304,21 +400,24 @@ class UberonGraph():
             start = '<'
             end = '>'
         q = q % (start + r['s'] + end, start + r['o'] + end)
-        self.sparql.setReturnFormat(JSON)
-        self.sparql.setQuery(q)
-        results = self.sparql.query().convert()
+        results = self.execute("ask", q)
         return results["boolean"]
 
     def query_uberon(self, terms, query):
+      stage = self.query_names.get(query, "select")
       query = query % terms
-      self.sparql.setReturnFormat(JSON)
-      self.sparql.setQuery(query)
-      
-      results = self.sparql.query().convert()
+      if self.query_cache is not None:
+        cached = self.query_cache.get(query)
+        if cached is not None:
+          return cached
+      results = self.execute(stage, query)
       if results["results"]["bindings"]:
-        return self.extract_results(results["results"]["bindings"])
+        results = self.extract_results(results["results"]["bindings"])
       else:
-        return set()
+        results = set()
+      if self.query_cache is not None:
+        self.query_cache.put(query, results)
+      return results
 
     def construct_relation(self, subject, objects, property):
       extential_rel = """
@@ -363,9 +462,7 @@ class UberonGraph():
             }}
       """.format(subject = subject, objects = objects, relationship = subclass_rel if property == "rdfs:subClassOf" else extential_rel, property = property)
 
-      self.sparql.setQuery(construct_query)
-      self.sparql.setReturnFormat(RDFXML)
-      result = self.sparql.query().convert()
+      result = self.execute("suggestion", construct_query, RDFXML)
 
       return result
 
@@ -399,9 +496,7 @@ class UberonGraph():
                 }}
               }}
             """.format(terms = terms)
-        self.sparql.setQuery(construct_query)
-        self.sparql.setReturnFormat(RDFXML)
-        result = self.sparql.query().convert()
+        result = self.execute("annotation", construct_query, RDFXML)
         return result
 
     def extract_results(self, list):
@@ -414,7 +509,7 @@ class UberonGraph():
       return results
 
     def add_prefix(self, term):
-      return term.replace("http://purl.obolibrary.org/obo/UBERON_", "UBERON:").replace("http://purl.obolibrary.org/obo/CL_", "CL:").replace("http://purl.obolibrary.org/obo/PCL_", "PCL:")
+      return iri_to_curie(term)
 
     def add_prefix_ont(self, list_ontology):
       results = []
@@ -424,79 +519,106 @@ class UberonGraph():
       return results
 
     def verify_relationship(self, terms_pairs, relationship):
+      """Checks the pair keys (see term_ids) of terms_pairs; returns the
+      valid (s, o) pairs and the keys of the others"""
       valid_relationship = set()
-      if len(terms_pairs) > 90:
-        for chunk in chunks(list(terms_pairs), 90):
+      to_check = terms_pairs
+      if self.verdict_cache is not None:
+        known_valid, to_check = self.verdict_cache.lookup(relationship, terms_pairs)
+      relation, kind, inverse = self.closure_queries.get(relationship, (None, None, False))
+      if not to_check:
+        pass
+      elif self.closure_index is not None and self.closure_index.has(relation, kind):
+        valid_relationship = self.closure_index.filter_pairs(zip(*split_terms(to_check)), relation, kind, inverse)
+      elif len(to_check) > PAIR_CHUNK:
+        for chunk in chunks(pair_strings(to_check), PAIR_CHUNK):
           valid_relationship = valid_relationship.union(self.query_uberon(" ".join(chunk), relationship))
       else:
-        valid_relationship = self.query_uberon(" ".join(list(terms_pairs)), relationship)
+        valid_relationship = self.query_uberon(" ".join(pair_strings(to_check)), relationship)
+      if self.verdict_cache is not None:
+        self.verdict_cache.store(relationship, to_check, valid_relationship)
+        valid_relationship = valid_relationship | known_valid
       
-      non_valid_relationship = terms_pairs - transform_to_str(valid_relationship)
+      non_valid_relationship = terms_pairs - transform_to_keys(valid_relationship)
 
       return valid_relationship, non_valid_relationship
 
+    def normalized_ic(self, terms):
+      """Returns the normalized IC of each term as a float array, NaN when
+      unknown, from the IC table when there is one"""
+      import numpy as np
+      terms = list(terms)
+      if self.ic_table is not None:
+        return self.ic_table.lookup(terms)
+      ic = {}
+      for chunk in chunks(list(dict.fromkeys(terms)), TERM_CHUNK):
+        ic.update((term, float(value)) for term, value in self.query_uberon(" ".join(chunk), self.select_normalized_ic))
+      return np.array([ic.get(term, np.nan) for term in terms], dtype=np.float64)
+
     def get_suggestion_graph(self, all_as, terms_as_d, all_ct, terms_ct, terms_ct_d):
-      sec_graph = ConjunctiveGraph()
-      if len(all_as) > 30:
-        for chunk_all in chunks(list(all_as), 30):
-          if len(terms_as_d) > 30:
-            for chunk in chunks(list(terms_as_d), 30):
+      from rdf_tools import TripleSet
+      sec_graph = TripleSet()
+      if len(all_as) > CONSTRUCT_CHUNK:
+        for chunk_all in chunks(sorted(all_as), CONSTRUCT_CHUNK):
+          if len(terms_as_d) > CONSTRUCT_CHUNK:
+            for chunk in chunks(sorted(terms_as_d), CONSTRUCT_CHUNK):
               sec_graph += self.construct_relation(subject="\n".join(chunk), objects="\n".join(chunk_all), property="rdfs:subClassOf")
               sec_graph += self.construct_relation(subject="\n".join(chunk), objects="\n".join(chunk_all), property="part_of:")
               sec_graph += self.construct_relation(subject="\n".join(chunk), objects="\n".join(chunk_all), property="connected_to:")
           else:
-            sec_graph += self.construct_relation(subject="\n".join(list(terms_as_d)), objects="\n".join(chunk_all), property="rdfs:subClassOf")
-            sec_graph += self.construct_relation(subject="\n".join(list(terms_as_d)), objects="\n".join(chunk_all), property="part_of:")
-            sec_graph += self.construct_relation(subject="\n".join(list(terms_as_d)), objects="\n".join(chunk_all), property="connected_to:")
+            sec_graph += self.construct_relation(subject="\n".join(sorted(terms_as_d)), objects="\n".join(chunk_all), property="rdfs:subClassOf")
+            sec_graph += self.construct_relation(subject="\n".join(sorted(terms_as_d)), objects="\n".join(chunk_all), property="part_of:")
+            sec_graph += self.construct_relation(subject="\n".join(sorted(terms_as_d)), objects="\n".join(chunk_all), property="connected_to:")
 
-          if len(terms_ct) > 30:
-            for chunk in chunks(list(terms_ct), 30):
+          if len(terms_ct) > CONSTRUCT_CHUNK:
+            for chunk in chunks(sorted(terms_ct), CONSTRUCT_CHUNK):
               sec_graph += self.construct_relation(subject="\n".join(chunk), objects="\n".join(chunk_all), property="part_of:")
           else:
-            sec_graph += self.construct_relation(subject="\n".join(terms_ct), objects="\n".join(chunk_all), property="part_of:")
+            sec_graph += self.construct_relation(subject="\n".join(sorted(terms_ct)), objects="\n".join(chunk_all), property="part_of:")
       else:
-        if len(terms_as_d) > 30:
-          for chunk in chunks(list(terms_as_d), 30):
-            sec_graph += self.construct_relation(subject="\n".join(chunk), objects="\n".join(list(all_as)), property="rdfs:subClassOf")
-            sec_graph += self.construct_relation(subject="\n".join(chunk), objects="\n".join(list(all_as)), property="part_of:")
-            sec_graph += self.construct_relation(subject="\n".join(chunk), objects="\n".join(list(all_as)), property="connected_to:")
+        if len(terms_as_d) > CONSTRUCT_CHUNK:
+          for chunk in chunks(sorted(terms_as_d), CONSTRUCT_CHUNK):
+            sec_graph += self.construct_relation(subject="\n".join(chunk), objects="\n".join(sorted(all_as)), property="rdfs:subClassOf")
+            sec_graph += self.construct_relation(subject="\n".join(chunk), objects="\n".join(sorted(all_as)), property="part_of:")
+            sec_graph += self.construct_relation(subject="\n".join(chunk), objects="\n".join(sorted(all_as)), property="connected_to:")
         else:
-          sec_graph += self.construct_relation(subject="\n".join(list(terms_as_d)), objects="\n".join(list(all_as)), property="rdfs:subClassOf")
-          sec_graph += self.construct_relation(subject="\n".join(list(terms_as_d)), objects="\n".join(list(all_as)), property="part_of:")
-          sec_graph += self.construct_relation(subject="\n".join(list(terms_as_d)), objects="\n".join(list(all_as)), property="connected_to:")
+          sec_graph += self.construct_relation(subject="\n".join(sorted(terms_as_d)), objects="\n".join(sorted(all_as)), property="rdfs:subClassOf")
+          sec_graph += self.construct_relation(subject="\n".join(sorted(terms_as_d)), objects="\n".join(sorted(all_as)), property="part_of:")
+          sec_graph += self.construct_relation(subject="\n".join(sorted(terms_as_d)), objects="\n".join(sorted(all_as)), property="connected_to:")
         
-        if len(terms_ct) > 30:
-          for chunk in chunks(list(terms_ct), 30):
-            sec_graph += self.construct_relation(subject="\n".join(chunk), objects="\n".join(list(all_as)), property="part_of:")
+        if len(terms_ct) > CONSTRUCT_CHUNK:
+          for chunk in chunks(sorted(terms_ct), CONSTRUCT_CHUNK):
+            sec_graph += self.construct_relation(subject="\n".join(chunk), objects="\n".join(sorted(all_as)), property="part_of:")
         else:
-          sec_graph += self.construct_relation(subject="\n".join(terms_ct), objects="\n".join(list(all_as)), property="part_of:")
+          sec_graph += self.construct_relation(subject="\n".join(sorted(terms_ct)), objects="\n".join(sorted(all_as)), property="part_of:")
         
 
-      if len(terms_ct_d) > 20:
-        for chunk in chunks(list(terms_ct_d), 20):
-          if len(all_ct) > 90:
-            for chunck in chunks(list(all_ct), 90):
+      if len(terms_ct_d) > CT_SUBCLASS_CHUNK:
+        for chunk in chunks(sorted(terms_ct_d), CT_SUBCLASS_CHUNK):
+          if len(all_ct) > TERM_CHUNK:
+            for chunck in chunks(sorted(all_ct), TERM_CHUNK):
               sec_graph += self.construct_relation(subject="\n".join(chunk), objects="\n".join(list(chunck)), property="rdfs:subClassOf")
           else:
-            sec_graph += self.construct_relation(subject="\n".join(chunk), objects="\n".join(list(all_ct)), property="rdfs:subClassOf")
+            sec_graph += self.construct_relation(subject="\n".join(chunk), objects="\n".join(sorted(all_ct)), property="rdfs:subClassOf")
       else:
-        if len(all_ct) > 90:
-            for chunck in chunks(list(all_ct), 90):
-              sec_graph += self.construct_relation(subject="\n".join(terms_ct_d), objects="\n".join(list(chunck)), property="rdfs:subClassOf")
+        if len(all_ct) > TERM_CHUNK:
+            for chunck in chunks(sorted(all_ct), TERM_CHUNK):
+              sec_graph += self.construct_relation(subject="\n".join(sorted(terms_ct_d)), objects="\n".join(list(chunck)), property="rdfs:subClassOf")
         else:
-          sec_graph += self.construct_relation(subject="\n".join(terms_ct_d), objects="\n".join(list(all_ct)), property="rdfs:subClassOf")
+          sec_graph += self.construct_relation(subject="\n".join(sorted(terms_ct_d)), objects="\n".join(sorted(all_ct)), property="rdfs:subClassOf")
         
 
       return sec_graph
 
     def get_annotations(self, terms):
-      annotations = ConjunctiveGraph()
-      terms = list(terms)
-      if len(terms) > 30:
-        for chunk in chunks(terms, 30):
+      from rdf_tools import TripleSet
+      annotations = TripleSet()
+      terms = sorted(terms)
+      if len(terms) > ANNOTATION_CHUNK:
+        for chunk in chunks(terms, ANNOTATION_CHUNK):
           annotations += self.construct_annotation("\n".join(chunk))
       else:
         terms = "\n".join(terms)
-        annotations = self.construct_annotation(terms)
+        annotations += self.construct_annotation(terms)
 
       return annotations
\ No newline at end of file
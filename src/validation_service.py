@@ -0,0 +1,228 @@
+"""
+Local HTTP service validating ASCT+B tables, for curators checking a table
+while editing it. The closure index, IC table, SPARQL connections and the
+results of previous queries stay loaded between requests.
+
+  GET  /health     status and the ontology versions of the local indexes
+  GET  /metrics    request, latency and query cache counters
+  POST /validate   validate a table, given as
+                     the ASCT+B JSON (its data rows, or {"data": [...]}),
+                     {"table": "Kidney", "version": "new"} from config_asct.json,
+                     or {"sheetId": "...", "gid": "..."}
+                   and return log_dict, the terms and relationship reports
+                   and the invalid, indirect, strict CT-AS and has_part logs.
+
+The validation is the one of template_runner.py, without the annotation
+and suggestion graphs. At most --workers tables are validated at a time;
+other requests wait up to --queue-timeout seconds, then get a 503.
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ccf_tools import parse_asctb_data
+from download_resource import fetch_table, get_config
+from template_runner import load_closure_index, load_ic_table, validate_table
+from uberongraph_tools import QueryCache, UberonGraph
+
+MAX_BODY = 50 * 1024 * 1024
+# Logs returned by /validate, as named in the warehouse
+LOGS = {
+    "invalid": "error_log",
+    "indirect": "indirect_error_log",
+    "strict_ct_as": "strict_log",
+    "has_part": "has_part_log",
+}
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def records(frame):
+    """
+    Data frame rows as JSON-serializable dicts, NaN as None.
+    """
+    return json.loads(frame.to_json(orient="records"))
+
+
+def resolve_table(body):
+    """
+    Return (table name, table rows) of a /validate request body.
+    """
+    if isinstance(body, list):
+        return "table", body
+    if not isinstance(body, dict):
+        raise ServiceError(400, "Expected the ASCT+B JSON or a table reference")
+    name = body.get("table", "table")
+    if "data" in body:
+        return name, body["data"]
+    if "sheetId" in body and "gid" in body:
+        return name, fetch_table(body["sheetId"], body["gid"])["data"]
+    if "table" in body:
+        element = next((element for element in get_config() if element["name"] == name), None)
+        version = body.get("version", "new")
+        if element is None or version not in element:
+            raise ServiceError(404, f"No {version} version of table '{name}' in config_asct.json")
+        return name, fetch_table(element[version]["sheetId"], element[version]["gid"])["data"]
+    raise ServiceError(400, "Expected 'data', 'table' or 'sheetId' and 'gid'")
+
+
+class ValidationService():
+    """
+    A pool of UberonGraph instances sharing the local indexes and a query
+    cache, and the counters reported by /metrics.
+    """
+    def __init__(self, closure_index=None, ic_table=None, workers=4, cache_size=20000, queue_timeout=30):
+        self.closure_index = closure_index
+        self.ic_table = ic_table
+        self.query_cache = QueryCache(cache_size)
+        self.graphs = queue.Queue()
+        for _ in range(workers):
+            self.graphs.put(UberonGraph(closure_index=closure_index, ic_table=ic_table, query_cache=self.query_cache))
+        self.slots = threading.BoundedSemaphore(workers)
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.counters = {
+            "requests": 0,
+            "validations": 0,
+            "failures": 0,
+            "rejected": 0,
+            "in_flight": 0,
+            "validation_seconds_total": 0.0,
+            "validation_seconds_last": 0.0,
+        }
+
+    def count(self, **increments):
+        with self.lock:
+            for name, value in increments.items():
+                self.counters[name] += value
+
+    def validate(self, name, rows):
+        """
+        Validate table rows and return the results as JSON-serializable data.
+        """
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            self.count(rejected=1)
+            raise ServiceError(503, f"{self.workers} tables are being validated, try again later")
+        self.count(in_flight=1)
+        ug = self.graphs.get()
+        start = time.perf_counter()
+        try:
+            ccf_tools_df, report_t, _, _, log_dict = parse_asctb_data(rows)
+            results = validate_table(ccf_tools_df, report_t, log_dict, name, ug, graphs=False)
+        except Exception:
+            self.count(failures=1)
+            raise
+        finally:
+            self.graphs.put(ug)
+            self.slots.release()
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.counters["in_flight"] -= 1
+                self.counters["validation_seconds_total"] += elapsed
+                self.counters["validation_seconds_last"] = elapsed
+        self.count(validations=1)
+
+        response = {
+            "table": name,
+            "log_dict": results["log_dict"],
+            "report_terms": records(results["report_t"]),
+            "report_relationship": records(results["report_r"]),
+        }
+        response.update((log, records(results[result])) for log, result in LOGS.items())
+        return response
+
+    def health(self):
+        return {
+            "status": "ok",
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "closure_index": self.closure_index.versions if self.closure_index else None,
+            "ic_table": self.ic_table.directory if self.ic_table else None,
+        }
+
+    def metrics(self):
+        with self.lock:
+            metrics = dict(self.counters)
+        metrics["workers"] = self.workers
+        metrics["query_cache"] = {
+            "size": len(self.query_cache),
+            "hits": self.query_cache.hits,
+            "misses": self.query_cache.misses,
+        }
+        return metrics
+
+
+class ValidationHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def send_json(self, status, content):
+        body = json.dumps(content, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.service.count(requests=1)
+        if self.path == "/health":
+            self.send_json(200, self.service.health())
+        elif self.path == "/metrics":
+            self.send_json(200, self.service.metrics())
+        else:
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        self.service.count(requests=1)
+        if self.path != "/validate":
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length > MAX_BODY:
+                raise ServiceError(413, f"Tables are limited to {MAX_BODY} bytes")
+            try:
+                body = json.loads(self.rfile.read(length))
+            except ValueError as e:
+                raise ServiceError(400, f"Invalid JSON: {e}")
+            self.send_json(200, self.service.validate(*resolve_table(body)))
+        except ServiceError as e:
+            self.send_json(e.status, {"error": str(e)})
+        except Exception as e:
+            self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+
+
+def serve(service, host="127.0.0.1", port=8080):
+    handler = type("Handler", (ValidationHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Validation service on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("-p", "--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="tables validated at the same time")
+    parser.add_argument("--queue-timeout", type=float, default=30, help="seconds a request waits for a worker")
+    parser.add_argument("--cache-size", type=int, default=20000, help="number of query results kept")
+    parser.add_argument("--closure-index", help="closure index base directory")
+    parser.add_argument("--ic-table", help="IC table base directory")
+
+    args = parser.parse_args()
+    service = ValidationService(load_closure_index(args.closure_index), load_ic_table(args.ic_table),
+                                args.workers, args.cache_size, args.queue_timeout)
+    serve(service, args.host, args.port)
@@ -0,0 +1,89 @@
+"""
+Relationship verdicts of a table validation, kept so that templates derived
+from the same table, or later validations of an edited table, reuse them
+instead of querying ubergraph again.
+"""
+from collections import defaultdict
+
+from term_ids import TERM_IDS
+
+
+class ValidationVerdicts():
+    """
+    For each relation (template column name: isa, part_of, overlaps, ...),
+    the pair keys (see term_ids) of the (s, o) pairs of the table it was
+    checked for and of those found valid. Pairs keep their table order:
+    has_part of a CT-AS pair means o has part s.
+    """
+    def __init__(self):
+        self.checked = defaultdict(set)
+        self.valid = defaultdict(set)
+        self.unknown_terms = set()
+
+    def record(self, relation, checked, valid):
+        """
+        checked: the keys of the pairs checked; valid: the (s, o) pairs
+        found valid.
+        """
+        self.checked[relation].update(checked)
+        self.valid[relation].update(TERM_IDS.pair_key(s, o) for s, o in valid)
+
+    def is_checked(self, pair, relation):
+        return TERM_IDS.pair_key(*pair) in self.checked[relation] or not self.unknown_terms.isdisjoint(pair)
+
+    def is_valid(self, pair, relation):
+        return TERM_IDS.pair_key(*pair) in self.valid[relation]
+
+    def invalid_pairs(self, pairs, relations):
+        """
+        Split pairs into those valid for none of relations and those the
+        first relation was not checked for. As in the validation, a pair is
+        only checked for a relation when the previous ones did not hold.
+        Pairs with a term that is not a class are invalid for every relation.
+        """
+        invalid, unchecked = [], []
+        for pair in pairs:
+            if not self.is_checked(pair, relations[0]):
+                unchecked.append(pair)
+            elif not any(self.is_valid(pair, relation) for relation in relations):
+                invalid.append(pair)
+        return invalid, unchecked
+
+
+class PairVerdictCache():
+    """
+    Verdicts of UberonGraph.verify_relationship by query and pair key,
+    kept between validations so that only new pairs are queried.
+    """
+    def __init__(self):
+        self.verdicts = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, relationship, terms_pairs):
+        """
+        Return the pairs known to be valid (as (s, o) tuples) and the pair
+        keys without a verdict.
+        """
+        valid, unknown = set(), set()
+        for key in terms_pairs:
+            verdict = self.verdicts.get((relationship, key))
+            if verdict is None:
+                unknown.add(key)
+            elif verdict:
+                valid.add(TERM_IDS.pair(key))
+        self.hits += len(terms_pairs) - len(unknown)
+        self.misses += len(unknown)
+        return valid, unknown
+
+    def unknown(self, relationship, terms_pairs):
+        """
+        Return the pair keys without a verdict, as lookup does but without
+        counting hits and misses.
+        """
+        return {key for key in terms_pairs if (relationship, key) not in self.verdicts}
+
+    def store(self, relationship, terms_pairs, valid_pairs):
+        valid_pairs = {TERM_IDS.pair_key(s, o) for s, o in valid_pairs}
+        for key in terms_pairs:
+            self.verdicts[(relationship, key)] = key in valid_pairs
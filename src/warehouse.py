@@ -0,0 +1,269 @@
+"""
+Local SQLite store of validation results. Every run loads its summary
+metrics and row-level issues keyed by organ, table version, ontology
+version and run date, so dashboards, release notes and trend questions
+are answered by queries instead of re-reading report files.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+
+WAREHOUSE_PATH = "../reports/validation.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_date TEXT NOT NULL,
+    organ TEXT NOT NULL,
+    table_version TEXT,
+    table_date TEXT,
+    ontology_version TEXT,
+    PRIMARY KEY (run_date, organ)
+);
+CREATE TABLE IF NOT EXISTS ontology_versions (
+    run_date TEXT NOT NULL,
+    ontology TEXT NOT NULL,
+    version TEXT,
+    PRIMARY KEY (run_date, ontology)
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_date TEXT NOT NULL,
+    organ TEXT NOT NULL,
+    report TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    metric TEXT NOT NULL,
+    value,
+    PRIMARY KEY (run_date, organ, report, metric)
+);
+CREATE TABLE IF NOT EXISTS issues (
+    run_date TEXT NOT NULL,
+    organ TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    s TEXT,
+    o TEXT,
+    row_number INTEGER,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS issues_run ON issues (run_date, organ, kind);
+"""
+
+# Row-level logs written by template_runner.py, by issue kind
+ORGAN_LOGS = {
+    "invalid": "class_{organ}_log.tsv",
+    "indirect": "class_{organ}_indirect_log.tsv",
+    "strict_ct_as": "{organ}_AS_CT_strict_log.tsv",
+    "has_part": "{organ}_AS_has_part_CT_log.tsv",
+}
+
+
+def to_sql_value(value):
+    """
+    Convert numpy scalars and missing values to plain Python values.
+    """
+    import pandas as pd
+    if pd.isna(value):
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+class ValidationWarehouse():
+    """
+    Read and write validation results in a SQLite database.
+    """
+    def __init__(self, path=WAREHOUSE_PATH):
+        self.path = path
+        # Organs validated in parallel (make -j) write to the same file
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def record_run(self, run_date, organ, table_version=None,
+                   table_date=None, ontology_versions=None):
+        """
+        Register the run of an organ with its table and ontology versions.
+        """
+        ontology_versions = ontology_versions or {}
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?)",
+                (run_date, organ, table_version, table_date,
+                 "; ".join(f"{ont} {version}" for ont, version in ontology_versions.items()))
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO ontology_versions VALUES (?, ?, ?)",
+                [(run_date, ont, version) for ont, version in ontology_versions.items()]
+            )
+
+    def load_metrics(self, run_date, report, frame):
+        """
+        Load a summary report (one row per organ, a Table column and one
+        column per metric) for a run date, replacing previous values. When
+        an organ appears more than once, its last row is kept.
+        """
+        metrics = [column for column in frame.columns if column != "Table"]
+        rows = [
+            (run_date, record["Table"], report, position, metric, to_sql_value(record[metric]))
+            for record in frame.to_dict("records")
+            for position, metric in enumerate(metrics)
+        ]
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM metrics WHERE run_date = ? AND organ = ? AND report = ?",
+                {(run_date, record["Table"], report) for record in frame.to_dict("records")}
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def load_issues(self, run_date, organ, kind, records):
+        """
+        Load row-level issues of one kind for an organ and a run date,
+        replacing previous ones. records is a DataFrame or a list of dicts.
+        """
+        import pandas as pd
+        if isinstance(records, pd.DataFrame):
+            records = records.to_dict("records")
+        rows = []
+        for record in records:
+            details = {
+                key: to_sql_value(value) for key, value in record.items()
+                if key not in ("s", "o", "row_number")
+            }
+            row_number = to_sql_value(record.get("row_number"))
+            rows.append((
+                run_date, organ, kind, record.get("s"), record.get("o"),
+                int(row_number) if row_number is not None else None,
+                json.dumps(details, ensure_ascii=False)
+            ))
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM issues WHERE run_date = ? AND organ = ? AND kind = ?",
+                (run_date, organ, kind)
+            )
+            self.connection.executemany(
+                "INSERT INTO issues VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def load_log_dict(self, run_date, organ, log_dict):
+        """
+        Load the term issues of logs_dict.json, one kind per key.
+        """
+        for kind, records in log_dict.items():
+            self.load_issues(run_date, organ, kind, records)
+
+    def load_organ_logs(self, run_date, organ, logs_dir):
+        """
+        Load the row-level logs and logs_dict.json found in an organ's
+        logs directory.
+        """
+        import pandas as pd
+        for kind, file_name in ORGAN_LOGS.items():
+            path = os.path.join(logs_dir, file_name.format(organ=organ))
+            if not os.path.isfile(path):
+                continue
+            try:
+                records = pd.read_csv(path, sep="\t")
+            except pd.errors.EmptyDataError:
+                records = []
+            self.load_issues(run_date, organ, kind, records)
+        path = os.path.join(logs_dir, "logs_dict.json")
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.load_log_dict(run_date, organ, json.load(f))
+
+    def load_report_files(self, reports_dir):
+        """
+        Load every reports/report_{terms,relationship}_{date}.tsv file.
+        """
+        import pandas as pd
+        for path in sorted(glob.glob(os.path.join(reports_dir, "report_*_*.tsv"))):
+            match = re.match(r"report_(terms|relationship)_(\d{8})\.tsv$", os.path.basename(path))
+            if match:
+                self.load_metrics(match.group(2), match.group(1), pd.read_csv(path, sep="\t"))
+
+    def report(self, report, run_date):
+        """
+        Return a summary report for a run date in the layout of the
+        report_{report}_{date}.tsv files.
+        """
+        import pandas as pd
+        rows = self.connection.execute(
+            "SELECT organ, metric, value FROM metrics WHERE report = ? AND run_date = ? "
+            "ORDER BY rowid, position",
+            (report, run_date)
+        ).fetchall()
+        records = {}
+        for organ, metric, value in rows:
+            records.setdefault(organ, {"Table": organ})[metric] = value
+        # Building the frame from Python values keeps integer metrics as int
+        return pd.DataFrame(list(records.values()))
+
+    def table_versions(self, run_date):
+        """
+        Return (organ, table version, table date) for the organs of a run.
+        """
+        return self.connection.execute(
+            "SELECT organ, table_version, table_date FROM runs WHERE run_date = ? ORDER BY rowid",
+            (run_date,)
+        ).fetchall()
+
+    def ontology_versions(self, run_date):
+        """
+        Return (ontology, version) recorded for a run.
+        """
+        return self.connection.execute(
+            "SELECT ontology, version FROM ontology_versions WHERE run_date = ? ORDER BY rowid",
+            (run_date,)
+        ).fetchall()
+
+    def query(self, sql, params=()):
+        """
+        Run any SQL query and return a DataFrame.
+        """
+        import pandas as pd
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+
+def read_table_version(job, path="tables_version.txt"):
+    """
+    Return the version and date written by download_resource.py for a job.
+    The last line wins, as the last official release is downloaded first.
+    """
+    table_version = None, None
+    if os.path.isfile(path):
+        with open(path, "r", encoding="utf-8") as t:
+            for line in t:
+                name, version, table_date = line.rstrip("\n").split(";", 2)
+                if name == job:
+                    table_version = version, table_date
+    return table_version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-w", "--warehouse", default=WAREHOUSE_PATH, help="warehouse file path")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    reports = subparsers.add_parser("load-reports", help="load summary report files")
+    reports.add_argument("reports_dir", help="directory with report_*_{date}.tsv files")
+    logs = subparsers.add_parser("load-logs", help="load an organ's logs directory")
+    logs.add_argument("run_date", help="run date as YYYYMMDD")
+    logs.add_argument("organ", help="organ (table) name")
+    logs.add_argument("logs_dir", help="organ logs directory")
+    query = subparsers.add_parser("query", help="run a SQL query")
+    query.add_argument("sql", help="SQL query")
+
+    args = parser.parse_args()
+    warehouse = ValidationWarehouse(args.warehouse)
+    if args.command == "load-reports":
+        warehouse.load_report_files(args.reports_dir)
+    elif args.command == "load-logs":
+        warehouse.load_organ_logs(args.run_date, args.organ, args.logs_dir)
+    elif args.command == "query":
+        print(warehouse.query(args.sql).to_csv(sep="\t", index=False), end="")
+    warehouse.close()
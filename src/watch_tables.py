@@ -0,0 +1,189 @@
+"""
+Watch mode for table curation: re-validate a table as soon as it changes
+and refresh its logs and README.
+
+The ASCT+B JSON files of ../resources/ASCT-b_tables are polled; with --api
+the tables are also downloaded again from the asctb-api every --api-interval
+seconds and written there when their data changed. A changed file is only
+validated once it stayed the same for --debounce seconds, so that an editor
+saving in several steps triggers a single run.
+
+The UberonGraph, its query cache and the verdict of every pair checked so
+far stay in memory between runs: after an edit, only the new pairs of the
+table are queried.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from ccf_tools import parse_asctb
+from download_resource import fetch_table, get_config
+from readme_reports_generation import generate_table_pages
+from template_runner import load_closure_index, load_ic_table, validate_table, write_logs
+from uberongraph_tools import QueryCache, UberonGraph
+from validation_verdicts import PairVerdictCache
+
+TABLES_DIR = "../resources/ASCT-b_tables"
+
+
+def table_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+class TableWatcher():
+    """
+    Report the files matching patterns that changed since they were last
+    reported and then stayed unchanged for debounce seconds.
+    """
+    def __init__(self, patterns, debounce=1.0):
+        self.patterns = patterns
+        self.debounce = debounce
+        self.reported = {}
+        self.pending = {}
+
+    def stat(self, path):
+        try:
+            status = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return status.st_mtime_ns, status.st_size
+
+    def paths(self):
+        return sorted({path for pattern in self.patterns for path in glob.glob(pattern)})
+
+    def changed(self):
+        now = time.monotonic()
+        ready = []
+        for path in self.paths():
+            current = self.stat(path)
+            if current is None or current == self.reported.get(path):
+                self.pending.pop(path, None)
+                continue
+            seen, since = self.pending.get(path, (None, now))
+            if current != seen:
+                self.pending[path] = (current, now)
+            elif now - since >= self.debounce:
+                del self.pending[path]
+                self.reported[path] = current
+                ready.append(path)
+        return ready
+
+    def mark_seen(self):
+        """
+        Consider the current files as already validated.
+        """
+        for path in self.paths():
+            self.reported[path] = self.stat(path)
+
+
+class ApiPoller():
+    """
+    Download the tables of config_asct.json and write the ones whose data
+    changed to tables_dir.
+    """
+    def __init__(self, tables, tables_dir=TABLES_DIR, version="new"):
+        self.configs = {
+            element["name"]: element[version] for element in get_config()
+            if version in element and (not tables or element["name"] in tables)
+        }
+        self.tables_dir = tables_dir
+        self.hashes = {}
+        for name in self.configs:
+            path = os.path.join(tables_dir, f"{name}.json")
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    self.hashes[name] = hashlib.sha256(f.read()).hexdigest()
+
+    def poll(self):
+        for name, config in self.configs.items():
+            try:
+                data = fetch_table(config["sheetId"], config["gid"])["data"]
+            except Exception as e:
+                print(f"{name}: download failed, {e}")
+                continue
+            content = json.dumps(data, ensure_ascii=False, indent=2)
+            digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+            if self.hashes.get(name) != digest:
+                self.hashes[name] = digest
+                with open(os.path.join(self.tables_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+                    f.write(content)
+
+
+class IncrementalValidator():
+    """
+    Validate tables with one UberonGraph whose caches persist between runs.
+    """
+    def __init__(self, closure_index=None, ic_table=None):
+        self.verdict_cache = PairVerdictCache()
+        self.ug = UberonGraph(closure_index=closure_index, ic_table=ic_table,
+                              query_cache=QueryCache(), verdict_cache=self.verdict_cache)
+        self.configs = {element["name"]: element.get("new", {}) for element in get_config()}
+
+    def validate(self, path):
+        """
+        Validate the table at path and refresh ../logs/{table},
+        ../docs/{table} and its README.
+        """
+        table = table_name(path)
+        start = time.perf_counter()
+        misses = self.verdict_cache.misses
+
+        ccf_tools_df, report_t, new_terms_report, new_uberon_terms, log_dict = parse_asctb(path)
+        results = validate_table(ccf_tools_df, report_t, log_dict, table, self.ug, graphs=False)
+
+        os.makedirs(f"../logs/{table}", exist_ok=True)
+        write_logs(table, results, new_terms_report, new_uberon_terms)
+        shutil.copytree(f"../logs/{table}", f"../docs/{table}", dirs_exist_ok=True)
+        generate_table_pages(table, "readme", self.configs.get(table))
+
+        report = results["report_r"].iloc[0]
+        print(f"{table}: {len(ccf_tools_df)} pairs, {self.verdict_cache.misses - misses} pair checks queried, "
+              f"{report['percent_invalid_AS-AS_relationship']}% invalid AS-AS, "
+              f"{report['percent_invalid_CT-AS_relationship']}% invalid CT-AS, "
+              f"{time.perf_counter() - start:.1f}s")
+
+
+def watch(args):
+    validator = IncrementalValidator(load_closure_index(args.closure_index), load_ic_table(args.ic_table))
+    patterns = [os.path.join(args.tables_dir, f"{table}.json") for table in args.tables or ["*"]]
+    watcher = TableWatcher(patterns, args.debounce)
+    poller = ApiPoller(args.tables, args.tables_dir) if args.api else None
+    last_poll = None
+
+    if not args.initial:
+        watcher.mark_seen()
+    print(f"Watching {args.tables_dir}, Ctrl+C to stop")
+
+    try:
+        while True:
+            if poller and (last_poll is None or time.monotonic() - last_poll >= args.api_interval):
+                poller.poll()
+                last_poll = time.monotonic()
+            for path in watcher.changed():
+                try:
+                    validator.validate(path)
+                except Exception as e:
+                    print(f"{table_name(path)}: validation failed, {type(e).__name__}: {e}")
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("tables", nargs="*", help="tables to watch, all of tables-dir by default")
+    parser.add_argument("--tables-dir", default=TABLES_DIR, help="directory of the ASCT+B JSON files")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between two polls of the files")
+    parser.add_argument("--debounce", type=float, default=1.0, help="seconds a file must stay unchanged")
+    parser.add_argument("--initial", action="store_true", help="validate the current tables first")
+    parser.add_argument("--api", action="store_true", help="also download the tables from the asctb-api")
+    parser.add_argument("--api-interval", type=float, default=60, help="seconds between two downloads")
+    parser.add_argument("--closure-index", help="closure index base directory")
+    parser.add_argument("--ic-table", help="IC table base directory")
+
+    args = parser.parse_args()
+    watch(args)